@@ -1,10 +1,11 @@
 import sys
 from abc import ABC, abstractmethod
-from collections.abc import Generator
+from collections.abc import Callable, Generator
 from enum import Enum
+from functools import cache
 from math import floor
 from types import SimpleNamespace
-from typing import Literal, Any, Union, ClassVar
+from typing import Literal, Any, Union, ClassVar, Self
 
 from antlr4 import ParserRuleContext
 from pydantic import BaseModel, computed_field, model_serializer
@@ -50,19 +51,146 @@ class ASTNode(BaseModel, ABC):
 
         return {self.node_name: value}
 
-    _parser_node: Union[ParserRuleContext, None]
+    _parser_node: Union[ParserRuleContext, None] = None
+    _code_location: Union[CodeLocation, None] = None
+    _structural_hash: Union[int, None] = None
 
     def __init__(self, parser_node: ParserRuleContext = None, **kwargs):
         super().__init__(**kwargs)
         self._parser_node = parser_node
-    
+
+    @classmethod
+    def construct_unvalidated(cls, parser_node: ParserRuleContext = None, /, **fields) -> Self:
+        """
+        Build a node without running pydantic validation, for callers that already pass correctly typed values
+
+        Missing fields get their defaults. Serialization and comparison work the same as for validated nodes.
+        """
+        field_names, defaults, private_defaults = _construct_info(cls)
+        if defaults:
+            fields = {**defaults, **fields}
+
+        node = _new_object(cls)
+        _set_attr(node, '__dict__', fields)
+        # every field is always set, but each node needs a set of its own, pydantic adds to it on assignment
+        _set_attr(node, '__pydantic_fields_set__', set(field_names))
+        _set_attr(node, '__pydantic_extra__', None)
+        _set_attr(node, '__pydantic_private__', {**private_defaults, '_parser_node': parser_node})
+        return node
+
+    @property
+    def structural_hash(self) -> int:
+        """Hash of the node class and its fields, computed once since nodes are not changed after conversion"""
+        private = self.__pydantic_private__
+        structural_hash = private.get('_structural_hash')
+        if structural_hash is None:
+            structural_hash = hash((self.__class__, *map(_structural_key, _field_values(self))))
+            private['_structural_hash'] = structural_hash
+        return structural_hash
+
+    def __hash__(self):
+        return self.structural_hash
+
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and self.model_dump() == other.model_dump()
+        if self is other:
+            return True
+        return (
+            isinstance(other, self.__class__)
+            and self.structural_hash == other.structural_hash
+            and all(map(_structurally_equal, _field_values(self), _field_values(other)))
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        # parser nodes drag the whole ANTLR parse tree (and parser) along and can't be pickled,
+        # keep the resolved source location instead
+        state = super().__getstate__()
+        state['__pydantic_private__'] = {
+            **(state['__pydantic_private__'] or {}),
+            '_parser_node': None,
+            '_code_location': self.code_location,
+            # hashes of the node classes differ between processes
+            '_structural_hash': None,
+        }
+        return state
 
     @property
     def parser_node(self) -> Union[ParserRuleContext, None]:
         return self._parser_node
 
+    @property
+    def code_location(self) -> Union[CodeLocation, None]:
+        if self._code_location is None and self._parser_node is not None:
+            self._code_location = CodeLocation.from_parser_node(self._parser_node)
+        return self._code_location
+
+    def detach(
+        self,
+        locate: Callable[[ParserRuleContext], Union[CodeLocation, None]] = CodeLocation.from_parser_node,
+        source_files: dict[str, str] = None
+    ):
+        """
+        Resolve the code locations of this node and everything below it, then drop their parser nodes
+        so the parse tree, token stream and lexer can be freed
+        """
+        if source_files is None:
+            source_files = {}
+
+        if self._code_location is None and self._parser_node is not None:
+            self._code_location = locate(self._parser_node)
+        code_location = self._code_location
+        if code_location is not None:
+            # thousands of locations name the same handful of files
+            code_location.source_file = source_files.setdefault(code_location.source_file, code_location.source_file)
+        self._parser_node = None
+
+        for value in _field_values(self):
+            for item in value if isinstance(value, list) else (value,):
+                if isinstance(item, ASTNode):
+                    item.detach(locate, source_files)
+
+
+_new_object = object.__new__
+_set_attr = object.__setattr__
+
+
+def _field_values(node: ASTNode):
+    # in declaration order (unvalidated nodes may store their fields in a different order),
+    # through getattr so lazily converted fields get built
+    return [getattr(node, name) for name in node.__class__.model_fields]
+
+
+def _structural_key(value: Any) -> Any:
+    if isinstance(value, NameNode):
+        # case only doesn't matter when comparing the names themselves, inside other nodes it does
+        return value.__class__, value.name
+    if isinstance(value, ASTNode):
+        return value.__hash__()
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_structural_key, value))
+    if isinstance(value, Enum) or value is None:
+        return value
+    # 1 and 1.0 are different constants
+    return type(value), value
+
+
+def _structurally_equal(a: Any, b: Any) -> bool:
+    if isinstance(a, NameNode):
+        return type(a) is type(b) and a.name == b.name
+    if isinstance(a, ASTNode):
+        return a == b
+    if isinstance(a, (list, tuple)):
+        return type(a) is type(b) and len(a) == len(b) and all(map(_structurally_equal, a, b))
+    return type(a) is type(b) and a == b
+
+
+@cache
+def _construct_info(node_class: type[ASTNode]) -> tuple[set[str], dict[str, Any], dict[str, Any]]:
+    return (
+        set(node_class.model_fields),
+        {name: field.default for name, field in node_class.model_fields.items() if not field.is_required()},
+        {name: private.default for name, private in node_class.__private_attributes__.items()}
+    )
+
 
 class UndefNode(ASTNode):
     contents: Any
@@ -90,11 +218,15 @@ class NameNode(ASTNode):
     def serialize(self) -> str:
         return f'{self.node_name}(\'{self.name}\')'
 
+    @property
+    def structural_hash(self) -> int:
+        return hash(self.name.lower())
+
     def __eq__(self, other):
         return isinstance(other, NameNode) and self.name.lower() == other.name.lower()
 
     def __hash__(self):
-        return hash(self.name.lower())
+        return self.structural_hash
 
     def __repr__(self):
         return f'{self.node_name}(\'{self.name}\')'
@@ -195,6 +327,16 @@ class Constant(ValueNode):
     const_type: Literal['normal', 'angular', 'linear'] = 'normal'
 
     def __init__(self, /, value: float | int | str, **kwargs):
+        base_value, const_type = self.parse_value(value)
+        super().__init__(**kwargs, base_value=base_value, const_type=const_type)
+
+    @classmethod
+    def construct_unvalidated(cls, parser_node: ParserRuleContext = None, /, value: float | int | str = 0, **fields):
+        base_value, const_type = cls.parse_value(value)
+        return super().construct_unvalidated(parser_node, base_value=base_value, const_type=const_type, **fields)
+
+    @staticmethod
+    def parse_value(value: float | int | str) -> tuple[int | float, Literal['normal', 'angular', 'linear']]:
         const_type: Literal['normal', 'angular', 'linear'] = 'normal'
         if isinstance(value, str):
             if value[0] == '[' and value[-1] == ']':
@@ -208,7 +350,7 @@ class Constant(ValueNode):
                 value = int(value, base=16)
             else:
                 value = int(value)
-        super().__init__(**kwargs, base_value=value, const_type=const_type)
+        return value, const_type
 
     def __repr__(self):
         if self.const_type == 'normal':
@@ -234,7 +376,7 @@ class Constant(ValueNode):
             raise CodeError(
                 f'{"Overflow" if int_value > 0 else "Underflow"} error compiling constant {self.model_dump()}. '
                 f'Computed value (int_value) cannot fit inside a 32bit int',
-                CodeLocation.from_parser_node(self.parser_node)
+                self.code_location
             )
 
         # force large unsigned ints to fit
@@ -243,7 +385,7 @@ class Constant(ValueNode):
             if isinstance(self.base_value, float):
                 print(
                     f'[WARNING] Converted float from {self.model_dump()} (computed: {number_value}) to very large negative int {int_value}',
-                    CodeLocation.from_parser_node(self.parser_node)
+                    self.code_location
                 )
 
         return int_value
@@ -435,6 +577,50 @@ class FuncDeclaration(Declaration):
     args: list[ArgName]
     block: StatementBlock
 
+    # set while the block has not been converted from the parse tree yet
+    _block_builder: Union[Callable[[], StatementBlock], None] = None
+    # whether the fields are validated once the block is built
+    _validate_lazy_fields: bool = False
+
+    @classmethod
+    def construct_lazy(
+        cls,
+        parser_node: ParserRuleContext = None,
+        /,
+        block_builder: Callable[[], StatementBlock] = None,
+        validate: bool = False,
+        **fields
+    ) -> Self:
+        """
+        Build a function whose block is only made by ``block_builder`` once it is first accessed
+
+        With ``validate`` the fields are validated then, as constructing the node normally would have.
+        """
+        node = cls.construct_unvalidated(parser_node, **fields)
+        node._block_builder = block_builder
+        node._validate_lazy_fields = validate
+        return node
+
+    def __getattr__(self, item):
+        if item == 'block':
+            private = self.__pydantic_private__
+            block_builder = private.get('_block_builder')
+            if block_builder is not None:
+                block = block_builder()
+                if private['_validate_lazy_fields']:
+                    validated = self.__class__.model_validate({'name': self.name, 'args': self.args, 'block': block})
+                    self.__dict__.update(validated.__dict__)
+                    block = validated.block
+                self.__dict__['block'] = block
+                private['_block_builder'] = None
+                return block
+        return super().__getattr__(item)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the builder holds on to the parse tree, convert the block before pickling
+        _ = self.block
+        return super().__getstate__()
+
     def value(self):
         return SimpleNamespace(name=self.name, args=self.args, block=self.block)
 
@@ -1,6 +1,8 @@
 import json
 import operator
+from functools import partial
 from types import SimpleNamespace
+from typing import TypeVar
 
 from antlr4.ParserRuleContext import ParserRuleContext
 
@@ -8,6 +10,20 @@ import bos.ast_nodes as nodes
 from bos.gen.BosParser import BosParser
 from bos.gen.BosParserVisitor import BosParserVisitor
 
+_NodeT = TypeVar('_NodeT', bound=nodes.ASTNode)
+
+
+_arg_attributes_by_class: dict[type[ParserRuleContext], tuple[str, ...]] = {}
+
+
+def _arg_attributes(ctx: ParserRuleContext) -> tuple[str, ...]:
+    # the arg1, arg2... labels of a rule (instance attributes, so they're looked up on the first context seen),
+    # in the order dir() lists them
+    attributes = _arg_attributes_by_class.get(type(ctx))
+    if attributes is None:
+        attributes = _arg_attributes_by_class[type(ctx)] = tuple(attr for attr in dir(ctx) if attr.startswith('arg'))
+    return attributes
+
 
 class ASTVisitor(BosParserVisitor):
 
@@ -38,10 +54,28 @@ class ASTVisitor(BosParserVisitor):
         nodes.ExpressionOp.LOGICAL_XOR: lambda a, b: int(bool(a) ^ bool(b))
     }
 
-    def __init__(self, *args, enable_constant_folding=False, **kwargs):
+    def __init__(
+        self,
+        *args,
+        enable_constant_folding=False,
+        validate_nodes=True,
+        lazy_function_bodies=False,
+        **kwargs
+    ):
         self.enable_constant_folding = enable_constant_folding
+        # pydantic validation of every node is most of the conversion time, the visitor already builds well typed
+        # values so it can be turned off once the grammar and node definitions are known to agree
+        self.validate_nodes = validate_nodes
+        # function blocks are only converted when something reads FuncDeclaration.block,
+        # which keeps the parse tree alive as long as the AST
+        self.lazy_function_bodies = lazy_function_bodies
         super().__init__(*args, **kwargs)
 
+    def make_node(self, node_class: type[_NodeT], parser_node: ParserRuleContext | None, /, **fields) -> _NodeT:
+        if self.validate_nodes:
+            return node_class(parser_node=parser_node, **fields)
+        return node_class.construct_unvalidated(parser_node, **fields)
+
     def aggregateResult(self, aggregate, next_result):
         if next_result is None:
             return aggregate
@@ -58,7 +92,7 @@ class ASTVisitor(BosParserVisitor):
         result = super().visitChildren(node)
         if isinstance(result, nodes.ASTNode):
             return result
-        return nodes.UndefNode(contents=result, parser_node=node)
+        return self.make_node(nodes.UndefNode, node, contents=result)
 
     def visitTypedChildren(self, node: ParserRuleContext, child_type: type[ParserRuleContext]):
         result = []
@@ -67,76 +101,108 @@ class ASTVisitor(BosParserVisitor):
         return result
 
     def visitPieceName(self, ctx: BosParser.PieceNameContext):
-        return nodes.PieceName(name=ctx.getText(), parser_node=ctx)
+        return self.make_node(nodes.PieceName, ctx, name=ctx.getText())
 
     def visitPieceDecl(self, ctx: BosParser.PieceDeclContext):
-        return nodes.PieceDeclaration(names=self.visitTypedChildren(ctx, BosParser.PieceNameContext), parser_node=ctx)
+        return self.make_node(
+            nodes.PieceDeclaration, ctx,
+            names=self.visitTypedChildren(ctx, BosParser.PieceNameContext)
+        )
 
     def visitVarName(self, ctx: BosParser.VarNameContext):
-        return nodes.VarName(name=ctx.getText(), parser_node=ctx)
+        return self.make_node(nodes.VarName, ctx, name=ctx.getText())
 
     def visitStaticVarDecl(self, ctx: BosParser.StaticVarDeclContext):
-        return nodes.StaticVarDeclaration(names=self.visitTypedChildren(ctx, BosParser.VarNameContext), parser_node=ctx)
+        return self.make_node(
+            nodes.StaticVarDeclaration, ctx,
+            names=self.visitTypedChildren(ctx, BosParser.VarNameContext)
+        )
 
     def visitFuncName(self, ctx: BosParser.FuncNameContext):
-        return nodes.FuncName(name=ctx.getText(), parser_node=ctx)
+        return self.make_node(nodes.FuncName, ctx, name=ctx.getText())
 
     def visitFuncDecl(self, ctx: BosParser.FuncDeclContext):
-        return nodes.FuncDeclaration(
+        if self.lazy_function_bodies:
+            return nodes.FuncDeclaration.construct_lazy(
+                ctx,
+                block_builder=partial(self.visit, ctx.statementBlock()),
+                validate=self.validate_nodes,
+                name=self.visit(ctx.funcName()),
+                args=self.visitTypedChildren(ctx, BosParser.ArgNameContext)
+            )
+
+        return self.make_node(
+            nodes.FuncDeclaration, ctx,
             name=self.visit(ctx.funcName()),
             args=self.visitTypedChildren(ctx, BosParser.ArgNameContext),
-            block=self.visit(ctx.statementBlock()),
-            parser_node=ctx
+            block=self.visit(ctx.statementBlock())
         )
 
     def visitConstant(self, ctx: BosParser.ConstantContext):
-        return nodes.Constant(value=ctx.getText(), parser_node=ctx)
+        return self.make_node(nodes.Constant, ctx, value=ctx.getText())
 
     def visitAxis(self, ctx: BosParser.AxisContext):
-        return nodes.Axis(axis=nodes.AxisEnum.from_str(ctx.getText()), parser_node=ctx)
+        return self.make_node(nodes.Axis, ctx, axis=nodes.AxisEnum.from_str(ctx.getText()))
 
     def visitArgName(self, ctx: BosParser.ArgNameContext):
-        return nodes.ArgName(name=ctx.getText(), parser_node=ctx)
+        return self.make_node(nodes.ArgName, ctx, name=ctx.getText())
 
     def visitUnaryExpr(self, ctx: BosParser.UnaryExprContext):
-        op = nodes.ExpressionOp(ctx.op.type)
-        operand = self.visit(ctx.operand)
-
+        return self.build_unary_expr(ctx, op=nodes.ExpressionOp(ctx.op.type), operand=self.visit(ctx.operand))
+
+    def build_unary_expr(
+        self,
+        ctx: ParserRuleContext,
+        /,
+        op: nodes.ExpressionOp,
+        operand: nodes.Expression | nodes.ValueNode
+    ) -> nodes.Expression | nodes.ValueNode:
         if self.enable_constant_folding and isinstance(operand, nodes.Constant):
-            return nodes.Constant(
-                value=self.UNARY_OP_FUNC_MAPPING[op](operand.number_value()),
-                parser_node=ctx
+            return self.make_node(
+                nodes.Constant, ctx,
+                value=self.UNARY_OP_FUNC_MAPPING[op](operand.number_value())
             )
 
-        return nodes.UnaryExpression(
+        return self.make_node(
+            nodes.UnaryExpression, ctx,
             op=op,
-            operand=operand,
-            parser_node=ctx
+            operand=operand
         )
 
     def visitBinaryExpr(self, ctx: BosParser.BinaryExprContext):
-        op = nodes.ExpressionOp(ctx.op.type)
-        operand1 = self.visit(ctx.operand1)
-        operand2 = self.visit(ctx.operand2)
+        return self.build_binary_expr(
+            ctx,
+            operand1=self.visit(ctx.operand1),
+            op=nodes.ExpressionOp(ctx.op.type),
+            operand2=self.visit(ctx.operand2)
+        )
 
+    def build_binary_expr(
+        self,
+        ctx: ParserRuleContext,
+        /,
+        operand1: nodes.Expression | nodes.ValueNode,
+        op: nodes.ExpressionOp,
+        operand2: nodes.Expression | nodes.ValueNode
+    ) -> nodes.Expression | nodes.ValueNode:
         if (
             self.enable_constant_folding
             and isinstance(operand1, nodes.Constant)
             and isinstance(operand2, nodes.Constant)
         ):
-            return nodes.Constant(
+            return self.make_node(
+                nodes.Constant, ctx,
                 value=self.BINARY_OP_FUNC_MAPPING[op](
                     operand1.number_value(),
                     operand2.number_value()
-                ),
-                parser_node=ctx
+                )
             )
 
-        return nodes.BinaryExpression(
+        return self.make_node(
+            nodes.BinaryExpression, ctx,
             operand1=operand1,
             op=op,
-            operand2=operand2,
-            parser_node=ctx
+            operand2=operand2
         )
 
     def visitExpressionList(self, ctx: BosParser.ExpressionListContext):
@@ -146,9 +212,9 @@ class ASTVisitor(BosParserVisitor):
         ]
 
     def visitStatementBlock(self, ctx: BosParser.StatementBlockContext):
-        return nodes.StatementBlock(
-            statements=self.visitTypedChildren(ctx, BosParser.StatementContext),
-            parser_node=ctx
+        return self.make_node(
+            nodes.StatementBlock, ctx,
+            statements=self.visitTypedChildren(ctx, BosParser.StatementContext)
         )
 
     def visitKeywordStatementInner(self, ctx: ParserRuleContext):
@@ -164,44 +230,42 @@ class ASTVisitor(BosParserVisitor):
         elif keyword == nodes.Keyword.START_SCRIPT:
             statement_class = nodes.StartStatement
 
-        # noinspection PyArgumentList
-        return statement_class(
+        return self.make_node(
+            statement_class, ctx,
             keyword=keyword,
-            args=args,
-            parser_node=ctx
+            args=args
         )
 
     def _extract_args(self, ctx):
         args = []
-        for attr in dir(ctx):
-            if attr.startswith('arg'):
-                arg_ctx = getattr(ctx, attr)
-                args.append(self.visit(arg_ctx) if arg_ctx is not None else None)
+        for attr in _arg_attributes(ctx):
+            arg_ctx = getattr(ctx, attr)
+            args.append(self.visit(arg_ctx) if arg_ctx is not None else None)
         return args
 
     def visitKeywordStatement(self, ctx: BosParser.KeywordStatementContext):
         return self.visitKeywordStatementInner(ctx.getChild(0, ParserRuleContext))
 
     def visitVarStatement(self, ctx: BosParser.VarStatementContext):
-        return nodes.VarStatement(
-            vars=self.visitTypedChildren(ctx, BosParser.VarNameContext),
-            parser_node=ctx
+        return self.make_node(
+            nodes.VarStatement, ctx,
+            vars=self.visitTypedChildren(ctx, BosParser.VarNameContext)
         )
 
     def visitIfStatement(self, ctx: BosParser.IfStatementContext):
         else_ctx: BosParser.ElseBlockContext = ctx.elseBlock()
-        return nodes.IfStatement(
+        return self.make_node(
+            nodes.IfStatement, ctx,
             condition=self.visit(ctx.expression()),
             then_block=self.visit(ctx.statementBlock()),
-            else_block=self.visit(else_ctx.statementBlock()) if else_ctx is not None else None,
-            parser_node=ctx
+            else_block=self.visit(else_ctx.statementBlock()) if else_ctx is not None else None
         )
 
     def visitWhileStatement(self, ctx: BosParser.WhileStatementContext):
-        return nodes.WhileStatement(
+        return self.make_node(
+            nodes.WhileStatement, ctx,
             condition=self.visit(ctx.expression()),
-            block=self.visit(ctx.statementBlock()),
-            parser_node=ctx
+            block=self.visit(ctx.statementBlock())
         )
 
     # def visitForStatement(self, ctx: BosParser.ForStatementContext):
@@ -217,48 +281,50 @@ class ASTVisitor(BosParserVisitor):
         inc_ctx: BosParser.IncStatementContext = ctx.incStatement()
         if inc_ctx is not None:
             var_name = self.visit(inc_ctx.varName())
-            return nodes.AssignStatement(
+            return self.make_node(
+                nodes.AssignStatement, inc_ctx,
                 variable=var_name,
-                expression=nodes.BinaryExpression(
-                    operand1=nodes.VarNameTerm(var_name=var_name),
+                expression=self.make_node(
+                    nodes.BinaryExpression, None,
+                    operand1=self.make_node(nodes.VarNameTerm, None, var_name=var_name),
                     op=nodes.ExpressionOp.ADD,
-                    operand2=nodes.Constant(value=1)
-                ),
-                parser_node=inc_ctx
+                    operand2=self.make_node(nodes.Constant, None, value=1)
+                )
             )
 
         dec_ctx: BosParser.DecStatementContext = ctx.decStatement()
         if dec_ctx is not None:
             var_name = self.visit(dec_ctx.varName())
-            return nodes.AssignStatement(
-                variable=self.visit(var_name),
-                expression=nodes.BinaryExpression(
-                    operand1=var_name,
-                    op=nodes.ExpressionOp.SUB,
-                    operand2=nodes.Constant(value=1)
-                ),
-                parser_node=dec_ctx
+            return self.make_node(
+                nodes.AssignStatement, dec_ctx,
+                variable=var_name,
+                expression=self.make_node(
+                    nodes.BinaryExpression, None,
+                    operand1=self.make_node(nodes.VarNameTerm, None, var_name=var_name),
+                    op=nodes.ExpressionOp.MINUS,
+                    operand2=self.make_node(nodes.Constant, None, value=1)
+                )
             )
 
-        return nodes.AssignStatement(
+        return self.make_node(
+            nodes.AssignStatement, ctx,
             variable=self.visit(ctx.varName()),
-            expression=self.visit(ctx.expression()),
-            parser_node=ctx
+            expression=self.visit(ctx.expression())
         )
 
     def visitReturnStatement(self, ctx: BosParser.ReturnStatementContext):
-        return nodes.ReturnStatement(
-            expression=self.visit(ctx.expression()) if ctx.expression() is not None else None,
-            parser_node=ctx
+        return self.make_node(
+            nodes.ReturnStatement, ctx,
+            expression=self.visit(ctx.expression()) if ctx.expression() is not None else None
         )
 
     def visitEmptyStatement(self, ctx: BosParser.EmptyStatementContext):
-        return nodes.EmptyStatement(parser_node=ctx)
+        return self.make_node(nodes.EmptyStatement, ctx)
 
     def visitFile(self, ctx: BosParser.FileContext):
-        return nodes.File(
-            declarations=self.visitTypedChildren(ctx, BosParser.DeclarationContext),
-            parser_node=ctx
+        return self.make_node(
+            nodes.File, ctx,
+            declarations=self.visitTypedChildren(ctx, BosParser.DeclarationContext)
         )
 
     def visitSpeedOrNow(self, ctx: BosParser.SpeedOrNowContext):
@@ -267,29 +333,29 @@ class ASTVisitor(BosParserVisitor):
         return None
 
     def visitGetTerm(self, ctx: BosParser.GetTermContext):
-        return nodes.GetTerm(
-            get_call=self.visit(ctx.getCall()),
-            parser_node=ctx
+        return self.make_node(
+            nodes.GetTerm, ctx,
+            get_call=self.visit(ctx.getCall())
         )
 
     def visitRandTerm(self, ctx: BosParser.RandTermContext):
-        return nodes.RandTerm(
+        return self.make_node(
+            nodes.RandTerm, ctx,
             min=self.visit(ctx.expression(0)),
-            max=self.visit(ctx.expression(1)),
-            parser_node=ctx
+            max=self.visit(ctx.expression(1))
         )
 
     def visitVarNameTerm(self, ctx: BosParser.VarNameTermContext):
-        return nodes.VarNameTerm(
-            var_name=self.visit(ctx.varName()),
-            parser_node=ctx
+        return self.make_node(
+            nodes.VarNameTerm, ctx,
+            var_name=self.visit(ctx.varName())
         )
 
     def visitGetCall(self, ctx: BosParser.GetCallContext):
-        return nodes.GetCall(
+        return self.make_node(
+            nodes.GetCall, ctx,
             value_idx=self.visit(ctx.value_idx),
-            args=self._extract_args(ctx),
-            parser_node=ctx
+            args=self._extract_args(ctx)
         )
 
 
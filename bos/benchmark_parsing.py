@@ -0,0 +1,201 @@
+import argparse
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+
+from antlr4 import CommonTokenStream, InputStream
+
+from bos.ast_visitor import ASTVisitor
+from bos.bos_loader import BosLoader
+from bos.bos_preprocessor import BosPreprocessor
+from bos.char_stream import StrInputStream
+from bos.fast_lexer import FastBosLexer
+from bos.gen.BosAstBuilder import BosAstBuilder
+from bos.gen.BosLexer import BosLexer
+from bos.gen.BosParser import BosParser
+from bos.token_buffer import CompactTokenStream
+
+log = logging.getLogger(__name__)
+
+
+def lex_with_bos_lexer(loader: BosLoader):
+    CommonTokenStream(BosLexer(InputStream(loader.file_contents))).fill()
+
+
+def lex_with_fast_lexer(loader: BosLoader):
+    CommonTokenStream(FastBosLexer(loader.file_contents)).fill()
+
+
+def lex_preprocessed_with(stream_class: type[InputStream], token_stream_class=CommonTokenStream):
+    def run(loader: BosLoader):
+        token_stream_class(BosLexer(stream_class(loader.preprocessed_file_contents))).fill()
+    return run
+
+
+def allocated_by(build: Callable[[], object]) -> int:
+    """Bytes still allocated by what ``build()`` returns, not counting what it was built from"""
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def filled_token_stream(token_stream_class: type[CommonTokenStream], text: str) -> CommonTokenStream:
+    token_stream = token_stream_class(BosLexer(StrInputStream(text)))
+    token_stream.fill()
+    return token_stream
+
+
+def parse_with_file_rule(loader: BosLoader):
+    """The plain ``BosParser.file_()`` path, default LL prediction for the whole file"""
+    parser = BosParser(CommonTokenStream(BosLexer(InputStream(loader.preprocessed_file_contents))))
+    return ASTVisitor(enable_constant_folding=loader.enable_constant_folding).visitFile(parser.file_())
+
+
+def convert_with(visitor_class: type[ASTVisitor]):
+    def run(loader: BosLoader):
+        return visitor_class(enable_constant_folding=loader.enable_constant_folding).visitFile(loader.parser_node_tree)
+    return run
+
+
+def parse_with_loader(loader: BosLoader):
+    loader._run_parser(force_reload=True)
+    loader._run_ast_conversion(force_reload=True)
+
+
+def parse_with_recursive_descent(loader: BosLoader):
+    loader._run_recursive_descent_parser(force_reload=True)
+
+
+def preprocess_with_pcpp(loader: BosLoader):
+    BosPreprocessor().process_file(loader.file_contents, loader.filepath, loader.include_paths)
+
+
+def preprocess_directive_free_first(loader: BosLoader):
+    """What the loader does, pcpp only runs for units the fast path can't handle"""
+    if BosPreprocessor.process_directive_free(loader.file_contents, loader.filepath, loader.include_paths) is None:
+        preprocess_with_pcpp(loader)
+
+
+def load_with(**options):
+    """The whole pipeline on a fresh loader, preprocessing included"""
+    def run(loader: BosLoader):
+        BosLoader(loader.filepath, loader.include_paths, preprocessor_cache=None, **options).load_file()
+    return run
+
+
+def parse_in_parallel(workers: int):
+    def run(loader: BosLoader):
+        loader.parallel_parse_workers = workers
+        try:
+            loader._run_parallel_parse(force_reload=True)
+        finally:
+            loader.parallel_parse_workers = 0
+    return run
+
+
+def time_case(run: Callable[[BosLoader], object], loaders: list[BosLoader], repeats: int) -> list[float]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for loader in loaders:
+            run(loader)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Time the BOS parsing pipeline over a directory of units')
+    arg_parser.add_argument('corpus_dir', nargs='?', default='./example_files/Units')
+    arg_parser.add_argument('-I', '--include', action='append', default=[], help='extra include path')
+    arg_parser.add_argument('-r', '--repeats', type=int, default=3)
+    arg_parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    arg_parser.add_argument('--only', action='append', help='only run these groups of cases')
+    args = arg_parser.parse_args()
+
+    corpus_dir = Path(args.corpus_dir)
+    include_paths = [corpus_dir, *args.include]
+    loaders = []
+    for bos_file in sorted(corpus_dir.rglob('*.bos')):
+        if 'preprocessed' in bos_file.name:
+            continue
+        loader = BosLoader(bos_file, include_paths, preprocessor_cache=None)
+        try:
+            loader.load_file()
+        except Exception as err:
+            log.warning('Skipping %s: %s', bos_file, err)
+            continue
+        loaders.append(loader)
+
+    print(f'{len(loaders)} units, {sum(len(ld.preprocessed_file_contents) for ld in loaders)} preprocessed chars')
+
+    # the first case of each group is the baseline the others are compared against
+    case_groups = {
+        'lexing': {
+            'BosLexer (unpreprocessed source)': lex_with_bos_lexer,
+            'FastBosLexer (unpreprocessed source)': lex_with_fast_lexer,
+            'BosLexer + InputStream (preprocessed)': lex_preprocessed_with(InputStream),
+            'BosLexer + StrInputStream (preprocessed)': lex_preprocessed_with(StrInputStream),
+            'BosLexer + StrInputStream + CompactTokenStream': lex_preprocessed_with(StrInputStream, CompactTokenStream),
+        },
+        'parsing': {
+            'BosParser.file_()': parse_with_file_rule,
+            'BosLoader (SLL, per declaration LL)': parse_with_loader,
+            'RecursiveDescentParser': parse_with_recursive_descent,
+            f'BosLoader parallel ({args.workers} workers)': parse_in_parallel(args.workers),
+        },
+        'preprocessing': {
+            'BosPreprocessor.process_file()': preprocess_with_pcpp,
+            'directive-free fast path, pcpp fallback': preprocess_directive_free_first,
+        },
+        'pipeline': {
+            'BosLoader.load_file()': load_with(),
+            'BosLoader.load_file(), lean': load_with(lean=True),
+            'BosLoader.load_file(), streamed pcpp tokens': load_with(stream_preprocessor_tokens=True),
+        },
+        'conversion': {
+            'ASTVisitor': convert_with(ASTVisitor),
+            'BosAstBuilder (generated)': convert_with(BosAstBuilder),
+        },
+    }
+
+    for group, cases in case_groups.items():
+        if args.only and group not in args.only:
+            continue
+
+        print(f'-- {group}')
+        baseline = None
+        for name, run in cases.items():
+            timings = time_case(run, loaders, args.repeats)
+            best = min(timings)
+            baseline = baseline or best
+            print(
+                f'{name:45} best {best:8.3f}s  median {statistics.median(timings):8.3f}s  '
+                f'speedup x{baseline / best:.2f}'
+            )
+
+    if not args.only or 'memory' in args.only:
+        print('-- memory, char and token streams of the largest units')
+        for loader in sorted(loaders, key=lambda ld: len(ld.preprocessed_file_contents))[-3:]:
+            text = loader.preprocessed_file_contents
+            print(
+                f'{loader.filepath.name:25} {len(text):9} chars  '
+                f'InputStream {allocated_by(partial(InputStream, text)) / 1024:6.0f} KiB  '
+                f'StrInputStream {allocated_by(partial(StrInputStream, text)) / 1024:4.0f} KiB  '
+                f'CommonTokenStream {allocated_by(partial(filled_token_stream, CommonTokenStream, text)) / 1024:6.0f} KiB  '
+                f'CompactTokenStream {allocated_by(partial(filled_token_stream, CompactTokenStream, text)) / 1024:6.0f} KiB'
+            )
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -1,27 +1,97 @@
 import logging
+import re
+import threading
 import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from itertools import repeat
 from os import PathLike
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 
 import antlr4.error.ErrorListener
 import pcpp
 from antlr4 import Parser
-from antlr4.CommonTokenStream import CommonTokenStream
-from antlr4.InputStream import InputStream
-from antlr4.Token import CommonToken
+from antlr4.Token import CommonToken, Token
+from antlr4.atn.ATNState import ATNState
 from antlr4.atn.PredictionMode import PredictionMode
-from antlr4.error.ErrorStrategy import BailErrorStrategy
+from antlr4.atn.Transition import RuleTransition
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 
-from bos import ast_nodes
-from bos.ast_visitor import ASTVisitor
+from bos import ast_nodes, dfa_snapshot
 from bos.bos_preprocessor import BosPreprocessor
+from bos.char_stream import StrInputStream
+from bos.decision_profile import DecisionProfile, ProfilingParserATNSimulator
+from bos.gen.BosAstBuilder import BosAstBuilder
 from bos.gen.BosLexer import BosLexer
 from bos.gen.BosParser import BosParser
+from bos.parallel_parse import group_declarations, split_declarations
+from bos.parse_budget import (
+    BudgetedParserATNSimulator, ParseBudgetReport, ParseCancelledError, ParseTimeoutError, shared_parse_budget_report
+)
+from bos.parse_cache import ParseCache
+from bos.pcpp_token_source import PcppTokenSource
+from bos.preprocessor_cache import PreprocessorCache, shared_preprocessor_cache
+from bos.recursive_descent_parser import RecursiveDescentParser
+from bos.token_buffer import CompactTokenStream
 from code_error import CodeError
 from code_location import CodeLocation
 
 
+@cache
+def _file_declaration_state() -> ATNState:
+    """The ATN state ``BosParser.file_()`` is in when it calls ``declaration()``"""
+    for state in BosParser.atn.states:
+        if state is None or state.ruleIndex != BosParser.RULE_file:
+            continue
+        for transition in state.transitions:
+            if isinstance(transition, RuleTransition) and transition.target.ruleIndex == BosParser.RULE_declaration:
+                return state
+    raise LookupError('file rule never invokes the declaration rule')
+
+
+class _SilentBailErrorStrategy(BailErrorStrategy):
+    """Bails out of the SLL attempt at a declaration without reporting the error, the LL attempt reports it"""
+
+    def reportError(self, recognizer: Parser, e):
+        pass
+
+
+def _parse_declaration_chunk(
+    bos_file_path: str,
+    chunk_text: str,
+    enable_constant_folding: bool,
+    validate_ast_nodes: bool,
+    lean: bool,
+    parse_time_budget: float | None,
+    parse_step_budget: int | None
+) -> tuple[list[ast_nodes.Declaration], list[CodeError], int]:
+    """Process pool worker for ``BosLoader(parallel_parse_workers=...)``"""
+    loader = BosLoader(
+        bos_file_path,
+        enable_constant_folding=enable_constant_folding,
+        validate_ast_nodes=validate_ast_nodes,
+        preprocessor_cache=None,
+        lean=lean,
+        parse_time_budget=parse_time_budget,
+        parse_step_budget=parse_step_budget,
+        parse_budget_report=None
+    )
+    loader.preprocessed_file_contents = chunk_text
+    try:
+        loader._run_parser()
+    except ValueError:
+        return [], loader.parse_errors, loader.ll_fallback_count
+
+    loader._run_ast_conversion()
+    return loader.ast_node_tree.declarations, loader.parse_errors, loader.ll_fallback_count
+
+
 class BosLoader:
+    # more chunks than workers evens out functions of very different sizes
+    PARALLEL_CHUNKS_PER_WORKER = 4
 
     class ErrorListener(antlr4.error.ErrorListener.ErrorListener):
         def __init__(self, loader: 'BosLoader'):
@@ -37,30 +107,85 @@ class BosLoader:
         include_paths: list[str | PathLike[str]] = None,
         /,
         enable_constant_folding=False,
+        validate_ast_nodes=True,
+        lazy_function_bodies=False,
+        detach_parse_tree=False,
+        use_recursive_descent_parser=False,
         file_contents: str = None,
+        parse_cache: ParseCache = None,
+        preprocessor_cache: PreprocessorCache | None = shared_preprocessor_cache,
+        precompiled_header: BosPreprocessor.PrecompiledHeader = None,
+        parallel_parse_workers: int = 0,
+        lean=False,
+        directive_free_fast_path=True,
+        stream_preprocessor_tokens=False,
+        parse_time_budget: float | None = None,
+        parse_step_budget: int | None = None,
+        parse_budget_report: ParseBudgetReport | None = shared_parse_budget_report,
+        parse_cancel_event: threading.Event | None = None,
+        decision_profile: DecisionProfile | None = None,
     ):
 
         self.filepath = Path(bos_file_path)
         self.include_paths = [Path(p) for p in include_paths] if include_paths is not None else []
         self.enable_constant_folding = enable_constant_folding
-
-        if file_contents is not None:
-            self.file_contents = file_contents
+        self.validate_ast_nodes = validate_ast_nodes
+        # only has an effect on the serial parse path, parallel workers and the parse cache need whole trees
+        self.lazy_function_bodies = lazy_function_bodies
+        # resolve every node's code location and drop the parse tree, token stream and lexer once the AST is built
+        self.detach_parse_tree = detach_parse_tree
+        # build the AST straight from the tokens with RecursiveDescentParser, there is no ANTLR parse tree then
+        self.use_recursive_descent_parser = use_recursive_descent_parser
+        self.parse_cache = parse_cache
+        self.preprocessor_cache = preprocessor_cache
+        self.precompiled_header = precompiled_header
+        self.parallel_parse_workers = parallel_parse_workers
+        # for batch compiles, the preprocessor strips comments and skips the reconstructed text and source chunks,
+        # the token stream skips whitespace, comments and preprocessor lines
+        self.lean = lean
+        self.skipped_token_channels = (
+            (Token.HIDDEN_CHANNEL, BosLexer.COMMENTS, BosLexer.PREPROCESSOR) if lean else ()
+        )
+        # sources without preprocessor directives get their few builtin macros substituted without pcpp
+        self.directive_free_fast_path = directive_free_fast_path
+        # feed pcpp's tokens to the parser through PcppTokenSource, there is no preprocessed text to lex again then,
+        # so nothing for the preprocessor or parse cache, or to split between parallel parse workers
+        self.stream_preprocessor_tokens = stream_preprocessor_tokens
+        # seconds and ANTLR prediction steps a parse may take before it is stopped with a ParseTimeoutError,
+        # recorded in parse_budget_report, RecursiveDescentParser has no predictions to go pathological in
+        self.parse_time_budget = parse_time_budget
+        self.parse_step_budget = parse_step_budget
+        self.parse_budget_report = parse_budget_report
+        # set from another thread to stop the ANTLR parse in progress with a ParseCancelledError,
+        # the file is then parsed in this process, the event can't reach parallel parse workers
+        self.parse_cancel_event = parse_cancel_event
+        # run the ANTLR parser under ProfilingParserATNSimulator, adding its prediction stats to this profile,
+        # every file is then parsed serially, in this process and without the parse cache
+        if decision_profile is not None and use_recursive_descent_parser:
+            raise ValueError('decision_profile profiles the ANTLR parser, RecursiveDescentParser makes no predictions')
+        self.decision_profile = decision_profile
 
         self.log = logging.getLogger(self.__class__.__name__).getChild(self.filepath.name)
 
-        self.file_contents: str | None = None
+        self.file_contents: str | None = file_contents
 
         self.preprocessor: pcpp.Preprocessor | None = None
         self.preprocessed_file_contents: str | None = None
-
-        self.bos_lexer: BosLexer | None = None
-        self.token_stream: CommonTokenStream | None = None
+        self.reconstructed_file_contents: str | None = None
+        self.preproc_chunks: list[BosPreprocessor.Chunk] | None = None
+        # built from the chunks on the first pre_expansion_location call, with the reconstructed text's line starts
+        self._offset_index: BosPreprocessor.OffsetIndex | None = None
+        self._original_line_starts: array | None = None
+
+        self.bos_lexer: BosLexer | PcppTokenSource | None = None
+        self.token_stream: CompactTokenStream | None = None
         self.bos_parser: BosParser | None = None
 
         self.parse_errors: list[CodeError] = []
+        self.ll_fallback_count = 0
         self.parser_node_tree: BosParser.FileContext | None = None
         self.ast_node_tree: ast_nodes.File | None = None
+        self.parse_cache_key: str | None = None
 
     def _load_file_contents(self, force_reload=False):
         if self.file_contents is not None and not force_reload:
@@ -74,59 +199,367 @@ class BosLoader:
         if self.preprocessed_file_contents is not None and not force_reload:
             return
 
-        self.preprocessor = BosPreprocessor()
+        self._offset_index = self._original_line_starts = None
+
+        if self.directive_free_fast_path:
+            result = BosPreprocessor.process_directive_free(
+                self.file_contents, self.filepath, self.include_paths, lean=self.lean
+            )
+            if result is not None:
+                self.preprocessor = None
+                (
+                    self.preprocessed_file_contents,
+                    self.reconstructed_file_contents,
+                    self.preproc_chunks
+                ) = result
+                self.log.debug('No preprocessor directives, skipped pcpp')
+                return
+
+        if self.preprocessor_cache is not None:
+            cached_result = self.preprocessor_cache.lookup(
+                self.file_contents, self.filepath, self.include_paths, lean=self.lean
+            )
+            if cached_result is not None:
+                self.preprocessor = None
+                (
+                    self.preprocessed_file_contents,
+                    self.reconstructed_file_contents,
+                    self.preproc_chunks
+                ) = cached_result
+                self.log.debug('Preprocessor output loaded from cache')
+                return
+
+        self.preprocessor = self._make_preprocessor()
 
         (
             self.preprocessed_file_contents,
             self.reconstructed_file_contents,
             self.preproc_chunks
-        ) = self.preprocessor.process_file(self.file_contents, self.filepath, self.include_paths)
+        ) = result = self.preprocessor.process_file(self.file_contents, self.filepath, self.include_paths)
+        if self.preprocessor.include_skips:
+            self.log.debug(
+                'Skipped %d repeated includes of %d guarded headers',
+                self.preprocessor.include_skips.total(), len(self.preprocessor.include_skips)
+            )
+
+        if self.preprocessor_cache is not None:
+            self.preprocessor_cache.store(
+                self.file_contents, self.filepath, self.include_paths, result,
+                self.preprocessor.opened_includes, self.preprocessor.missing_includes,
+                lean=self.lean
+            )
+
+    def pre_expansion_location(self, token: Token) -> CodeLocation | None:
+        """
+        Where a token of the preprocessed text came from in ``reconstructed_file_contents``, in O(log n)
+
+        A token out of a macro expansion gets the macro's name, one out of an included file the ``#include`` line.
+        None without chunks, in lean and streaming mode.
+        """
+        if self.preproc_chunks is None:
+            return None
+
+        if self._offset_index is None:
+            self._offset_index = BosPreprocessor.OffsetIndex.from_chunks(self.preproc_chunks)
+            self._original_line_starts = array(
+                'i', [0, *(match.end() for match in re.finditer('\n', self.reconstructed_file_contents))]
+            )
+
+        start, end = self._offset_index.to_original(token.start, token.stop + 1)
+        line_starts = self._original_line_starts
+        start_line = bisect_right(line_starts, start)
+        end_line = bisect_right(line_starts, end - 1) if end > start else start_line
+        return CodeLocation(
+            start_line,
+            start - line_starts[start_line - 1] + 1,
+            end_line,
+            end - line_starts[end_line - 1] + 1,
+            # as CodeLocation.from_token takes it from the #line directive
+            f'"{PurePosixPath(self.filepath)}"'
+        )
+
+    @property
+    def include_skips(self) -> dict[str, int] | None:
+        """How often each header was skipped as already included, None when pcpp didn't run"""
+        return dict(self.preprocessor.include_skips) if self.preprocessor is not None else None
+
+    def _make_preprocessor(self) -> BosPreprocessor:
+        precompiled_header = self.precompiled_header
+        if precompiled_header is not None and not precompiled_header.is_valid():
+            self.log.warning('Headers changed since the precompiled header was built, not using it')
+            precompiled_header = None
+
+        return BosPreprocessor(precompiled_header=precompiled_header, lean=self.lean)
+
+    def _make_token_stream(self) -> CompactTokenStream:
+        if self.stream_preprocessor_tokens:
+            self.preprocessor = self._make_preprocessor()
+            self.bos_lexer = PcppTokenSource(
+                self.preprocessor.process_file_tokens(self.file_contents, self.filepath, self.include_paths),
+                self.filepath
+            )
+        else:
+            self.bos_lexer = BosLexer(StrInputStream(self.preprocessed_file_contents))
+        return CompactTokenStream(self.bos_lexer, skip_channels=self.skipped_token_channels)
 
     def _run_parser(self, force_reload=False):
         if self.parser_node_tree is not None and not force_reload:
             return
 
-        self.bos_lexer = BosLexer(InputStream(self.preprocessed_file_contents))
-        self.token_stream = CommonTokenStream(self.bos_lexer)
+        self.token_stream = self._make_token_stream()
 
-        # first try with faster, but weaker, parse strategy
+        self.parse_errors = []
         self.bos_parser = BosParser(self.token_stream)
-        self.bos_parser._interp.predictionMode = PredictionMode.SLL
+        if self.decision_profile is not None:
+            self.bos_parser._interp = ProfilingParserATNSimulator(
+                self.bos_parser, self.decision_profile, self.parse_time_budget, self.parse_step_budget,
+                self.parse_cancel_event
+            )
+        elif (
+            self.parse_time_budget is not None or self.parse_step_budget is not None
+            or self.parse_cancel_event is not None
+        ):
+            self.bos_parser._interp = BudgetedParserATNSimulator(
+                self.bos_parser, self.parse_time_budget, self.parse_step_budget, self.parse_cancel_event
+            )
         self.bos_parser.removeErrorListeners()
-        self.bos_parser._errHandler = BailErrorStrategy()
+        self.bos_parser.addErrorListener(self.ErrorListener(self))
 
         start_time = time.perf_counter()
+        self.parser_node_tree = self._parse_declarations()
+        end_time = time.perf_counter()
 
-        try:
-            self.parser_node_tree = self.bos_parser.file_()
-        except BaseException:
+        declaration_count = len(self.parser_node_tree.declaration())
+        self.log.debug('Parsing took %.2f seconds', end_time - start_time)
+        if self.ll_fallback_count > 0:
             self.log.debug(
-                'File could not be handled by SLL parser, trying again with default LL parser'
+                '%d of %d declarations could not be handled by the SLL parser and were parsed again with LL',
+                self.ll_fallback_count, declaration_count
             )
-            self.bos_parser = BosParser(self.token_stream)
-            self.bos_parser.addErrorListener(self.ErrorListener(self))
 
-            self.parser_node_tree = self.bos_parser.file_()
+        if self.bos_parser.getNumberOfSyntaxErrors() > 0:
+            raise ValueError('Syntax errors found in preprocessed file')
+
+    def _parse_declarations(self) -> BosParser.FileContext:
+        """
+        Equivalent to ``BosParser.file_()``, but each top-level declaration is first tried with the faster, but
+        weaker, SLL strategy and only the declarations it bails on are parsed again with the default LL strategy
+        """
+        parser = self.bos_parser
+        token_stream = self.token_stream
+        declaration_state = _file_declaration_state()
+        declaration_start_tokens = BosParser.atn.nextTokens(declaration_state)
+
+        self.ll_fallback_count = 0
+        sll_error_handler = _SilentBailErrorStrategy()
+
+        file_ctx = BosParser.FileContext(parser, None, -1)
+        parser.enterRule(file_ctx, declaration_state.stateNumber, BosParser.RULE_file)
+        parser.enterOuterAlt(file_ctx, 1)
+
+        while token_stream.LA(1) in declaration_start_tokens:
+            start_index = token_stream.index
+            child_count = len(file_ctx.children) if file_ctx.children else 0
+
+            parser._interp.predictionMode = PredictionMode.SLL
+            parser._errHandler = sll_error_handler
+            parser.state = declaration_state.stateNumber
+            try:
+                parser.declaration()
+                continue
+            except ParseCancellationException:
+                pass
+
+            # throw away whatever the SLL attempt managed to build and rewind to the start of the declaration
+            if file_ctx.children is not None:
+                del file_ctx.children[child_count:]
+            parser._ctx = file_ctx
+            token_stream.seek(start_index)
+            self.ll_fallback_count += 1
+
+            parser._interp.predictionMode = PredictionMode.LL
+            parser._errHandler = DefaultErrorStrategy()
+            parser.state = declaration_state.stateNumber
+            parser.declaration()
+
+        parser.exitRule()
+        return file_ctx
+
+    def _run_parallel_parse(self, force_reload=False):
+        """
+        Split the file at top-level declarations and parse + convert the pieces in a process pool
+
+        Only the AST is kept, the parse tree and its nodes stay in the worker processes.
+        """
+        if self.ast_node_tree is not None and not force_reload:
+            return
+
+        self.bos_lexer = BosLexer(StrInputStream(self.preprocessed_file_contents))
+        self.token_stream = CompactTokenStream(self.bos_lexer, skip_channels=self.skipped_token_channels)
+        self.token_stream.fill()
+
+        chunks = group_declarations(
+            self.token_stream,
+            split_declarations(self.token_stream),
+            self.parallel_parse_workers * self.PARALLEL_CHUNKS_PER_WORKER
+        )
+        if len(chunks) < 2:
+            self._run_parser(force_reload)
+            self._run_ast_conversion(force_reload)
+            return
+
+        self.bos_parser = self.parser_node_tree = None
+        self.parse_errors = []
+        self.ll_fallback_count = 0
 
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=min(self.parallel_parse_workers, len(chunks)),
+            # forked workers inherit this process' DFAs, spawned ones would otherwise start cold
+            initializer=dfa_snapshot.load_snapshot
+        ) as executor:
+            results = list(executor.map(
+                _parse_declaration_chunk,
+                repeat(str(self.filepath)),
+                [chunk.text for chunk in chunks],
+                repeat(self.enable_constant_folding),
+                repeat(self.validate_ast_nodes),
+                repeat(self.lean),
+                repeat(self.parse_time_budget),
+                repeat(self.parse_step_budget)
+            ))
         end_time = time.perf_counter()
-        self.log.debug('Parsing took %.2f seconds (%.2f mins)', end_time - start_time, (end_time - start_time) / 60)
+        self.log.debug(
+            'Parsing %d chunks with %d workers took %.2f seconds',
+            len(chunks), self.parallel_parse_workers, end_time - start_time
+        )
+
+        declarations = []
+        for chunk_declarations, chunk_errors, chunk_ll_fallback_count in results:
+            declarations.extend(chunk_declarations)
+            self.parse_errors.extend(chunk_errors)
+            self.ll_fallback_count += chunk_ll_fallback_count
+
+        if self.ll_fallback_count > 0:
+            self.log.debug(
+                '%d of %d declarations could not be handled by the SLL parser and were parsed again with LL',
+                self.ll_fallback_count, len(declarations)
+            )
 
-        if self.bos_parser.getNumberOfSyntaxErrors() > 0:
+        if self.parse_errors:
             raise ValueError('Syntax errors found in preprocessed file')
 
+        self.ast_node_tree = ast_nodes.File(declarations=declarations)
+
+        first_token = self.token_stream.tokens[chunks[0].first_token_index]
+        last_token = self.token_stream.tokens[chunks[-1].last_token_index]
+        file_location = CodeLocation.from_token(first_token, self.token_stream)
+        if file_location is not None:
+            file_location.end_line = last_token.line + (file_location.start_line - first_token.line)
+            file_location.end_column = last_token.column + 1 + len(last_token.text)
+        self.ast_node_tree._code_location = file_location
+
+    def _run_recursive_descent_parser(self, force_reload=False):
+        if self.ast_node_tree is not None and not force_reload:
+            return
+
+        self.token_stream = self._make_token_stream()
+        self.bos_parser = self.parser_node_tree = None
+        self.parse_errors = []
+        self.ll_fallback_count = 0
+
+        parser = RecursiveDescentParser(
+            self.token_stream,
+            enable_constant_folding=self.enable_constant_folding,
+            validate_nodes=self.validate_ast_nodes
+        )
+
+        start_time = time.perf_counter()
+        try:
+            self.ast_node_tree = parser.parse_file()
+        except CodeError as err:
+            self.parse_errors.append(err)
+            raise ValueError('Syntax errors found in preprocessed file') from err
+        end_time = time.perf_counter()
+        self.log.debug('Parsing and AST conversion took %.2f seconds', end_time - start_time)
+
     def _run_ast_conversion(self, force_reload=False):
         if self.ast_node_tree is not None and not force_reload:
             return
 
-        ast_visitor = ASTVisitor(enable_constant_folding=self.enable_constant_folding)
+        ast_visitor = BosAstBuilder(
+            enable_constant_folding=self.enable_constant_folding,
+            validate_nodes=self.validate_ast_nodes,
+            lazy_function_bodies=self.lazy_function_bodies
+        )
         self.ast_node_tree = ast_visitor.visitFile(self.parser_node_tree)
         self.log.debug('AST conversion complete')
 
+    def _load_from_parse_cache(self, force_reload=False) -> bool:
+        if self.parse_cache is None or self.stream_preprocessor_tokens or self.decision_profile is not None:
+            return False
+
+        if self.ast_node_tree is not None and not force_reload:
+            return True
+
+        self.parse_cache_key = self.parse_cache.key_for(
+            self.preprocessed_file_contents,
+            enable_constant_folding=self.enable_constant_folding
+        )
+        cached_ast = self.parse_cache.load(self.parse_cache_key)
+        if cached_ast is None:
+            return False
+
+        self.ast_node_tree = cached_ast
+        self.bos_lexer = self.token_stream = self.bos_parser = self.parser_node_tree = None
+        self.log.debug('AST loaded from parse cache')
+        return True
+
+    def _store_in_parse_cache(self):
+        if self.parse_cache is None or self.parse_cache_key is None:
+            return
+
+        self.parse_cache.store(self.parse_cache_key, self.ast_node_tree)
+
+    def _detach_parse_tree(self):
+        if self.ast_node_tree is None:
+            return
+
+        self.ast_node_tree.detach()
+        self.bos_lexer = self.token_stream = self.bos_parser = self.parser_node_tree = None
+        self.log.debug('Parse tree released')
+
     def load_file(self, force_reload=False) -> ast_nodes.File:
         self._load_file_contents(force_reload)
-        self._run_preprocessor(force_reload)
-        self._run_parser(force_reload)
-        self._run_ast_conversion(force_reload)
+        if not self.stream_preprocessor_tokens:
+            self._run_preprocessor(force_reload)
+
+        if not self._load_from_parse_cache(force_reload):
+            try:
+                if self.use_recursive_descent_parser:
+                    self._run_recursive_descent_parser(force_reload)
+                elif (
+                    self.parallel_parse_workers > 1 and not self.stream_preprocessor_tokens
+                    and self.decision_profile is None and self.parse_cancel_event is None
+                ):
+                    self._run_parallel_parse(force_reload)
+                else:
+                    self._run_parser(force_reload)
+                    self._run_ast_conversion(force_reload)
+            except ParseCancelledError as err:
+                self.log.debug('%s at %s', err.message, err.error_loc)
+                self.parse_errors.append(err)
+                raise
+            except ParseTimeoutError as err:
+                self.log.warning('%s at %s', err.message, err.error_loc)
+                self.parse_errors.append(err)
+                if self.parse_budget_report is not None:
+                    self.parse_budget_report.record(self.filepath, err)
+                raise
+            self._store_in_parse_cache()
+
+        if self.detach_parse_tree:
+            self._detach_parse_tree()
 
         return self.ast_node_tree
 
@@ -1,16 +1,38 @@
+import copy
+import io
 import logging
 import os
-from dataclasses import dataclass
+import pickle
+import re
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass, field
 from os import PathLike
 from pathlib import PurePosixPath
-from typing import Protocol
+from typing import Protocol, ClassVar
 
 import pcpp
 
+from bos.include_resolver import IncludeResolver, shared_include_resolver
+from bos.preprocessor_cache import file_digest
 from unit_value_nums import UnitValue
 
 log = logging.getLogger(__name__)
 
+# what a source without directives can contain, in the order pcpp's lexer would see it
+_DIRECTIVE_FREE_SCAN = re.compile(
+    r'''
+    (?P<comment>/\*.*?\*/|//[^\n]*)
+    |"[^"\n]*"
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<number>\d\w*)
+    |(?P<unsupported>[#'"]|/\*)
+    ''',
+    re.DOTALL | re.VERBOSE
+)
+
 
 class BosPreprocessor(pcpp.Preprocessor):
 
@@ -44,21 +66,211 @@ class BosPreprocessor(pcpp.Preprocessor):
         def __str__(self):
             return f'[Chunk]\n  source: {self.source}\n  expanded_from: {self.expanded_from}\n  original_text: {repr(self.original_text)}\n           text: {repr(self.text)}'
 
-    def __init__(self, *args, **kwargs):
+    @dataclass
+    class OffsetIndex:
+        """
+        Where each chunk starts in the preprocessed and in the reconstructed text, to map offsets between the two
+
+        An offset in a chunk whose text is its original text maps to the same place in the other text, any other chunk
+        (a macro expansion, an included file, a ``#line`` directive) maps as a whole onto its counterpart.
+        """
+        # one entry more than there are chunks, the last ones are the lengths of the two texts
+        preprocessed_starts: array
+        original_starts: array
+        # 1 where a chunk's text is its original text
+        verbatim: bytearray
+
+        @classmethod
+        def from_chunks(cls, chunks: list['BosPreprocessor.Chunk']) -> 'BosPreprocessor.OffsetIndex':
+            preprocessed_starts, original_starts = array('i', [0]), array('i', [0])
+            verbatim = bytearray()
+            for chunk in chunks:
+                preprocessed_starts.append(preprocessed_starts[-1] + len(chunk.text))
+                original_starts.append(original_starts[-1] + len(chunk.original_text))
+                verbatim.append(chunk.text == chunk.original_text)
+            return cls(preprocessed_starts, original_starts, verbatim)
+
+        def to_original(self, start: int, end: int) -> tuple[int, int]:
+            """The span of the reconstructed text that the preprocessed text from ``start`` up to ``end`` came from"""
+            return self._map(start, end, self.preprocessed_starts, self.original_starts)
+
+        def to_preprocessed(self, start: int, end: int) -> tuple[int, int]:
+            """The span of the preprocessed text that the reconstructed text from ``start`` up to ``end`` became"""
+            return self._map(start, end, self.original_starts, self.preprocessed_starts)
+
+        def _map(self, start: int, end: int, from_starts: array, to_starts: array) -> tuple[int, int]:
+            chunk_count = len(self.verbatim)
+            # the last of the chunks starting there, those before it are empty on this side
+            first = max(bisect_right(from_starts, start, 0, chunk_count) - 1, 0)
+            if self.verbatim[first]:
+                mapped_start = to_starts[first] + start - from_starts[first]
+            else:
+                mapped_start = to_starts[first]
+            if end <= start:
+                return mapped_start, mapped_start
+
+            last = max(bisect_right(from_starts, end - 1, 0, chunk_count) - 1, 0)
+            if self.verbatim[last]:
+                mapped_end = to_starts[last] + end - from_starts[last]
+            else:
+                mapped_end = to_starts[last + 1]
+            return mapped_start, mapped_end
+
+    @dataclass
+    class PrecompiledHeader:
+        """
+        Snapshot of the macro table and emitted tokens after processing a fixed sequence of headers
+
+        Replayed in place of the matching leading ``#include`` directives of a unit,
+        as long as nothing has been defined or undefined before them.
+        """
+
+        @dataclass
+        class Step:
+            header_path: str
+            defined_macros: dict[str, pcpp.preprocessor.Macro]
+            undefined_macros: frozenset[str]
+            include_once: dict[str, str | None]
+            tokens: list['BosPreprocessor._PcppToken']
+            opened_includes: dict[str, str]
+            missing_includes: frozenset[str]
+
+        include_paths: tuple[str, ...]
+        cwd: str
+        steps: list[Step] = field(default_factory=list)
+
+        def matches(self, include_paths: list[str | PathLike[str]] | None) -> bool:
+            return self.include_paths == tuple(str(p) for p in include_paths or ()) and self.cwd == os.getcwd()
+
+        def is_valid(self) -> bool:
+            return all(
+                file_digest(path) == digest
+                for step in self.steps
+                for path, digest in step.opened_includes.items()
+            ) and not any(
+                os.path.isfile(path)
+                for step in self.steps
+                for path in step.missing_includes
+            )
+
+        def save(self, destination: str | PathLike[str]):
+            with open(destination, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        @classmethod
+        def load(cls, source: str | PathLike[str]) -> 'BosPreprocessor.PrecompiledHeader':
+            with open(source, 'rb') as f:
+                return pickle.load(f)
+
+    PRELUDE_DEFINES: ClassVar[list[str]] = [
+        "TRUE 1",
+        "true 1",
+        "FALSE 0",
+        "false 0",
+        "UNKNOWN_UNIT_VALUE(val) val",
+        *[f'{val.name.upper()} {val.value}' for val in UnitValue]
+    ]
+
+    # macros created by PRELUDE_DEFINES, built once per process and shared by every instance
+    _prelude_macros: ClassVar[dict[str, pcpp.preprocessor.Macro] | None] = None
+    # (replacement text of each plain prelude macro, every other macro name, pattern finding any macro name)
+    # for process_directive_free, built once per process
+    _directive_free_macros: ClassVar[tuple[dict[str, str], frozenset[str], re.Pattern] | None] = None
+
+    def __init__(
+        self,
+        *args,
+        precompiled_header: PrecompiledHeader = None,
+        lean=False,
+        include_resolver: IncludeResolver = shared_include_resolver,
+        **kwargs
+    ):
         super().__init__(*args, **kwargs)
 
-        for def_str in [
-            "TRUE 1",
-            "true 1",
-            "FALSE 0",
-            "false 0",
-            "UNKNOWN_UNIT_VALUE(val) val",
-            *[f'{val.name.upper()} {val.value}' for val in UnitValue]
-        ]:
-            self.define(def_str)
+        if BosPreprocessor._prelude_macros is None:
+            for def_str in self.PRELUDE_DEFINES:
+                self.define(def_str)
+            BosPreprocessor._prelude_macros = {
+                name: _detach_macro(macro) for name, macro in self.macros.items()
+                if name in {def_str.split(maxsplit=1)[0].split('(')[0] for def_str in self.PRELUDE_DEFINES}
+            }
+        self.macros.update(BosPreprocessor._prelude_macros)
 
         self.comments = []
 
+        # every include candidate pcpp tried, used to validate cached output
+        self.opened_includes: dict[str, str] = {}
+        self.missing_includes: set[str] = set()
+        # how often each #pragma once or include guarded file was skipped as already included
+        self.include_skips: Counter[str] = Counter()
+
+        self.include_resolver = include_resolver
+        self.precompiled_header = precompiled_header
+        # process_file only produces the preprocessed text, without comments, reconstructed text or chunks
+        self.lean = lean
+        # remaining precompiled header steps, dropped as soon as replaying them would no longer be equivalent
+        self._pending_pch_steps: list[BosPreprocessor.PrecompiledHeader.Step] | None = None
+
+    @classmethod
+    def precompile_headers(
+        cls,
+        header_paths: list[str | PathLike[str]],
+        include_paths: list[str | PathLike[str]] = None
+    ) -> PrecompiledHeader:
+        preprocessor = cls()
+        for include_path in include_paths or ():
+            preprocessor.add_path(include_path)
+
+        precompiled_header = cls.PrecompiledHeader(
+            include_paths=tuple(str(p) for p in include_paths or ()),
+            cwd=os.getcwd()
+        )
+
+        # mimic being #included directly by a unit file
+        preprocessor.include_depth = 1
+
+        for header_path in header_paths:
+            header_path = os.path.abspath(header_path)
+            if header_path in preprocessor.include_once:
+                # pcpp will skip it without touching any state
+                continue
+
+            macros_before = dict(preprocessor.macros)
+            include_once_before = dict(preprocessor.include_once)
+            preprocessor.opened_includes = {}
+            preprocessor.missing_includes = set()
+
+            with preprocessor.on_file_open(False, header_path) as f:
+                data = f.read()
+
+            preprocessor.temp_path.insert(0, os.path.dirname(header_path))
+            tokens = []
+            for token in preprocessor.parsegen(data, header_path, header_path):
+                token = _detach_token(token)
+                token.include_depth = 1
+                tokens.append(token)
+            del preprocessor.temp_path[0]
+
+            precompiled_header.steps.append(
+                cls.PrecompiledHeader.Step(
+                    header_path=header_path,
+                    defined_macros={
+                        name: _detach_macro(macro) for name, macro in preprocessor.macros.items()
+                        if macros_before.get(name) is not macro and name != '__FILE__'
+                    },
+                    undefined_macros=frozenset(macros_before.keys() - preprocessor.macros.keys()),
+                    include_once={
+                        path: guard for path, guard in preprocessor.include_once.items()
+                        if path not in include_once_before
+                    },
+                    tokens=tokens,
+                    opened_includes=preprocessor.opened_includes,
+                    missing_includes=frozenset(preprocessor.missing_includes)
+                )
+            )
+
+        return precompiled_header
+
     def define(self, tokens):
         # strip comment tokens from defines so things do not break
         if isinstance(tokens, list):
@@ -66,19 +278,118 @@ class BosPreprocessor(pcpp.Preprocessor):
 
         return super().define(tokens)
 
+    def on_file_open(self, is_system_include, includepath):
+        try:
+            data, digest = self.include_resolver.read(includepath)
+        except OSError:
+            self.missing_includes.add(includepath)
+            raise
+
+        self.opened_includes[includepath] = digest
+
+        # same decoding and BOM handling as pcpp's default implementation
+        file_handle = io.TextIOWrapper(io.BytesIO(data), encoding=self.assume_encoding)
+        if file_handle.read(1) != '\ufeff':
+            file_handle.seek(0)
+        return file_handle
+
     def on_comment(self, tok):
         # retain comments
         return True
 
     def on_directive_handle(self, directive: _PcppToken, *_, **__):
         super().on_directive_handle(directive, *_, **__)
+        if directive.value in ('define', 'undef'):
+            # the macro table no longer matches the state the precompiled header was captured from
+            self._pending_pch_steps = None
+
         if directive.value == 'line':
             return True
 
         # process and pass through
         return None
 
+    def _include_candidates(self, tokens) -> list[str]:
+        """The paths pcpp tries in turn for an ``#include`` of a quoted or bracketed name, in the same order"""
+        if not tokens:
+            return []
+        if tokens[0].type == self.t_STRING:
+            filename = tokens[0].value[1:-1]
+            search_path = self.temp_path + self.path
+        elif tokens[0].value == '<':
+            closing = next((i for i, token in enumerate(tokens) if token.value == '>'), None)
+            if closing is None:
+                return []
+            filename = ''.join(token.value for token in tokens[1:closing])
+            search_path = self.path
+        else:
+            # a macro naming the file, left to pcpp
+            return []
+        return [os.path.abspath(os.path.join(path, filename)) for path in search_path or ['']]
+
+    def _resolve_quoted_include(self, tokens) -> str | None:
+        if not tokens or tokens[0].type != self.t_STRING:
+            return None
+
+        for full_path in self._include_candidates(tokens):
+            if self.include_resolver.is_file(full_path):
+                return full_path
+            self.missing_includes.add(full_path)
+
+        return None
+
+    def _skip_included(self, tokens) -> bool:
+        """
+        Whether an ``#include`` can be skipped without opening the file, like GCC's multiple-include optimization
+
+        pcpp records every file that has ``#pragma once``, or has all of its contents inside an
+        ``#ifndef GUARD``/``#define GUARD``/``#endif`` guard, and skips it from then on. A guarded file is
+        only skipped while its guard macro is still defined, after an ``#undef`` it is read again.
+        """
+        for full_path in self._include_candidates(tokens):
+            if full_path in self.include_once:
+                guard = self.include_once[full_path]
+                if guard is not None and guard not in self.macros:
+                    # pcpp records it again if the guard still wraps everything
+                    del self.include_once[full_path]
+                    return False
+                self.include_skips[full_path] += 1
+                return True
+            if self.include_resolver.is_file(full_path):
+                return False
+        return False
+
+    def _replay_precompiled_header(self, tokens) -> list[_PcppToken] | None:
+        if not self._pending_pch_steps or self.include_depth != 1:
+            return None
+
+        header_path = self._resolve_quoted_include(tokens)
+        if header_path in self.include_once:
+            # pcpp skips it without touching any state, leave the remaining steps usable
+            return None
+
+        step = self._pending_pch_steps[0]
+        if header_path != step.header_path:
+            self._pending_pch_steps = None
+            return None
+
+        del self._pending_pch_steps[0]
+        self.macros.update(step.defined_macros)
+        for name in step.undefined_macros:
+            self.macros.pop(name, None)
+        self.include_once.update(step.include_once)
+        self.opened_includes.update(step.opened_includes)
+        self.missing_includes.update(step.missing_includes)
+        return step.tokens
+
     def include(self, tokens, original_line):
+        if self._skip_included(tokens):
+            return
+
+        if (replayed_tokens := self._replay_precompiled_header(tokens)) is not None:
+            yield from replayed_tokens
+            return
+
         current_include_depth = self.include_depth
 
         def note_include_depth(tok):
@@ -87,19 +398,47 @@ class BosPreprocessor(pcpp.Preprocessor):
 
         yield from map(note_include_depth, super().include(tokens, original_line))
 
-    def process_file(
+    def _start_processing(
         self,
         file_text: str,
         file_path: str | PathLike[str],
-        include_paths: list[str | PathLike[str]] = None
-    ):
+        include_paths: list[str | PathLike[str]] | None
+    ) -> PurePosixPath:
         source_path = PurePosixPath(file_path)
 
         if include_paths:
             for include_path in include_paths:
                 self.add_path(include_path)
 
+        if self.precompiled_header is not None:
+            if self.precompiled_header.matches(include_paths):
+                self._pending_pch_steps = list(self.precompiled_header.steps)
+            else:
+                log.debug('Precompiled header was built with different include paths, ignoring it')
+
         self.parse(file_text, source_path)
+        return source_path
+
+    def process_file_tokens(
+        self,
+        file_text: str,
+        file_path: str | PathLike[str],
+        include_paths: list[str | PathLike[str]] = None
+    ) -> Iterator[_PcppToken]:
+        """pcpp's output tokens as it produces them, for ``PcppTokenSource``, instead of the joined text"""
+        self._start_processing(file_text, file_path, include_paths)
+        return self.parser
+
+    def process_file(
+        self,
+        file_text: str,
+        file_path: str | PathLike[str],
+        include_paths: list[str | PathLike[str]] = None
+    ):
+        source_path = self._start_processing(file_text, file_path, include_paths)
+
+        if self.lean:
+            return self._lean_output(source_path), None, None
 
         preproc_chunks = [BosPreprocessor.Chunk(
             source=source_path,
@@ -107,6 +446,15 @@ class BosPreprocessor(pcpp.Preprocessor):
             text=f'#line 1 "{source_path}"\n',
             original_text=''
         )]
+        # the text of each chunk is joined once at the end, growing the strings with += is quadratic
+        # for a long run of tokens from the same file
+        chunk_texts = [[preproc_chunks[0].text]]
+        chunk_original_texts = [[preproc_chunks[0].original_text]]
+
+        def add_chunk(chunk: BosPreprocessor.Chunk):
+            preproc_chunks.append(chunk)
+            chunk_texts.append([chunk.text])
+            chunk_original_texts.append([chunk.original_text])
 
         for token in self.parser:
             prev_chunk = preproc_chunks[-1]
@@ -120,7 +468,7 @@ class BosPreprocessor(pcpp.Preprocessor):
 
             if prev_chunk.source != new_chunk.source:
                 # emit a new #line directive each time the source file changes
-                preproc_chunks.append(
+                add_chunk(
                     BosPreprocessor.Chunk(
                         source=source_path,
                         expanded_from=None,
@@ -128,21 +476,207 @@ class BosPreprocessor(pcpp.Preprocessor):
                         original_text=''
                     )
                 )
-                preproc_chunks.append(new_chunk)
+                add_chunk(new_chunk)
             else:
                 if new_chunk.source != source_path:
                     # always concatenate included files, we don't really care about their macro expansions
-                    prev_chunk.text += new_chunk.text
+                    chunk_texts[-1].append(new_chunk.text)
                 else:
                     if prev_chunk.expanded_from == new_chunk.expanded_from:
-                        prev_chunk.text += new_chunk.text
+                        chunk_texts[-1].append(new_chunk.text)
                         if new_chunk.expanded_from is None:
-                            prev_chunk.original_text += new_chunk.original_text
+                            chunk_original_texts[-1].append(new_chunk.original_text)
                     else:
-                        preproc_chunks.append(new_chunk)
+                        add_chunk(new_chunk)
+
+        for chunk, texts, original_texts in zip(preproc_chunks, chunk_texts, chunk_original_texts):
+            chunk.text = ''.join(texts)
+            chunk.original_text = ''.join(original_texts)
+
+        return (
+            ''.join(c.text for c in preproc_chunks),
+            ''.join(c.original_text for c in preproc_chunks),
+            preproc_chunks
+        )
+
+    @classmethod
+    def _directive_free_substitutions(cls) -> tuple[dict[str, str], frozenset[str], re.Pattern]:
+        if cls._directive_free_macros is None:
+            preprocessor = cls()
+            macros = preprocessor.macros
+            substitutions = {
+                name: macro.value[0].value for name, macro in macros.items()
+                if name in BosPreprocessor._prelude_macros and macro.arglist is None
+                and len(macro.value) == 1 and macro.value[0].type != preprocessor.t_ID
+            }
+            # function-like macros and the ones pcpp defines or expands itself while it runs
+            unsupported = frozenset((macros.keys() - substitutions.keys()) | {'__FILE__', '__LINE__', '__COUNTER__'})
+            cls._directive_free_macros = (
+                substitutions,
+                unsupported,
+                re.compile('|'.join(map(re.escape, sorted(substitutions.keys() | unsupported))))
+            )
+        return cls._directive_free_macros
+
+    @classmethod
+    def process_directive_free(
+        cls,
+        file_text: str,
+        file_path: str | PathLike[str],
+        include_paths: list[str | PathLike[str]] = None,
+        lean=False
+    ):
+        """
+        The result of ``process_file`` for a source without any preprocessor directives, without running pcpp
+
+        All pcpp does to such a source is normalize its lines and substitute the plain macros of PRELUDE_DEFINES,
+        which a single regex scan can do. Returns None when the source has anything the scan doesn't cover
+        (directives, line continuations, trigraphs, character literals, function-like or builtin macros),
+        ``process_file`` has to handle it then.
+        """
+        if '\\' in file_text or '??' in file_text:
+            return None
+
+        substitutions, unsupported, macro_name_pattern = cls._directive_free_substitutions()
+        source_path = PurePosixPath(file_path)
+        token_source = _pcpp_token_source(source_path, include_paths)
+
+        # same as pcpp.Preprocessor.group_lines
+        text = '\n'.join(line.rstrip() for line in file_text.splitlines())
+        if text and not text.endswith('\n'):
+            text += '\n'
+
+        # runs of source text and substituted macros, with the macro name (None for source text)
+        pieces: list[str] = []
+        piece_macros: list[str | None] = []
+        position = 0
+
+        def add_piece(end: int, replacement: str, macro_name: str | None):
+            nonlocal position
+            if position < end:
+                pieces.append(text[position:end])
+                piece_macros.append(None)
+            pieces.append(replacement)
+            piece_macros.append(macro_name)
+
+        for match in _DIRECTIVE_FREE_SCAN.finditer(text):
+            kind = match.lastgroup
+            if kind == 'name':
+                name = match.group()
+                if name in substitutions:
+                    add_piece(match.start(), substitutions[name], name)
+                    position = match.end()
+                elif name in unsupported:
+                    return None
+            elif kind == 'number':
+                # pcpp's lexer splits runs like 1TRUE, let it deal with the few that contain a macro name
+                number = match.group()
+                if not number.isdigit() and macro_name_pattern.search(number):
+                    return None
+            elif kind == 'comment':
+                if lean:
+                    add_piece(match.start(), _blank_comment(match.group()), None)
+                    position = match.end()
+            elif kind == 'unsupported':
+                return None
+        if position < len(text):
+            pieces.append(text[position:])
+            piece_macros.append(None)
+
+        first_line = f'#line 1 "{source_path}"\n'
+        token_source_line = f'#line 1 "{token_source}"\n' if pieces and token_source != source_path else ''
+
+        if lean:
+            return first_line + token_source_line + ''.join(pieces), None, None
+
+        preproc_chunks = [cls.Chunk(source=source_path, expanded_from=None, text=first_line, original_text='')]
+        if token_source_line:
+            # process_file treats the whole file like an include then, as a single chunk without original text
+            preproc_chunks.append(
+                cls.Chunk(source=source_path, expanded_from=None, text=token_source_line, original_text='')
+            )
+            preproc_chunks.append(
+                cls.Chunk(source=token_source, expanded_from=piece_macros[0], text=''.join(pieces), original_text='')
+            )
+        else:
+            for piece, macro_name in zip(pieces, piece_macros):
+                prev_chunk = preproc_chunks[-1]
+                if macro_name is None and prev_chunk.expanded_from is None:
+                    prev_chunk.text += piece
+                    prev_chunk.original_text += piece
+                else:
+                    preproc_chunks.append(
+                        cls.Chunk(
+                            source=source_path,
+                            expanded_from=macro_name,
+                            text=piece,
+                            original_text=macro_name or piece
+                        )
+                    )
 
         return (
             ''.join(c.text for c in preproc_chunks),
             ''.join(c.original_text for c in preproc_chunks),
             preproc_chunks
         )
+
+    def _lean_output(self, source_path: PurePosixPath) -> str:
+        """The same text process_file builds out of its chunks, with comments blanked out"""
+        parts = [f'#line 1 "{source_path}"\n']
+        current_source = source_path
+        token_source = None
+        comment_types = self.t_COMMENT
+
+        for token in self.parser:
+            if token.source != token_source:
+                token_source = token.source
+                if PurePosixPath(token_source) != current_source:
+                    current_source = PurePosixPath(token_source)
+                    parts.append(f'#line {token.lineno} "{current_source}"\n')
+
+            if token.type in comment_types:
+                parts.append(_blank_comment(token.value))
+            else:
+                parts.append(token.value)
+
+        return ''.join(parts)
+
+
+def _blank_comment(comment: str) -> str:
+    # the same line breaks and width, everything after it keeps its line and column
+    last_newline = comment.rfind('\n')
+    return '\n' * comment.count('\n') + ' ' * (len(comment) - last_newline - 1)
+
+
+def _pcpp_token_source(file_path: PurePosixPath, include_paths: list[str | PathLike[str]] | None) -> PurePosixPath:
+    """The path ``pcpp.Preprocessor.parsegen`` tags the tokens of a parsed file with, relative to the cwd if it can"""
+    rewrite_paths = [(re.escape(os.path.abspath('') + os.sep) + '(.*)', '\\1')]
+    # pcpp.Preprocessor.add_path
+    for include_path in include_paths or ():
+        try:
+            relative_path = os.path.relpath(include_path)
+        except ValueError:
+            continue
+        rewrite_paths.append(
+            (re.escape(os.path.abspath(include_path) + os.sep) + '(.*)', os.path.join(relative_path, '\\1'))
+        )
+
+    abs_path = os.path.abspath(file_path)
+    for pattern, replacement in rewrite_paths:
+        rewritten_path = re.sub(pattern, replacement, abs_path)
+        if rewritten_path != abs_path:
+            return PurePosixPath(rewritten_path.replace(os.sep, '/'))
+    return PurePosixPath(abs_path)
+
+
+def _detach_token(token):
+    # tokens produced by the PLY lexer keep a reference to it, which can't be pickled
+    token = copy.copy(token)
+    token.__dict__.pop('lexer', None)
+    return token
+
+
+def _detach_macro(macro: pcpp.preprocessor.Macro) -> pcpp.preprocessor.Macro:
+    macro = copy.copy(macro)
+    macro.value = [_detach_token(token) for token in macro.value]
+    return macro
@@ -0,0 +1,36 @@
+"""
+A ``str`` backed stand-in for antlr4's ``InputStream``
+
+``InputStream`` copies the text into a list of code points, one pointer (plus, past the small int cache,
+one int object) per character on top of the string it keeps anyway. Preprocessed units with their headers
+expanded run to hundreds of kilobytes, so that list is most of the lexer's memory.
+Indexing the string is O(1) all the same, ``LA`` just calls ``ord`` on the character.
+"""
+from antlr4.InputStream import InputStream
+from antlr4.Token import Token
+
+
+class StrInputStream(InputStream):
+    # InputStream has __slots__, without these every stream would get a __dict__ again
+    __slots__ = ()
+
+    def _loadString(self):
+        self._index = 0
+        self.data = None
+        self._size = len(self.strdata)
+
+    def LA(self, offset: int):
+        if offset == 1:
+            # by far the most common call, the lexer simulator asks for every character once
+            if self._index < self._size:
+                return ord(self.strdata[self._index])
+            return Token.EOF
+
+        if offset == 0:
+            return 0
+        if offset < 0:
+            offset += 1
+        pos = self._index + offset - 1
+        if pos < 0 or pos >= self._size:
+            return Token.EOF
+        return ord(self.strdata[pos])
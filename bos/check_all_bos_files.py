@@ -4,9 +4,16 @@ import sys
 import time
 from pathlib import Path
 
+from bos import dfa_snapshot
 from bos.bos_loader import BosLoader
+from bos.include_resolver import shared_include_resolver
+from bos.parse_budget import shared_parse_budget_report
+from bos.parse_cache import ParseCache
 from cob.compiler.cob_compiler import CobCompiler
 
+# seconds before a unit's parse is given up on and reported
+PARSE_TIME_BUDGET = 60.0
+
 
 # from bos.ast.ast_visitor import ASTVisitor
 
@@ -15,6 +22,8 @@ def main():
     examples_dir = Path('./example_files/Raptors')
     preprocessed_dir = Path('./preprocessed')
     preprocessed_dir.mkdir(exist_ok=True)
+    parse_cache = ParseCache('./.bos_parse_cache')
+    dfa_snapshot.load_snapshot()
 
     for root, _dirs, files in os.walk(examples_dir):
         root = Path(root)
@@ -35,16 +44,22 @@ ______________________________________________
                 filepath = root.joinpath(bos_filepath)
                 print(f'======== PARSING: {filepath} =============', flush=True)
 
-                loader = BosLoader(filepath, [examples_dir], enable_constant_folding=True)
+                loader = BosLoader(
+                    filepath, [examples_dir],
+                    enable_constant_folding=True, parse_cache=parse_cache, parse_time_budget=PARSE_TIME_BUDGET
+                )
                 loader.dump_preprocessed_file(preprocessed_dir)
                 file_ast = loader.load_file()
-                format_str = 'PARSED: {} | Referenced Pieces: {} | Static Vars: {} | Functions: {}'
+                format_str = (
+                    'PARSED: {} | Referenced Pieces: {} | Static Vars: {} | Functions: {} | Repeated Includes Skipped: {}'
+                )
                 print(
                     format_str.format(
                         bos_filepath,
                         sum(len(pd.names) for pd in file_ast.piece_declarations),
                         sum(len(sd.names) for sd in file_ast.static_var_declarations),
-                        len(file_ast.function_declarations)
+                        len(file_ast.function_declarations),
+                        sum((loader.include_skips or {}).values())
                     ), flush=True
                 )
 
@@ -61,6 +76,10 @@ ______________________________________________
                 print(f'Error parsing {bos_filepath}', file=sys.stderr, flush=True)
                 print('[ERROR]', str(err), file=sys.stderr, flush=True)
 
+    print(parse_cache)
+    print(shared_include_resolver)
+    print(shared_parse_budget_report)
+
 
 if __name__ == '__main__':
     start = time.perf_counter()
@@ -0,0 +1,224 @@
+"""
+Prediction cost of each decision in BosParser, aggregated by rule, over a corpus of units
+
+The Python ANTLR runtime has no ``ProfilingATNSimulator``, ``ProfilingParserATNSimulator`` keeps the same
+per-decision numbers as the Java one does: invocations, time spent predicting, how far SLL and full-context LL
+prediction looked ahead, how often SLL had to fall back to full context, ambiguities, context sensitivities and
+prediction errors. The profile also counts the declarations BosLoader parsed again with LL after SLL bailed on them.
+
+    python -m bos.decision_profile ./example_files/Units --json decision_profile.json
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+from antlr4 import Parser
+from antlr4.atn.ATNConfigSet import ATNConfigSet
+from antlr4.error.Errors import RecognitionException
+
+from bos.gen.BosParser import BosParser
+from bos.parse_budget import BudgetedParserATNSimulator
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class DecisionStats:
+    invocations: int = 0
+    time_ns: int = 0
+    sll_total_look: int = 0
+    sll_max_look: int = 0
+    sll_atn_transitions: int = 0
+    sll_dfa_transitions: int = 0
+    ll_fallbacks: int = 0
+    ll_total_look: int = 0
+    ll_max_look: int = 0
+    ll_atn_transitions: int = 0
+    ambiguities: int = 0
+    context_sensitivities: int = 0
+    errors: int = 0
+
+    def add(self, other: 'DecisionStats'):
+        for stat in fields(self):
+            name = stat.name
+            combine = max if name.endswith('_max_look') else int.__add__
+            setattr(self, name, combine(getattr(self, name), getattr(other, name)))
+
+
+class DecisionProfile:
+    """Stats of every decision of BosParser, collected across any number of parses"""
+
+    def __init__(self):
+        self.decisions = [DecisionStats() for _ in BosParser.atn.decisionToState]
+        self.files = 0
+        # declarations BosLoader parsed again with LL after SLL bailed on them
+        self.ll_fallback_declarations = 0
+
+    @staticmethod
+    def rule_name(decision: int) -> str:
+        return BosParser.ruleNames[BosParser.atn.decisionToState[decision].ruleIndex]
+
+    def by_rule(self) -> dict[str, tuple[list[int], DecisionStats]]:
+        """The decisions of each rule and their stats added up"""
+        rules: dict[str, tuple[list[int], DecisionStats]] = {}
+        for decision, stats in enumerate(self.decisions):
+            decisions, total = rules.setdefault(self.rule_name(decision), ([], DecisionStats()))
+            decisions.append(decision)
+            total.add(stats)
+        return rules
+
+    def report(self, sort_key: str = 'time_ns') -> str:
+        rules = sorted(self.by_rule().items(), key=lambda item: getattr(item[1][1], sort_key), reverse=True)
+        lines = [
+            f'{self.files} files, {self.ll_fallback_declarations} declarations parsed again with LL',
+            f'{"rule":24} {"decisions":12} {"calls":>8} {"ms":>9} {"SLL avg/max":>12} {"fallbacks":>9} '
+            f'{"LL avg/max":>11} {"ambig":>6} {"ctx":>5} {"errors":>6}',
+        ]
+        for rule_name, (decisions, stats) in rules:
+            if not stats.invocations:
+                continue
+            sll_look = f'{stats.sll_total_look / stats.invocations:.1f}/{stats.sll_max_look}'
+            ll_look = f'{stats.ll_total_look / stats.ll_fallbacks:.1f}/{stats.ll_max_look}' if stats.ll_fallbacks else '-'
+            lines.append(
+                f'{rule_name:24} {",".join(map(str, decisions)):12} {stats.invocations:8} '
+                f'{stats.time_ns / 1e6:9.1f} {sll_look:>12} {stats.ll_fallbacks:9} {ll_look:>11} '
+                f'{stats.ambiguities:6} {stats.context_sensitivities:5} {stats.errors:6}'
+            )
+        return '\n'.join(lines)
+
+    def to_json(self) -> dict:
+        return {
+            'files': self.files,
+            'll_fallback_declarations': self.ll_fallback_declarations,
+            'rules': {
+                rule_name: {'decisions': decisions, **asdict(stats)}
+                for rule_name, (decisions, stats) in self.by_rule().items()
+            },
+            'decisions': [
+                {'decision': decision, 'rule': self.rule_name(decision), **asdict(stats)}
+                for decision, stats in enumerate(self.decisions)
+            ],
+        }
+
+
+def _min_alt(configs: ATNConfigSet) -> int:
+    return min(config.alt for config in configs)
+
+
+class ProfilingParserATNSimulator(BudgetedParserATNSimulator):
+
+    def __init__(
+        self,
+        parser: Parser,
+        profile: DecisionProfile,
+        max_seconds: float | None = None,
+        max_steps: int | None = None,
+        cancel_event: threading.Event | None = None
+    ):
+        super().__init__(parser, max_seconds, max_steps, cancel_event)
+        self.profile = profile
+        # input index of the last lookahead symbol each kind of prediction looked at, -1 if it didn't
+        self._sll_stop_index = -1
+        self._ll_stop_index = -1
+        self._current_decision = -1
+        self._conflicting_alt_resolved_by_sll = 0
+
+    def adaptivePredict(self, input, decision: int, outerContext):
+        self._sll_stop_index = self._ll_stop_index = -1
+        self._current_decision = decision
+        stats = self.profile.decisions[decision]
+        start_index = input.index
+        started = time.perf_counter_ns()
+        try:
+            return super().adaptivePredict(input, decision, outerContext)
+        except RecognitionException:
+            stats.errors += 1
+            raise
+        finally:
+            stats.time_ns += time.perf_counter_ns() - started
+            stats.invocations += 1
+
+            # stopped before looking at any symbol, e.g. over the parse budget
+            if self._sll_stop_index >= 0:
+                sll_look = self._sll_stop_index - start_index + 1
+                stats.sll_total_look += sll_look
+                stats.sll_max_look = max(stats.sll_max_look, sll_look)
+            if self._ll_stop_index >= 0:
+                ll_look = self._ll_stop_index - start_index + 1
+                stats.ll_total_look += ll_look
+                stats.ll_max_look = max(stats.ll_max_look, ll_look)
+
+    def getExistingTargetState(self, previousD, t: int):
+        self._sll_stop_index = self._input.index
+        existing = super().getExistingTargetState(previousD, t)
+        if existing is not None:
+            self.profile.decisions[self._current_decision].sll_dfa_transitions += 1
+        return existing
+
+    def computeTargetState(self, dfa, previousD, t: int):
+        self.profile.decisions[self._current_decision].sll_atn_transitions += 1
+        return super().computeTargetState(dfa, previousD, t)
+
+    def computeReachSet(self, closure: ATNConfigSet, t: int, fullCtx: bool):
+        if fullCtx:
+            self._ll_stop_index = self._input.index
+            self.profile.decisions[self._current_decision].ll_atn_transitions += 1
+        return super().computeReachSet(closure, t, fullCtx)
+
+    def reportAttemptingFullContext(self, dfa, conflictingAlts, configs, startIndex: int, stopIndex: int):
+        self._conflicting_alt_resolved_by_sll = min(conflictingAlts) if conflictingAlts else _min_alt(configs)
+        self.profile.decisions[self._current_decision].ll_fallbacks += 1
+        super().reportAttemptingFullContext(dfa, conflictingAlts, configs, startIndex, stopIndex)
+
+    def reportContextSensitivity(self, dfa, prediction: int, configs, startIndex: int, stopIndex: int):
+        if prediction != self._conflicting_alt_resolved_by_sll:
+            self.profile.decisions[self._current_decision].context_sensitivities += 1
+        super().reportContextSensitivity(dfa, prediction, configs, startIndex, stopIndex)
+
+    def reportAmbiguity(self, dfa, D, startIndex: int, stopIndex: int, exact: bool, ambigAlts, configs):
+        stats = self.profile.decisions[self._current_decision]
+        prediction = min(ambigAlts) if ambigAlts else _min_alt(configs)
+        if configs.fullCtx and prediction != self._conflicting_alt_resolved_by_sll:
+            # full context picked a different alternative than SLL would have, as the Java profiler counts it
+            stats.context_sensitivities += 1
+        stats.ambiguities += 1
+        super().reportAmbiguity(dfa, D, startIndex, stopIndex, exact, ambigAlts, configs)
+
+
+def main():
+    from bos.bos_loader import BosLoader
+
+    sort_keys = [stat.name for stat in fields(DecisionStats)]
+    arg_parser = argparse.ArgumentParser(description='Profile the prediction cost of BosParser decisions over units')
+    arg_parser.add_argument('corpus_dir', nargs='?', default='./example_files/Units')
+    arg_parser.add_argument('-I', '--include', action='append', default=[], help='extra include path')
+    arg_parser.add_argument('--sort', choices=sort_keys, default='time_ns')
+    arg_parser.add_argument('--json', type=Path, help='also write the profile here')
+    args = arg_parser.parse_args()
+
+    corpus_dir = Path(args.corpus_dir)
+    include_paths = [corpus_dir, *args.include]
+    profile = DecisionProfile()
+    for bos_file in sorted(corpus_dir.rglob('*.bos')):
+        if 'preprocessed' in bos_file.name:
+            continue
+        loader = BosLoader(bos_file, include_paths, preprocessor_cache=None, decision_profile=profile)
+        try:
+            loader.load_file()
+        except Exception as err:
+            log.warning('%s: %s', bos_file, err)
+        profile.files += 1
+        profile.ll_fallback_declarations += loader.ll_fallback_count
+
+    print(profile.report(args.sort))
+    if args.json is not None:
+        args.json.write_text(json.dumps(profile.to_json(), indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,238 @@
+"""
+Save and restore the prediction DFAs the ANTLR runtime builds up for BosLexer and BosParser
+
+The Python runtime only learns DFA states while lexing/parsing, so every new process starts cold.
+A snapshot taken after parsing a warm-up corpus can be loaded at startup to skip most of that warm-up.
+
+    python -m bos.dfa_snapshot build ./example_files/Units            # regenerate after changing the .g4 files
+    python -m bos.dfa_snapshot measure ./example_files/Units/armcom.bos  # first file latency with and without
+"""
+import argparse
+import logging
+import pickle
+import subprocess
+import sys
+import time
+from os import PathLike
+from pathlib import Path
+
+from antlr4.PredictionContext import (
+    ArrayPredictionContext, PredictionContext, SingletonPredictionContext
+)
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.ATNState import ATNState
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.LexerActionExecutor import LexerActionExecutor
+from antlr4.atn.SemanticContext import SemanticContext
+from antlr4.dfa.DFA import DFA
+
+from bos.gen.BosLexer import BosLexer
+from bos.gen.BosParser import BosParser
+from bos.parse_cache import grammar_version
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = Path(__file__).parent.joinpath('gen', 'dfa_snapshot.bin')
+
+_RECOGNIZERS = {
+    'lexer': BosLexer,
+    'parser': BosParser,
+}
+
+
+class _SnapshotPickler(pickle.Pickler):
+    # ATN states, lexer actions and the runtime's singletons (the simulators compare against ERROR by identity)
+    # are referenced by identity and rebuilt from the generated recognizers on load; prediction contexts and
+    # lexer action executors cache hashes of strings, which differ between processes, so they are rebuilt
+    # through their constructors instead of restored
+    def persistent_id(self, obj):
+        if isinstance(obj, ATNState):
+            for name, recognizer in _RECOGNIZERS.items():
+                if recognizer.atn.states[obj.stateNumber] is obj:
+                    return 'state', name, obj.stateNumber
+            raise pickle.PicklingError(f'ATN state {obj!r} does not belong to the BOS grammars')
+        if obj is ATNSimulator.ERROR:
+            return 'parser_error_state',
+        if obj is LexerATNSimulator.ERROR:
+            return 'lexer_error_state',
+        if obj is PredictionContext.EMPTY:
+            return 'empty_context',
+        if obj is SemanticContext.NONE:
+            return 'no_semantic_context',
+        if type(obj).__module__ == 'antlr4.atn.LexerAction':
+            for i, action in enumerate(BosLexer.atn.lexerActions or ()):
+                if action is obj:
+                    return 'lexer_action', i
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, SingletonPredictionContext) and obj is not PredictionContext.EMPTY:
+            return SingletonPredictionContext, (obj.parentCtx, obj.returnState)
+        if isinstance(obj, ArrayPredictionContext):
+            return ArrayPredictionContext, (list(obj.parents), list(obj.returnStates))
+        if isinstance(obj, LexerActionExecutor):
+            return LexerActionExecutor, (list(obj.lexerActions),)
+        return NotImplemented
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        match pid:
+            case ('state', name, state_number):
+                return _RECOGNIZERS[name].atn.states[state_number]
+            case ('parser_error_state',):
+                return ATNSimulator.ERROR
+            case ('lexer_error_state',):
+                return LexerATNSimulator.ERROR
+            case ('empty_context',):
+                return PredictionContext.EMPTY
+            case ('no_semantic_context',):
+                return SemanticContext.NONE
+            case ('lexer_action', index):
+                return BosLexer.atn.lexerActions[index]
+        raise pickle.UnpicklingError(f'unknown persistent id {pid!r}')
+
+
+def _dump_dfa(dfa: DFA):
+    # plain lists only, the states dict has to be rebuilt once the hashes are valid again
+    return dfa.decision, dfa.s0, list(dfa.states.keys())
+
+
+def _restore_dfa(dfa: DFA, s0, states) -> bool:
+    if dfa.states or (dfa.precedenceDfa and dfa.s0.edges):
+        # already warmed up in this process, keep what we have
+        return False
+
+    for state in states:
+        state.configs.cachedHashCode = -1
+    dfa.s0 = s0
+    dfa._states = {state: state for state in states}
+    return True
+
+
+def save_snapshot(destination: str | PathLike[str] = DEFAULT_SNAPSHOT_PATH):
+    snapshot = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'grammar_version': grammar_version(),
+        'dfas': {
+            name: [_dump_dfa(dfa) for dfa in recognizer.decisionsToDFA if dfa.s0 is not None]
+            for name, recognizer in _RECOGNIZERS.items()
+        },
+    }
+
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, 20000))
+    try:
+        with open(destination, 'wb') as f:
+            pickler = _SnapshotPickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickler.dump(snapshot)
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+    state_count = sum(len(dfa.states) for r in _RECOGNIZERS.values() for dfa in r.decisionsToDFA)
+    log.info('Saved %d DFA states to %s', state_count, destination)
+
+
+def load_snapshot(source: str | PathLike[str] = DEFAULT_SNAPSHOT_PATH) -> bool:
+    """Load a snapshot into the shared DFAs of BosLexer and BosParser, returns False when it was missing or stale"""
+    source = Path(source)
+    if not source.is_file():
+        return False
+
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, 20000))
+    try:
+        with open(source, 'rb') as f:
+            snapshot = _SnapshotUnpickler(f).load()
+    except Exception as err:
+        log.warning('Unable to load DFA snapshot %s: %s', source, err)
+        return False
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+    if (snapshot.get('format_version') != SNAPSHOT_FORMAT_VERSION
+            or snapshot.get('grammar_version') != grammar_version()):
+        log.warning('DFA snapshot %s was made for a different grammar, regenerate it', source)
+        return False
+
+    restored = 0
+    for name, dfas in snapshot['dfas'].items():
+        decisions_to_dfa = _RECOGNIZERS[name].decisionsToDFA
+        for decision, s0, states in dfas:
+            restored += _restore_dfa(decisions_to_dfa[decision], s0, states)
+
+    log.debug('Restored %d DFAs from %s', restored, source)
+    return True
+
+
+def _time_first_file(bos_file: Path, include_paths: list[Path], snapshot: Path | None):
+    from bos.bos_loader import BosLoader
+
+    start = time.perf_counter()
+    if snapshot is not None:
+        load_snapshot(snapshot)
+    loaded = time.perf_counter()
+
+    loader = BosLoader(bos_file, include_paths, preprocessor_cache=None)
+    loader._load_file_contents()
+    loader._run_preprocessor()
+    preprocessed = time.perf_counter()
+    loader._run_parser()
+    parsed = time.perf_counter()
+
+    print(f'{loaded - start:.3f} {parsed - preprocessed:.3f}')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Manage the BosLexer/BosParser DFA snapshot')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='parse a warm-up corpus and save the learned DFAs')
+    build_parser.add_argument('corpus_dir', type=Path)
+    build_parser.add_argument('-I', '--include', action='append', default=[], type=Path)
+    build_parser.add_argument('-o', '--output', type=Path, default=DEFAULT_SNAPSHOT_PATH)
+
+    measure_parser = subparsers.add_parser('measure', help='first file latency in a fresh process, with and without')
+    measure_parser.add_argument('bos_file', type=Path)
+    measure_parser.add_argument('-I', '--include', action='append', default=[], type=Path)
+    measure_parser.add_argument('-s', '--snapshot', type=Path, default=DEFAULT_SNAPSHOT_PATH)
+
+    first_file_parser = subparsers.add_parser('first-file')
+    first_file_parser.add_argument('bos_file', type=Path)
+    first_file_parser.add_argument('-I', '--include', action='append', default=[], type=Path)
+    first_file_parser.add_argument('-s', '--snapshot', type=Path)
+
+    args = arg_parser.parse_args()
+
+    if args.command == 'build':
+        from bos.bos_loader import BosLoader
+
+        include_paths = [args.corpus_dir, *args.include]
+        for bos_file in sorted(args.corpus_dir.rglob('*.bos')):
+            try:
+                BosLoader(bos_file, include_paths, preprocessor_cache=None).load_file()
+            except Exception as err:
+                log.warning('Skipping %s: %s', bos_file, err)
+        save_snapshot(args.output)
+
+    elif args.command == 'measure':
+        for label, snapshot_args in (('cold', []), ('snapshot', ['-s', str(args.snapshot)])):
+            result = subprocess.run(
+                [
+                    sys.executable, '-m', 'bos.dfa_snapshot', 'first-file', str(args.bos_file),
+                    *(arg for path in args.include for arg in ('-I', str(path))),
+                    *snapshot_args,
+                ],
+                capture_output=True, text=True, check=True
+            )
+            load_time, parse_time = map(float, result.stdout.split())
+            print(f'{label:10} snapshot load {load_time:7.3f}s  first file parse {parse_time:7.3f}s')
+
+    elif args.command == 'first-file':
+        _time_first_file(args.bos_file, args.include, args.snapshot)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,273 @@
+"""
+Regex based tokenizer producing the same tokens as the generated BosLexer
+
+ANTLR picks the longest match over all lexer rules (the earliest rule on ties), the master regex below is
+ordered so Python's first-match alternation comes to the same answer. Identifiers and keywords share
+one branch and are told apart afterward, since keywords may contain optional hyphens.
+Characters BosLexer can't match are skipped the same way its default error recovery skips them.
+"""
+import re
+from collections.abc import Callable, Iterator
+
+from antlr4 import Token
+from antlr4.Token import CommonToken
+
+from bos.char_stream import StrInputStream
+from bos.gen.BosLexer import BosLexer
+
+_NUMBER = r'(?:0x[0-9a-f]+|[0-9]+\.[0-9]*|[0-9]+|\.[0-9]+)'
+
+_MASTER_PATTERN = re.compile(
+    '|'.join(
+        f'(?P<{name}>{pattern})' for name, pattern in (
+            ('WHITESPACE', r'[ \t\r\n]+'),
+            ('ID', r'[a-z_][a-z_0-9]*'),
+            ('INT_HEX', r'0x[0-9a-f]+'),
+            ('FLOAT', r'[0-9]+\.[0-9]*|\.[0-9]+'),
+            ('INT', r'[0-9]+'),
+            ('LINE_COMMENT', r'//[^\r\n]*'),
+            ('BLOCK_COMMENT', r'/\*[\s\S]*?\*/'),
+            # a continued line has to end in '\' + one newline character, the last line can't be empty
+            ('MULTI_LINE_MACRO', r'\#(?:[^\r\n]*?\\[\r\n])+[^\r\n]+'),
+            ('LINE_DIRECTIVE', rf'\#line\ (?:0x[0-9a-f]+|[0-9]+)\ [^\r\n]*'),
+            ('INCLUDE_DIRECTIVE', r'\#include[^\r\n]*'),
+            ('SINGLE_LINE_MACRO', r'\#[^\r\n]*'),
+            ('STRING', r'"[^"]*"'),
+            ('LINEAR_CONSTANT', rf'\[-?{_NUMBER}\]'),
+            ('DEGREES_CONSTANT', rf'<-?{_NUMBER}>'),
+            ('OPERATOR', r'\+\+|--|==|!=|<=|>=|&&|\|\||\^\^|[,(){}\[\];=+\-*/%&|^<>!]'),
+            # BosLexer gives up on these only after consuming one more character
+            ('UNTERMINATED_STRING', r'"[\s\S]*'),
+            ('LONE_DOT', r'\.[\s\S]?'),
+            ('UNKNOWN', r'[\s\S]'),
+        )
+    ),
+    re.ASCII | re.IGNORECASE
+)
+
+_OPERATOR_TYPES = {
+    ',': BosLexer.COMMA,
+    '(': BosLexer.L_PAREN,
+    ')': BosLexer.R_PAREN,
+    '{': BosLexer.L_BRACE,
+    '}': BosLexer.R_BRACE,
+    '[': BosLexer.L_SQUARE_BRACKET,
+    ']': BosLexer.R_SQUARE_BRACKET,
+    ';': BosLexer.SEMICOLON,
+    '=': BosLexer.EQUAL_ASSIGN,
+    '+': BosLexer.OP_ADD,
+    '-': BosLexer.OP_MINUS,
+    '*': BosLexer.OP_MULT,
+    '/': BosLexer.OP_DIV,
+    '%': BosLexer.OP_MOD,
+    '++': BosLexer.OP_INCREMENT,
+    '--': BosLexer.OP_DECREMENT,
+    '&': BosLexer.BITWISE_AND,
+    '|': BosLexer.BITWISE_OR,
+    '^': BosLexer.BITWISE_XOR,
+    '==': BosLexer.COMP_EQUAL,
+    '!=': BosLexer.COMP_NOT_EQUAL,
+    '<': BosLexer.COMP_LESS,
+    '<=': BosLexer.COMP_LESS_EQUAL,
+    '>': BosLexer.COMP_GREATER,
+    '>=': BosLexer.COMP_GREATER_EQUAL,
+    '&&': BosLexer.LOGICAL_AND,
+    '||': BosLexer.LOGICAL_OR,
+    '!': BosLexer.LOGICAL_NOT,
+    '^^': BosLexer.LOGICAL_XOR,
+}
+
+# in BosLexer.g4 rule order, '-?' marks an optional hyphen
+_KEYWORD_PATTERNS = (
+    (BosLexer.LOGICAL_AND, 'and'),
+    (BosLexer.LOGICAL_OR, 'or'),
+    (BosLexer.LOGICAL_NOT, 'not'),
+    (BosLexer.LOGICAL_XOR, 'xor'),
+    (BosLexer.IF, 'if'),
+    (BosLexer.ELSE, 'else'),
+    (BosLexer.WHILE, 'while'),
+    (BosLexer.FOR, 'for'),
+    (BosLexer.STATIC_VAR, 'static-var'),
+    (BosLexer.VAR, 'var'),
+    (BosLexer.PIECE, 'piece'),
+    (BosLexer.TURN, 'turn'),
+    (BosLexer.AROUND, 'around'),
+    (BosLexer.MOVE, 'move'),
+    (BosLexer.ALONG, 'along'),
+    (BosLexer.TO, 'to'),
+    (BosLexer.FROM, 'from'),
+    (BosLexer.NOW, 'now'),
+    (BosLexer.SPEED, 'speed'),
+    (BosLexer.SPIN, 'spin'),
+    (BosLexer.ACCELERATE, 'accelerate'),
+    (BosLexer.STOP_SPIN, 'stop-?spin'),
+    (BosLexer.DECELERATE, 'decelerate'),
+    (BosLexer.WAIT_FOR_TURN, 'wait-?for-?turn'),
+    (BosLexer.WAIT_FOR_MOVE, 'wait-?for-?move'),
+    (BosLexer.SET, 'set'),
+    (BosLexer.GET, 'get'),
+    (BosLexer.CALL_SCRIPT, 'call-?script'),
+    (BosLexer.START_SCRIPT, 'start-?script'),
+    (BosLexer.EMIT_SFX, 'emit-?sfx'),
+    (BosLexer.SLEEP, 'sleep'),
+    (BosLexer.HIDE, 'hide'),
+    (BosLexer.SHOW, 'show'),
+    (BosLexer.EXPLODE, 'explode'),
+    (BosLexer.TYPE, 'type'),
+    (BosLexer.SIGNAL, 'signal'),
+    (BosLexer.SET_SIGNAL_MASK, 'set-?signal-?mask'),
+    (BosLexer.ATTACH_UNIT, 'attach-?unit'),
+    (BosLexer.DROP_UNIT, 'drop-?unit'),
+    (BosLexer.RETURN, 'return'),
+    (BosLexer.CACHE, 'cache'),
+    (BosLexer.DONT_CACHE, 'dont-?cache'),
+    (BosLexer.DONT_SHADOW, 'dont-?shadow'),
+    (BosLexer.DONT_SHADE, 'dont-?shade'),
+    (BosLexer.PLAY_SOUND, 'play-?sound'),
+    (BosLexer.X_AXIS, 'x-?axis'),
+    (BosLexer.Y_AXIS, 'y-?axis'),
+    (BosLexer.Z_AXIS, 'z-?axis'),
+    (BosLexer.RAND, 'rand'),
+)
+
+
+def _expand_spellings(pattern: str) -> list[str]:
+    spellings = ['']
+    for part in re.split(r'(-\?|-)', pattern):
+        if part == '-?':
+            spellings = [s + suffix for s in spellings for suffix in ('', '-')]
+        elif part:
+            spellings = [s + part for s in spellings]
+    return spellings
+
+
+_KEYWORD_TYPES: dict[str, int] = {}
+for _token_type, _pattern in _KEYWORD_PATTERNS:
+    for _spelling in _expand_spellings(_pattern):
+        _KEYWORD_TYPES.setdefault(_spelling, _token_type)
+_MAX_KEYWORD_LENGTH = max(map(len, _KEYWORD_TYPES))
+
+_GROUP_TYPES = {
+    'WHITESPACE': (BosLexer.WHITESPACE, Token.HIDDEN_CHANNEL),
+    'INT_HEX': (BosLexer.INT, Token.DEFAULT_CHANNEL),
+    'INT': (BosLexer.INT, Token.DEFAULT_CHANNEL),
+    'FLOAT': (BosLexer.FLOAT, Token.DEFAULT_CHANNEL),
+    'LINE_COMMENT': (BosLexer.LINE_COMMENT, BosLexer.COMMENTS),
+    'BLOCK_COMMENT': (BosLexer.BLOCK_COMMENT, BosLexer.COMMENTS),
+    'MULTI_LINE_MACRO': (BosLexer.MULTI_LINE_MACRO, BosLexer.PREPROCESSOR),
+    'LINE_DIRECTIVE': (BosLexer.LINE_DIRECTIVE, BosLexer.LINE_MACRO),
+    'INCLUDE_DIRECTIVE': (BosLexer.INCLUDE_DIRECTIVE, BosLexer.PREPROCESSOR),
+    'SINGLE_LINE_MACRO': (BosLexer.SINGLE_LINE_MACRO, BosLexer.PREPROCESSOR),
+    'STRING': (BosLexer.STRING, Token.DEFAULT_CHANNEL),
+    'LINEAR_CONSTANT': (BosLexer.LINEAR_CONSTANT, Token.DEFAULT_CHANNEL),
+    'DEGREES_CONSTANT': (BosLexer.DEGREES_CONSTANT, Token.DEFAULT_CHANNEL),
+}
+
+_ERROR_GROUPS = frozenset(('UNTERMINATED_STRING', 'LONE_DOT', 'UNKNOWN'))
+
+_new_token = CommonToken.__new__
+
+
+class FastBosLexer:
+    """
+    Drop-in ``TokenSource`` for ``CommonTokenStream`` that works on the document ``str`` directly
+
+    Tokens carry their text, the ``StrInputStream`` behind them only wraps the same ``str``.
+    ``on_error(text, line, column)`` is called for every stretch of input BosLexer would report
+    as a token recognition error.
+    """
+
+    def __init__(self, text: str, on_error: Callable[[str, int, int], None] = None):
+        self.text = text
+        self.on_error = on_error
+        self._tokens = self._tokenize()
+        self.inputStream = StrInputStream(text)
+        self._source = (self, self.inputStream)
+
+        self.line = 1
+        self.column = 0
+
+    def nextToken(self) -> CommonToken:
+        return next(self._tokens)
+
+    def getSourceName(self):
+        return 'FastBosLexer'
+
+    def getInputStream(self):
+        return self.inputStream
+
+    def _make_token(self, token_type: int, channel: int, start: int, stop: int, text: str) -> CommonToken:
+        # skips CommonToken.__init__, every slot is filled in here
+        token = _new_token(CommonToken)
+        token.source = self._source
+        token.type = token_type
+        token.channel = channel
+        token.start = start
+        token.stop = stop
+        token.tokenIndex = -1
+        token.line = self.line
+        token.column = self.column
+        token._text = text
+        return token
+
+    def _tokenize(self) -> Iterator[CommonToken]:
+        text = self.text
+        text_length = len(text)
+        match_at = _MASTER_PATTERN.match
+        keyword_types = _KEYWORD_TYPES
+        make_token = self._make_token
+
+        pos = 0
+        line_start = 0
+        while pos < text_length:
+            m = match_at(text, pos)
+            group = m.lastgroup
+            end = m.end()
+            self.column = pos - line_start
+
+            if group == 'ID':
+                token_type = keyword_types.get(text[pos:end].lower(), BosLexer.ID)
+                if end < text_length and text[end] == '-':
+                    # a hyphenated keyword beats the identifier in front of its first hyphen
+                    for length in range(min(_MAX_KEYWORD_LENGTH, text_length - pos), end - pos, -1):
+                        hyphenated_type = keyword_types.get(text[pos:pos + length].lower())
+                        if hyphenated_type is not None:
+                            token_type = hyphenated_type
+                            end = pos + length
+                            break
+                yield make_token(token_type, Token.DEFAULT_CHANNEL, pos, end - 1, text[pos:end])
+
+            elif group == 'OPERATOR':
+                token_text = m.group()
+                yield make_token(_OPERATOR_TYPES[token_text], Token.DEFAULT_CHANNEL, pos, end - 1, token_text)
+
+            elif group in _ERROR_GROUPS:
+                if self.on_error is not None:
+                    self.on_error(m.group(), self.line, self.column)
+
+            else:
+                token_type, channel = _GROUP_TYPES[group]
+                yield make_token(token_type, channel, pos, end - 1, m.group())
+
+            newlines = text.count('\n', pos, end)
+            if newlines:
+                self.line += newlines
+                line_start = text.rindex('\n', pos, end) + 1
+            pos = end
+
+        self.column = pos - line_start
+        eof = make_token(Token.EOF, Token.DEFAULT_CHANNEL, pos, pos - 1, '<EOF>')
+        while True:
+            yield eof
+
+
+def tokenize(text: str, on_error: Callable[[str, int, int], None] = None) -> list[CommonToken]:
+    """All tokens of ``text`` on every channel, including the trailing EOF token, with their token indexes set"""
+    lexer = FastBosLexer(text, on_error)
+    tokens = []
+    while True:
+        token = lexer.nextToken()
+        token.tokenIndex = len(tokens)
+        tokens.append(token)
+        if token.type == Token.EOF:
+            return tokens
@@ -0,0 +1,439 @@
+"""
+Flat, array backed encoding of an ast_nodes.File for holding a lot of trees in memory at once
+
+Nodes are stored in pre-order as parallel arrays (kind, first child, next sibling, operator/keyword code,
+float constant value, integer constant value and interned name id), which can be written out as one buffer
+and read back without copying, e.g. from a mmap shared between worker processes. Integer constants that don't fit
+in 64 bits are kept in a side table, their integer value is the index into it.
+
+Node fields become children in declaration order, lists become LIST nodes and missing optional values NULL nodes.
+The contents of UndefNodes are not kept.
+"""
+import argparse
+import logging
+import struct
+from array import array
+from collections.abc import Generator
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Union
+
+from bos import ast_nodes as nodes
+
+log = logging.getLogger(__name__)
+
+FORMAT_VERSION = 3
+
+LIST_KIND = 0
+NULL_KIND = 1
+
+# order is part of the format, only ever append
+NODE_CLASSES: tuple[type[nodes.ASTNode], ...] = (
+    nodes.File,
+    nodes.PieceDeclaration,
+    nodes.StaticVarDeclaration,
+    nodes.FuncDeclaration,
+    nodes.PieceName,
+    nodes.VarName,
+    nodes.FuncName,
+    nodes.ArgName,
+    nodes.StatementBlock,
+    nodes.KeywordStatement,
+    nodes.CallStatement,
+    nodes.StartStatement,
+    nodes.VarStatement,
+    nodes.IfStatement,
+    nodes.WhileStatement,
+    nodes.AssignStatement,
+    nodes.ReturnStatement,
+    nodes.EmptyStatement,
+    nodes.UnaryExpression,
+    nodes.BinaryExpression,
+    nodes.Constant,
+    nodes.Axis,
+    nodes.GetCall,
+    nodes.GetTerm,
+    nodes.RandTerm,
+    nodes.VarNameTerm,
+    nodes.UndefNode,
+)
+
+CONSTANT_TYPES = ('normal', 'angular', 'linear')
+# set in the code of constants whose base value is a float
+FLOAT_CONSTANT_FLAG = 0x4
+# set in the code of constants whose base value is an int outside the 64-bit range, kept in FlatAST.big_ints
+BIG_INT_CONSTANT_FLAG = 0x8
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+_HEADER = struct.Struct('=4sIIII')
+_MAGIC = b'BFAT'
+
+
+@dataclass(frozen=True)
+class _NodeLayout:
+    kind: int
+    node_class: type[nodes.ASTNode]
+    child_fields: tuple[str, ...]
+    enum_field: Union[str, None] = None
+    enum_class: Union[type[Enum], None] = None
+
+
+def _make_layout(kind: int, node_class: type[nodes.ASTNode]) -> _NodeLayout:
+    if issubclass(node_class, (nodes.NameNode, nodes.Constant, nodes.UndefNode)):
+        return _NodeLayout(kind, node_class, ())
+
+    enum_field = enum_class = None
+    child_fields = []
+    for name, field in node_class.model_fields.items():
+        if isinstance(field.annotation, type) and issubclass(field.annotation, Enum):
+            enum_field, enum_class = name, field.annotation
+        else:
+            child_fields.append(name)
+    return _NodeLayout(kind, node_class, tuple(child_fields), enum_field, enum_class)
+
+
+_LAYOUTS: dict[type[nodes.ASTNode], _NodeLayout] = {
+    node_class: _make_layout(kind, node_class)
+    for kind, node_class in enumerate(NODE_CLASSES, start=NULL_KIND + 1)
+}
+_LAYOUTS_BY_KIND: list[Union[_NodeLayout, None]] = [None, None, *_LAYOUTS.values()]
+
+
+class FlatAST:
+    """A File tree flattened into parallel arrays, the root File is node 0"""
+
+    def __init__(
+        self,
+        kinds: Union[array, memoryview],
+        first_child: Union[array, memoryview],
+        next_sibling: Union[array, memoryview],
+        codes: Union[array, memoryview],
+        values: Union[array, memoryview],
+        int_values: Union[array, memoryview],
+        name_ids: Union[array, memoryview],
+        names: list[str],
+        big_ints: list[int]
+    ):
+        self.kinds = kinds
+        self.first_child = first_child
+        self.next_sibling = next_sibling
+        self.codes = codes
+        self.values = values
+        # kept apart from the doubles in values, which can't hold every 64-bit int
+        self.int_values = int_values
+        self.name_ids = name_ids
+        self.names = names
+        self.big_ints = big_ints
+
+    @classmethod
+    def from_file(cls, file: nodes.File) -> 'FlatAST':
+        flat = cls(array('B'), array('i'), array('i'), array('i'), array('d'), array('q'), array('i'), [], [])
+        name_ids: dict[str, int] = {}
+        # parent index -> index of the child added to it last
+        last_child: dict[int, int] = {}
+
+        # (item, parent index) still to add, the top of the stack is the next one in pre-order
+        stack: list[tuple] = [(file, -1)]
+        while stack:
+            item, parent = stack.pop()
+            index = len(flat.kinds)
+            flat.first_child.append(-1)
+            flat.next_sibling.append(-1)
+            if parent != -1:
+                previous = last_child.get(parent)
+                if previous is None:
+                    flat.first_child[parent] = index
+                else:
+                    flat.next_sibling[previous] = index
+                last_child[parent] = index
+
+            code, value, int_value, name_id = 0, 0.0, 0, -1
+            children = ()
+
+            if item is None:
+                kind = NULL_KIND
+            elif isinstance(item, list):
+                kind = LIST_KIND
+                children = item
+            else:
+                layout = _LAYOUTS[item.__class__]
+                kind = layout.kind
+                if isinstance(item, nodes.NameNode):
+                    name_id = name_ids.setdefault(item.name, len(name_ids))
+                    if name_id == len(flat.names):
+                        flat.names.append(item.name)
+                elif isinstance(item, nodes.Constant):
+                    code = CONSTANT_TYPES.index(item.const_type)
+                    if isinstance(item.base_value, float):
+                        code |= FLOAT_CONSTANT_FLAG
+                        value = item.base_value
+                    elif _INT64_MIN <= item.base_value <= _INT64_MAX:
+                        int_value = item.base_value
+                    else:
+                        code |= BIG_INT_CONSTANT_FLAG
+                        int_value = len(flat.big_ints)
+                        flat.big_ints.append(item.base_value)
+                else:
+                    if layout.enum_field is not None:
+                        code = getattr(item, layout.enum_field).value
+                    children = [getattr(item, field) for field in layout.child_fields]
+
+            flat.kinds.append(kind)
+            flat.codes.append(code)
+            flat.values.append(value)
+            flat.int_values.append(int_value)
+            flat.name_ids.append(name_id)
+
+            stack.extend((child, index) for child in reversed(children))
+
+        return flat
+
+    def to_file(self) -> nodes.File:
+        return self.root.to_node()
+
+    @property
+    def root(self) -> 'FlatCursor':
+        return FlatCursor(self, 0)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def find(self, node_class: type[nodes.ASTNode]) -> Generator['FlatCursor']:
+        """All nodes of a class (or its subclasses), in source order"""
+        kinds = {layout.kind for layout in _LAYOUTS.values() if issubclass(layout.node_class, node_class)}
+        for index, kind in enumerate(self.kinds):
+            if kind in kinds:
+                yield FlatCursor(self, index)
+
+    def to_bytes(self) -> bytes:
+        names = '\0'.join(self.names).encode('utf8')
+        big_ints = ','.join(map(str, self.big_ints)).encode('ascii')
+        # widest items first, so every array stays aligned when read back in place
+        return b''.join((
+            _HEADER.pack(_MAGIC, FORMAT_VERSION, len(self), len(names), len(big_ints)),
+            self.values.tobytes(),
+            self.int_values.tobytes(),
+            self.first_child.tobytes(),
+            self.next_sibling.tobytes(),
+            self.codes.tobytes(),
+            self.name_ids.tobytes(),
+            self.kinds.tobytes(),
+            names,
+            big_ints,
+        ))
+
+    @classmethod
+    def from_buffer(cls, buffer) -> 'FlatAST':
+        """Read the output of ``to_bytes`` from any buffer (bytes, mmap, shared memory) without copying the arrays"""
+        view = memoryview(buffer)
+        magic, version, node_count, names_size, big_ints_size = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'Not a flat AST buffer of format version {FORMAT_VERSION}')
+
+        offset = _HEADER.size
+
+        def take(typecode: str) -> memoryview:
+            nonlocal offset
+            size = node_count * array(typecode).itemsize
+            part = view[offset:offset + size].cast(typecode)
+            offset += size
+            return part
+
+        values = take('d')
+        int_values = take('q')
+        first_child = take('i')
+        next_sibling = take('i')
+        codes = take('i')
+        name_ids = take('i')
+        kinds = take('B')
+        names = str(view[offset:offset + names_size], 'utf8').split('\0') if names_size else []
+        offset += names_size
+        big_ints = [int(value) for value in str(view[offset:offset + big_ints_size], 'ascii').split(',')] \
+            if big_ints_size else []
+        return cls(kinds, first_child, next_sibling, codes, values, int_values, name_ids, names, big_ints)
+
+    def __reduce__(self):
+        return FlatAST.from_buffer, (self.to_bytes(),)
+
+
+class FlatCursor:
+    """Points at one node of a FlatAST"""
+    __slots__ = ('flat_ast', 'index')
+
+    def __init__(self, flat_ast: FlatAST, index: int):
+        self.flat_ast = flat_ast
+        self.index = index
+
+    @property
+    def kind(self) -> int:
+        return self.flat_ast.kinds[self.index]
+
+    @property
+    def is_list(self) -> bool:
+        return self.kind == LIST_KIND
+
+    @property
+    def is_null(self) -> bool:
+        return self.kind == NULL_KIND
+
+    @property
+    def node_class(self) -> Union[type[nodes.ASTNode], None]:
+        layout = _LAYOUTS_BY_KIND[self.kind]
+        return layout.node_class if layout is not None else None
+
+    @property
+    def name(self) -> Union[str, None]:
+        name_id = self.flat_ast.name_ids[self.index]
+        return self.flat_ast.names[name_id] if name_id != -1 else None
+
+    @property
+    def enum_value(self) -> Union[Enum, None]:
+        """The operator, keyword or axis of the node"""
+        layout = _LAYOUTS_BY_KIND[self.kind]
+        if layout is None or layout.enum_class is None:
+            return None
+        return layout.enum_class(self.flat_ast.codes[self.index])
+
+    @property
+    def constant(self) -> Union[tuple[Union[int, float], str], None]:
+        """``(base_value, const_type)`` of a Constant"""
+        if self.node_class is not nodes.Constant:
+            return None
+        code = self.flat_ast.codes[self.index]
+        if code & FLOAT_CONSTANT_FLAG:
+            value = self.flat_ast.values[self.index]
+        elif code & BIG_INT_CONSTANT_FLAG:
+            value = self.flat_ast.big_ints[self.flat_ast.int_values[self.index]]
+        else:
+            value = self.flat_ast.int_values[self.index]
+        return value, CONSTANT_TYPES[code & ~(FLOAT_CONSTANT_FLAG | BIG_INT_CONSTANT_FLAG)]
+
+    @property
+    def first_child(self) -> Union['FlatCursor', None]:
+        index = self.flat_ast.first_child[self.index]
+        return FlatCursor(self.flat_ast, index) if index != -1 else None
+
+    @property
+    def next_sibling(self) -> Union['FlatCursor', None]:
+        index = self.flat_ast.next_sibling[self.index]
+        return FlatCursor(self.flat_ast, index) if index != -1 else None
+
+    def children(self) -> Generator['FlatCursor']:
+        first_child, next_sibling = self.flat_ast.first_child, self.flat_ast.next_sibling
+        index = first_child[self.index]
+        while index != -1:
+            yield FlatCursor(self.flat_ast, index)
+            index = next_sibling[index]
+
+    def child(self, field_name: str) -> 'FlatCursor':
+        """The child holding a field of the node, e.g. ``cursor.child('block')`` of a FuncDeclaration"""
+        layout = _LAYOUTS_BY_KIND[self.kind]
+        if layout is None or field_name not in layout.child_fields:
+            raise KeyError(field_name)
+        position = layout.child_fields.index(field_name)
+        for i, child in enumerate(self.children()):
+            if i == position:
+                return child
+        raise KeyError(field_name)
+
+    def walk(self) -> Generator['FlatCursor']:
+        """This node and everything below it, in pre-order"""
+        stack = [self.index]
+        first_child, next_sibling = self.flat_ast.first_child, self.flat_ast.next_sibling
+        while stack:
+            index = stack.pop()
+            yield FlatCursor(self.flat_ast, index)
+            children = []
+            child = first_child[index]
+            while child != -1:
+                children.append(child)
+                child = next_sibling[child]
+            stack.extend(reversed(children))
+
+    def to_node(self) -> Union[nodes.ASTNode, list, None]:
+        """Rebuild the ast_nodes object (or list, or None) at this position"""
+        flat_ast = self.flat_ast
+        first_child, next_sibling = flat_ast.first_child, flat_ast.next_sibling
+        # index -> the object built for it, until its parent takes it
+        built: dict[int, Union[nodes.ASTNode, list, None]] = {}
+
+        # (index, whether its children are built already), without recursing so deep expressions can't overflow
+        stack = [(self.index, False)]
+        while stack:
+            index, children_built = stack.pop()
+            children = []
+            child = first_child[index]
+            while child != -1:
+                children.append(child)
+                child = next_sibling[child]
+
+            if not children_built:
+                stack.append((index, True))
+                stack.extend((child, False) for child in reversed(children))
+                continue
+
+            built[index] = FlatCursor(flat_ast, index)._build([built.pop(child) for child in children])
+
+        return built[self.index]
+
+    def _build(self, children: list) -> Union[nodes.ASTNode, list, None]:
+        kind = self.kind
+        if kind == NULL_KIND:
+            return None
+        if kind == LIST_KIND:
+            return children
+
+        layout = _LAYOUTS_BY_KIND[kind]
+        node_class = layout.node_class
+        if issubclass(node_class, nodes.NameNode):
+            return node_class.construct_unvalidated(name=self.name)
+        if node_class is nodes.Constant:
+            base_value, const_type = self.constant
+            return super(nodes.Constant, nodes.Constant).construct_unvalidated(
+                base_value=base_value, const_type=const_type
+            )
+        if node_class is nodes.UndefNode:
+            return nodes.UndefNode.construct_unvalidated(contents=None)
+
+        fields = dict(zip(layout.child_fields, children))
+        if layout.enum_field is not None:
+            fields[layout.enum_field] = self.enum_value
+        return node_class.construct_unvalidated(**fields)
+
+    def __repr__(self):
+        node_class = self.node_class
+        label = node_class.__name__ if node_class is not None else ('LIST' if self.is_list else 'NULL')
+        return f'FlatCursor({self.index}, {label})'
+
+
+def main():
+    from bos.bos_loader import BosLoader
+
+    arg_parser = argparse.ArgumentParser(description='Flatten the ASTs of a directory of units and report their size')
+    arg_parser.add_argument('corpus_dir', nargs='?', default='./example_files/Units')
+    arg_parser.add_argument('-I', '--include', action='append', default=[], help='extra include path')
+    args = arg_parser.parse_args()
+
+    corpus_dir = Path(args.corpus_dir)
+    include_paths = [corpus_dir, *args.include]
+    node_count = byte_count = 0
+    for bos_file in sorted(corpus_dir.rglob('*.bos')):
+        try:
+            file_ast = BosLoader(bos_file, include_paths, preprocessor_cache=None).load_file()
+        except Exception as err:
+            log.warning('Skipping %s: %s', bos_file, err)
+            continue
+
+        flat_ast = FlatAST.from_file(file_ast)
+        if flat_ast.to_file() != file_ast:
+            log.error('%s does not survive flattening', bos_file)
+        node_count += len(flat_ast)
+        byte_count += len(flat_ast.to_bytes())
+
+    print(f'{node_count} nodes in {byte_count} bytes')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,242 @@
+# Generated from BosParser.g4 by bos/generate_ast_builder.py, do not edit
+# BosParser.g4 sha1 39805b138866c9835a11287dbb6d8b66cd4fdd72
+import bos.ast_nodes as nodes
+from bos.ast_visitor import ASTVisitor
+from bos.gen.BosParser import BosParser
+
+
+class BosAstBuilder(ASTVisitor):
+
+    def visitDeclaration(self, ctx: BosParser.DeclarationContext):
+        return ctx.getChild(0).accept(self)
+
+    def visitStatement(self, ctx: BosParser.StatementContext):
+        return ctx.getChild(0).accept(self)
+
+    def visitElseBlock(self, ctx: BosParser.ElseBlockContext):
+        return self.visitStatementBlock(ctx.statementBlock())
+
+    def visitIncStatement(self, ctx: BosParser.IncStatementContext):
+        return self.visitVarName(ctx.varName())
+
+    def visitDecStatement(self, ctx: BosParser.DecStatementContext):
+        return self.visitVarName(ctx.varName())
+
+    def visitKeywordStatement(self, ctx: BosParser.KeywordStatementContext):
+        return ctx.getChild(0).accept(self)
+
+    def visitSleepStatement(self, ctx: BosParser.SleepStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.SLEEP, args=args)
+
+    def visitSetStatement(self, ctx: BosParser.SetStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+            ctx.arg2.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.SET, args=args)
+
+    def visitGetStatement(self, ctx: BosParser.GetStatementContext):
+        args = [
+            self.visitGetCall(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.GET, args=args)
+
+    def visitTurnStatement(self, ctx: BosParser.TurnStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            self.visitAxis(ctx.arg2),
+            ctx.arg3.accept(self),
+            self.visitSpeedOrNow(ctx.arg4),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.TURN, args=args)
+
+    def visitMoveStatement(self, ctx: BosParser.MoveStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            self.visitAxis(ctx.arg2),
+            ctx.arg3.accept(self),
+            self.visitSpeedOrNow(ctx.arg4),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.MOVE, args=args)
+
+    def visitSpinStatement(self, ctx: BosParser.SpinStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            self.visitAxis(ctx.arg2),
+            ctx.arg3.accept(self),
+            self.visitAcceleration(ctx.arg4) if ctx.arg4 is not None else None,
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.SPIN, args=args)
+
+    def visitAcceleration(self, ctx: BosParser.AccelerationContext):
+        return ctx.expression().accept(self)
+
+    def visitStopSpinStatement(self, ctx: BosParser.StopSpinStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            self.visitAxis(ctx.arg2),
+            self.visitDeceleration(ctx.arg3) if ctx.arg3 is not None else None,
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.STOP_SPIN, args=args)
+
+    def visitDeceleration(self, ctx: BosParser.DecelerationContext):
+        return ctx.expression().accept(self)
+
+    def visitWaitForTurnStatement(self, ctx: BosParser.WaitForTurnStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            self.visitAxis(ctx.arg2),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.WAIT_FOR_TURN, args=args)
+
+    def visitWaitForMoveStatement(self, ctx: BosParser.WaitForMoveStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            self.visitAxis(ctx.arg2),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.WAIT_FOR_MOVE, args=args)
+
+    def visitEmitSfxStatement(self, ctx: BosParser.EmitSfxStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+            self.visitPieceName(ctx.arg2),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.EMIT_SFX, args=args)
+
+    def visitPlaySoundStatement(self, ctx: BosParser.PlaySoundStatementContext):
+        args = [
+            self.visitStringConstant(ctx.arg1),
+            ctx.arg2.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.PLAY_SOUND, args=args)
+
+    def visitHideStatement(self, ctx: BosParser.HideStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.HIDE, args=args)
+
+    def visitShowStatement(self, ctx: BosParser.ShowStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.SHOW, args=args)
+
+    def visitExplodeStatement(self, ctx: BosParser.ExplodeStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+            ctx.arg2.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.EXPLODE, args=args)
+
+    def visitCallStatement(self, ctx: BosParser.CallStatementContext):
+        args = [
+            self.visitFuncName(ctx.arg1),
+        ]
+        if (expression_list := ctx.expressionList()) is not None:
+            args.extend(self.visitExpressionList(expression_list))
+        return self.make_node(nodes.CallStatement, ctx, keyword=nodes.Keyword.CALL_SCRIPT, args=args)
+
+    def visitStartStatement(self, ctx: BosParser.StartStatementContext):
+        args = [
+            self.visitFuncName(ctx.arg1),
+        ]
+        if (expression_list := ctx.expressionList()) is not None:
+            args.extend(self.visitExpressionList(expression_list))
+        return self.make_node(nodes.StartStatement, ctx, keyword=nodes.Keyword.START_SCRIPT, args=args)
+
+    def visitSignalStatement(self, ctx: BosParser.SignalStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.SIGNAL, args=args)
+
+    def visitSetSignalMaskStatement(self, ctx: BosParser.SetSignalMaskStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.SET_SIGNAL_MASK, args=args)
+
+    def visitAttachUnitStatement(self, ctx: BosParser.AttachUnitStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+            ctx.arg2.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.ATTACH_UNIT, args=args)
+
+    def visitDropUnitStatement(self, ctx: BosParser.DropUnitStatementContext):
+        args = [
+            ctx.arg1.accept(self),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.DROP_UNIT, args=args)
+
+    def visitCacheStatement(self, ctx: BosParser.CacheStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.CACHE, args=args)
+
+    def visitDontCacheStatement(self, ctx: BosParser.DontCacheStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.DONT_CACHE, args=args)
+
+    def visitDontShadowStatement(self, ctx: BosParser.DontShadowStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.DONT_SHADOW, args=args)
+
+    def visitDontShadeStatement(self, ctx: BosParser.DontShadeStatementContext):
+        args = [
+            self.visitPieceName(ctx.arg1),
+        ]
+        return self.make_node(nodes.KeywordStatement, ctx, keyword=nodes.Keyword.DONT_SHADE, args=args)
+
+    def visitCommaExpression(self, ctx: BosParser.CommaExpressionContext):
+        return ctx.expression().accept(self)
+
+    def visitParenExpr(self, ctx: BosParser.ParenExprContext):
+        return ctx.expression().accept(self)
+
+    def visitConstTermExpr(self, ctx: BosParser.ConstTermExprContext):
+        return self.visitConstTerm(ctx.constTerm())
+
+    def visitVaryingTermExpr(self, ctx: BosParser.VaryingTermExprContext):
+        return self.visitVaryingTerm(ctx.varyingTerm())
+
+    def visitUnaryExpr(self, ctx: BosParser.UnaryExprContext):
+        return self.build_unary_expr(
+            ctx,
+            op=nodes.ExpressionOp(ctx.op.type),
+            operand=ctx.operand.accept(self)
+        )
+
+    def visitBinaryExpr(self, ctx: BosParser.BinaryExprContext):
+        return self.build_binary_expr(
+            ctx,
+            operand1=ctx.operand1.accept(self),
+            op=nodes.ExpressionOp(ctx.op.type),
+            operand2=ctx.operand2.accept(self)
+        )
+
+    def visitConstTerm(self, ctx: BosParser.ConstTermContext):
+        if (child := ctx.constant()) is not None:
+            return self.visitConstant(child)
+        return self.visitConstTerm(ctx.constTerm())
+
+    def visitVaryingTerm(self, ctx: BosParser.VaryingTermContext):
+        return ctx.getChild(0).accept(self)
+
+    def visitGetCall(self, ctx: BosParser.GetCallContext):
+        args = [
+            ctx.arg1.accept(self) if ctx.arg1 is not None else None,
+            self.visitCommaExpression(ctx.arg2) if ctx.arg2 is not None else None,
+            self.visitCommaExpression(ctx.arg3) if ctx.arg3 is not None else None,
+            self.visitCommaExpression(ctx.arg4) if ctx.arg4 is not None else None,
+        ]
+        return self.make_node(nodes.GetCall, ctx, value_idx=ctx.value_idx.accept(self), args=args)
@@ -0,0 +1,349 @@
+"""
+Generates bos/gen/BosAstBuilder.py, an ASTVisitor subclass specialized to the labels of BosParser.g4.
+
+ASTVisitor finds the arguments of keyword statements and get calls by scanning the context for ``arg`` attributes
+and falls back to visitChildren (which aggregates child results into lists) for every rule that just wraps
+another one. The generated builder instead reads ``kw``, ``arg1``..``arg4``, ``value_idx``, ``op`` and
+``operand``/``operand1``/``operand2`` straight off the context and forwards wrapper rules to their only child,
+calling the child's visit method directly whenever the grammar fixes its type.
+
+Re-run after changing BosParser.g4 (and regenerating bos/gen with ANTLR):
+    python -m bos.generate_ast_builder
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import bos.ast_nodes as nodes
+from bos.ast_visitor import ASTVisitor
+from bos.gen.BosParserVisitor import BosParserVisitor
+
+GRAMMAR_PATH = Path(__file__).parent.joinpath('BosParser.g4')
+OUTPUT_PATH = Path(__file__).parent.joinpath('gen', 'BosAstBuilder.py')
+
+# ASTVisitor methods that only forward to one of the rules this generator replaces
+REPLACEABLE_VISITOR_METHODS = {'visitKeywordStatement', 'visitGetCall', 'visitUnaryExpr', 'visitBinaryExpr'}
+
+_GRAMMAR_TOKEN_RE = re.compile(
+    r"(?P<skip>\s+|//[^\n]*|/\*.*?\*/)|(?P<literal>'(?:\\.|[^'\\])*')|(?P<id>[A-Za-z_]\w*)|(?P<punct>[=:;|()?*+#{}])",
+    re.DOTALL
+)
+
+
+@dataclass
+class Element:
+    name: str | None
+    label: str | None = None
+    suffix: str = ''
+    block: list['Alternative'] | None = None
+
+    @property
+    def is_rule_ref(self) -> bool:
+        return self.name is not None and self.name[0].islower()
+
+    @property
+    def is_optional(self) -> bool:
+        return self.suffix in ('?', '*')
+
+
+@dataclass
+class Alternative:
+    elements: list[Element] = field(default_factory=list)
+    label: str | None = None
+
+
+@dataclass
+class Rule:
+    name: str
+    alternatives: list[Alternative]
+
+
+class GrammarReader:
+    """Just enough of an ANTLR parser grammar reader to find rule references and labels"""
+
+    def __init__(self, text: str):
+        self.tokens: list[str] = []
+        pos = 0
+        while pos < len(text):
+            match = _GRAMMAR_TOKEN_RE.match(text, pos)
+            if match is None:
+                raise ValueError(f'Unexpected grammar text at {pos}: {text[pos:pos + 20]!r}')
+            if match.lastgroup != 'skip':
+                self.tokens.append(match.group())
+            pos = match.end()
+        self.index = 0
+
+    def peek(self, offset=0) -> str | None:
+        index = self.index + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected: str = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(f'Expected {expected or "more grammar"}, found {token!r}')
+        self.index += 1
+        return token
+
+    def read_rules(self) -> dict[str, Rule]:
+        rules = {}
+        while self.peek() is not None:
+            if self.peek() == 'parser' and self.peek(1) == 'grammar':
+                while self.take() != ';':
+                    pass
+            elif self.peek() == 'options':
+                while self.take() != '}':
+                    pass
+            else:
+                name = self.take()
+                self.take(':')
+                rules[name] = Rule(name, self.read_alternatives())
+                self.take(';')
+        return rules
+
+    def read_alternatives(self) -> list[Alternative]:
+        alternatives = [self.read_alternative()]
+        while self.peek() == '|':
+            self.take()
+            alternatives.append(self.read_alternative())
+        return alternatives
+
+    def read_alternative(self) -> Alternative:
+        alternative = Alternative()
+        while self.peek() not in ('|', ')', ';', '#'):
+            element = self.read_element()
+            if element.block is not None and len(element.block) == 1 and not element.suffix and not element.label:
+                # a plain group like (COMMA expression) is the same as its contents
+                alternative.elements.extend(element.block[0].elements)
+            else:
+                alternative.elements.append(element)
+        if self.peek() == '#':
+            self.take()
+            alternative.label = self.take()
+        return alternative
+
+    def read_element(self) -> Element:
+        label = None
+        if self.peek(1) == '=':
+            label = self.take()
+            self.take('=')
+
+        if self.peek() == '(':
+            self.take()
+            element = Element(None, label, block=self.read_alternatives())
+            self.take(')')
+        else:
+            element = Element(self.take(), label)
+
+        if self.peek() in ('?', '*', '+'):
+            element.suffix = self.take()
+        return element
+
+
+def _labels(alternative: Alternative) -> dict[str, tuple[Element, bool]]:
+    """label -> (labeled element, optional) for one alternative, including labels nested in blocks"""
+    result = {}
+    for element in alternative.elements:
+        if element.label is not None:
+            result[element.label] = (element, element.is_optional)
+        if element.block is not None:
+            for block_alternative in element.block:
+                for label, (labeled, optional) in _labels(block_alternative).items():
+                    result.setdefault(label, (labeled, optional or element.is_optional or len(element.block) > 1))
+    return result
+
+
+def _rule_refs(alternative: Alternative) -> list[tuple[int, Element]]:
+    result = []
+    for index, element in enumerate(alternative.elements):
+        if element.is_rule_ref:
+            result.append((index, element))
+        elif element.block is not None:
+            result.extend((index, ref) for block_alt in element.block for _, ref in _rule_refs(block_alt))
+    return result
+
+
+def _cap(name: str) -> str:
+    return name[0].upper() + name[1:]
+
+
+def _snake(name: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+def _call_lines(function: str, args: list[str]) -> list[str]:
+    line = f'return {function}({", ".join(args)})'
+    if len(line) <= 100:
+        return [line]
+    return [f'return {function}(', *(f'    {arg},' for arg in args[:-1]), f'    {args[-1]}', ')']
+
+
+class AstBuilderGenerator:
+
+    def __init__(self, grammar_text: str):
+        self.grammar_text = grammar_text
+        self.rules = GrammarReader(grammar_text).read_rules()
+        self.methods: list[list[str]] = []
+
+    def has_labeled_alternatives(self, rule_name: str) -> bool:
+        return any(alt.label for alt in self.rules[rule_name].alternatives)
+
+    def is_handwritten(self, method_name: str) -> bool:
+        return (
+            getattr(ASTVisitor, method_name, None) is not getattr(BosParserVisitor, method_name, None)
+            and method_name not in REPLACEABLE_VISITOR_METHODS
+        )
+
+    def visit_expr(self, rule_name: str, ctx_expr: str) -> str:
+        if self.has_labeled_alternatives(rule_name):
+            # the context class depends on the alternative that matched
+            return f'{ctx_expr}.accept(self)'
+        return f'self.visit{_cap(rule_name)}({ctx_expr})'
+
+    def label_value(self, element: Element, optional: bool) -> str:
+        value = self.visit_expr(element.name, f'ctx.{element.label}')
+        if optional:
+            return f'{value} if ctx.{element.label} is not None else None'
+        return value
+
+    def rule_labels(self, rule: Rule) -> dict[str, tuple[Element, bool]]:
+        labels = {}
+        for alternative in rule.alternatives:
+            for label, (element, optional) in _labels(alternative).items():
+                labels.setdefault(label, (element, optional))
+        for label, (element, optional) in labels.items():
+            if not all(label in _labels(alt) for alt in rule.alternatives):
+                labels[label] = (element, True)
+        return labels
+
+    def generate(self) -> str:
+        for rule in self.rules.values():
+            labeled_alternatives = [alt for alt in rule.alternatives if alt.label]
+            if labeled_alternatives:
+                generated = set()
+                for alternative in labeled_alternatives:
+                    if alternative.label not in generated:
+                        generated.add(alternative.label)
+                        self.generate_alternative(alternative)
+            elif any(label.startswith('arg') for label in self.rule_labels(rule)):
+                self.generate_arg_rule(rule)
+            else:
+                self.generate_forwarding_rule(rule.name, _cap(rule.name), rule.alternatives)
+
+        lines = [
+            f'# Generated from {GRAMMAR_PATH.name} by bos/generate_ast_builder.py, do not edit',
+            f'# {GRAMMAR_PATH.name} sha1 {grammar_hash(self.grammar_text)}',
+            'import bos.ast_nodes as nodes',
+            'from bos.ast_visitor import ASTVisitor',
+            'from bos.gen.BosParser import BosParser',
+            '',
+            '',
+            'class BosAstBuilder(ASTVisitor):',
+        ]
+        for method in self.methods:
+            lines.append('')
+            lines.extend(f'    {line}' if line else '' for line in method)
+        return '\n'.join(lines) + '\n'
+
+    def generate_arg_rule(self, rule: Rule):
+        labels = self.rule_labels(rule)
+        method_name = f'visit{_cap(rule.name)}'
+        assert not self.is_handwritten(method_name), method_name
+
+        body = ['args = [']
+        for label in sorted(label for label in labels if label.startswith('arg')):
+            body.append(f'    {self.label_value(*labels[label])},')
+        body.append(']')
+
+        # call-script and start-script add their unlabeled expression list to the args
+        unlabeled_refs = {ref.name for alt in rule.alternatives for _, ref in _rule_refs(alt) if ref.label is None}
+        if 'expressionList' in unlabeled_refs:
+            body += [
+                'if (expression_list := ctx.expressionList()) is not None:',
+                '    args.extend(self.visitExpressionList(expression_list))',
+            ]
+
+        if 'kw' in labels:
+            keyword = labels['kw'][0].name
+            assert keyword in nodes.Keyword.__members__, keyword
+            node_class = {'CALL_SCRIPT': 'CallStatement', 'START_SCRIPT': 'StartStatement'}.get(
+                keyword, 'KeywordStatement'
+            )
+            fields = [f'keyword=nodes.Keyword.{keyword}']
+        else:
+            node_class = _cap(rule.name)
+            fields = [
+                f'{label}={self.label_value(*labels[label])}'
+                for label in labels if not label.startswith('arg')
+            ]
+        assert hasattr(nodes, node_class), node_class
+        fields.append('args=args')
+
+        body += _call_lines('self.make_node', [f'nodes.{node_class}', 'ctx', *fields])
+        self.add_method(method_name, f'BosParser.{_cap(rule.name)}Context', body)
+
+    def generate_alternative(self, alternative: Alternative):
+        labels = _labels(alternative)
+        if not labels:
+            self.generate_forwarding_rule(alternative.label, _cap(alternative.label), [alternative])
+            return
+
+        fields = []
+        for label, (element, optional) in labels.items():
+            if element.is_rule_ref:
+                fields.append(f'{label}={self.label_value(element, optional)}')
+            else:
+                # operator tokens, either a single token or a block of them
+                fields.append(f'{label}=nodes.ExpressionOp(ctx.{label}.type)')
+        self.add_method(
+            f'visit{_cap(alternative.label)}',
+            f'BosParser.{_cap(alternative.label)}Context',
+            _call_lines(f'self.build_{_snake(alternative.label)}', ['ctx', *fields])
+        )
+
+    def generate_forwarding_rule(self, name: str, context_name: str, alternatives: list[Alternative]):
+        method_name = f'visit{_cap(name)}'
+        refs = [_rule_refs(alt) for alt in alternatives]
+        if self.is_handwritten(method_name) or any(len(alt_refs) != 1 for alt_refs in refs):
+            return
+        if any(alt.elements[index].is_optional for alt, ((index, _),) in zip(alternatives, refs)):
+            return
+
+        if len(alternatives) == 1:
+            ref = refs[0][0][1]
+            body = [f'return {self.visit_expr(ref.name, f"ctx.{ref.name}()")}']
+        elif all(index == 0 for ((index, _),) in refs):
+            body = ['return ctx.getChild(0).accept(self)']
+        else:
+            body = []
+            ref_names = list(dict.fromkeys(ref.name for ((_, ref),) in refs))
+            for ref_name in ref_names[:-1]:
+                body += [
+                    f'if (child := ctx.{ref_name}()) is not None:',
+                    f'    return {self.visit_expr(ref_name, "child")}',
+                ]
+            body.append(f'return {self.visit_expr(ref_names[-1], f"ctx.{ref_names[-1]}()")}')
+        self.add_method(method_name, f'BosParser.{context_name}Context', body)
+
+    def add_method(self, method_name: str, context_type: str, body: list[str]):
+        self.methods.append([
+            f'def {method_name}(self, ctx: {context_type}):',
+            *(f'    {line}' for line in body),
+        ])
+
+
+def grammar_hash(grammar_text: str) -> str:
+    return hashlib.sha1(grammar_text.encode()).hexdigest()
+
+
+def generate_ast_builder(grammar_text: str) -> str:
+    return AstBuilderGenerator(grammar_text).generate()
+
+
+def main():
+    OUTPUT_PATH.write_text(generate_ast_builder(GRAMMAR_PATH.read_text()))
+    print(f'Wrote {OUTPUT_PATH}')
+
+
+if __name__ == '__main__':
+    main()
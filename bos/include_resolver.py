@@ -0,0 +1,102 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from bos.preprocessor_cache import content_digest
+
+log = logging.getLogger(__name__)
+
+
+class IncludeResolver:
+    """
+    Memo of include file lookups and header contents, shared by every ``BosPreprocessor`` in the process
+
+    pcpp probes each include path in turn for every ``#include`` of every unit, and reads the file it finds.
+    Whether a path is a file is remembered, misses included, for ``max_lookup_age`` seconds, after which the
+    next lookup probes again. Contents are kept in a least recently used cache of up to ``max_bytes`` and
+    handed out again as long as the file's modification time and size are unchanged.
+    """
+
+    @dataclass
+    class Entry:
+        signature: tuple[int, int]
+        data: bytes
+        digest: str
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_lookup_age: float = 5.0):
+        self.max_bytes = max_bytes
+        self.max_lookup_age = max_lookup_age
+        # path -> (when it was probed, whether it is a file)
+        self._lookups: dict[str, tuple[float, bool]] = {}
+        self._contents: OrderedDict[str, IncludeResolver.Entry] = OrderedDict()
+        self._content_bytes = 0
+
+        self.lookups = 0
+        self.lookup_hits = 0
+        self.content_hits = 0
+        self.bytes_read = 0
+
+    def is_file(self, path: str) -> bool:
+        self.lookups += 1
+        now = time.monotonic()
+        lookup = self._lookups.get(path)
+        if lookup is not None and now - lookup[0] <= self.max_lookup_age:
+            self.lookup_hits += 1
+            return lookup[1]
+
+        found = os.path.isfile(path)
+        self._lookups[path] = (now, found)
+        return found
+
+    def read(self, path: str) -> tuple[bytes, str]:
+        """Contents of the file at ``path`` and their digest, raises ``OSError`` like ``open`` if it isn't one"""
+        if not self.is_file(path):
+            raise FileNotFoundError(path)
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._lookups.pop(path, None)
+            raise
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self._contents.get(path)
+        if entry is not None and entry.signature == signature:
+            self._contents.move_to_end(path)
+            self.content_hits += 1
+            return entry.data, entry.digest
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.bytes_read += len(data)
+        digest = content_digest(data)
+
+        if entry is not None:
+            log.debug('%s changed, reading it again', path)
+            self._content_bytes -= len(entry.data)
+        self._contents[path] = IncludeResolver.Entry(signature, data, digest)
+        self._contents.move_to_end(path)
+        self._content_bytes += len(data)
+
+        while self._content_bytes > self.max_bytes:
+            _, evicted = self._contents.popitem(last=False)
+            self._content_bytes -= len(evicted.data)
+
+        return data, digest
+
+    def clear(self):
+        self._lookups.clear()
+        self._contents.clear()
+        self._content_bytes = 0
+
+    def __repr__(self):
+        return (
+            f'IncludeResolver(lookups={self.lookups}, lookup_hits={self.lookup_hits}, '
+            f'cached_files={len(self._contents)}, content_hits={self.content_hits}, bytes_read={self.bytes_read})'
+        )
+
+
+# shared by every BosPreprocessor in the process unless told otherwise
+shared_include_resolver = IncludeResolver()
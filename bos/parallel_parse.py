@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+from antlr4 import Token
+from antlr4.BufferedTokenStream import BufferedTokenStream
+
+from bos.gen.BosLexer import BosLexer
+from bos.token_buffer import tokens_on_channel
+from code_location import LineDirectiveIndex
+
+
+@dataclass
+class DeclarationChunk:
+    """A run of whole top-level declarations, as text that lexes to the same lines and columns as the original"""
+    first_token_index: int
+    last_token_index: int
+    text: str
+
+
+def split_declarations(token_stream: BufferedTokenStream) -> list[tuple[int, int]]:
+    """
+    Cheaply find the top-level declaration boundaries of a fully buffered token stream
+
+    A declaration ends on a ``;`` or ``}`` outside any braces, when the next token starts another
+    declaration (``piece``, ``static-var`` or a ``name(`` function header).
+    Returns ``(first_token_index, last_token_index)`` pairs of default channel tokens.
+    Anything this scan can't make sense of is left in the last range for the real parser to deal with.
+    """
+    tokens = [t for t in tokens_on_channel(token_stream, Token.DEFAULT_CHANNEL) if t.type != Token.EOF]
+    ranges = []
+    brace_depth = 0
+    decl_start = 0
+
+    for i, token in enumerate(tokens):
+        if token.type == BosLexer.L_BRACE:
+            brace_depth += 1
+            continue
+        if token.type == BosLexer.R_BRACE:
+            brace_depth -= 1
+        elif token.type != BosLexer.SEMICOLON:
+            continue
+
+        if brace_depth != 0 or i + 1 >= len(tokens):
+            continue
+
+        next_token = tokens[i + 1]
+        starts_declaration = next_token.type in (BosLexer.PIECE, BosLexer.STATIC_VAR) or (
+            next_token.type == BosLexer.ID and i + 2 < len(tokens) and tokens[i + 2].type == BosLexer.L_PAREN
+        )
+        if starts_declaration:
+            ranges.append((tokens[decl_start].tokenIndex, token.tokenIndex))
+            decl_start = i + 1
+
+    if decl_start < len(tokens):
+        ranges.append((tokens[decl_start].tokenIndex, tokens[-1].tokenIndex))
+
+    return ranges
+
+
+def group_declarations(
+    token_stream: BufferedTokenStream,
+    declaration_ranges: list[tuple[int, int]],
+    chunk_count: int
+) -> list[DeclarationChunk]:
+    """Group consecutive declarations into at most ``chunk_count`` chunks of roughly the same number of tokens"""
+    if not declaration_ranges:
+        return []
+
+    total_tokens = declaration_ranges[-1][1] - declaration_ranges[0][0] + 1
+    target_size = max(1, total_tokens // max(1, chunk_count))
+
+    chunks = []
+    chunk_start = None
+    for first, last in declaration_ranges:
+        if chunk_start is None:
+            chunk_start = first
+        if last - chunk_start + 1 >= target_size:
+            chunks.append(_make_chunk(token_stream, chunk_start, last))
+            chunk_start = None
+
+    if chunk_start is not None:
+        chunks.append(_make_chunk(token_stream, chunk_start, declaration_ranges[-1][1]))
+
+    return chunks
+
+
+def _make_chunk(token_stream: BufferedTokenStream, first_token_index: int, last_token_index: int) -> DeclarationChunk:
+    tokens = token_stream.tokens
+    first_token = tokens[first_token_index]
+    last_token = tokens[last_token_index]
+    input_stream = token_stream.tokenSource.inputStream
+
+    # CodeLocation works out the real line from the closest #line directive before a token,
+    # so carry that directive over on its original line and pad the chunk to its original line and column
+    prefix = []
+    current_line = 1
+    line_directives = LineDirectiveIndex.for_stream(token_stream)
+    position = line_directives.directive_before(first_token_index)
+    if position != -1:
+        line_directive = tokens[line_directives.token_indexes[position]]
+        prefix.append('\n' * (line_directive.line - 1))
+        prefix.append(line_directive.text)
+        current_line = line_directive.line + line_directive.text.count('\n')
+
+    prefix.append('\n' * (first_token.line - current_line))
+    prefix.append(' ' * first_token.column)
+
+    return DeclarationChunk(
+        first_token_index,
+        last_token_index,
+        ''.join(prefix) + input_stream.getText(first_token.start, last_token.stop)
+    )
@@ -0,0 +1,155 @@
+"""
+Time and step budget for an ANTLR parse, so a pathological input stops with an error instead of stalling for minutes
+
+``BudgetedParserATNSimulator`` counts a step for every prediction the parser makes and for every lookahead symbol
+a prediction looks at, which is where a full-context LL prediction spends its time, and looks at the clock every
+``CLOCK_CHECK_INTERVAL`` steps. Past either limit it raises ``ParseTimeoutError`` at the token the prediction
+started at, with the rules the parser was in, and ``ParseBudgetReport`` collects those per file.
+Another thread, e.g. the language server's when the document changes again, can stop a parse in progress
+through its ``cancel_event``, checked along with the clock, which raises ``ParseCancelledError``.
+"""
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from os import PathLike
+
+from antlr4 import Parser
+from antlr4.atn.ATNConfigSet import ATNConfigSet
+from antlr4.atn.ParserATNSimulator import ParserATNSimulator
+
+from code_error import CodeError
+from code_location import CodeLocation
+
+CLOCK_CHECK_INTERVAL = 256
+
+
+class ParseTimeoutError(CodeError):
+    def __init__(
+        self,
+        message: str,
+        error_loc: CodeLocation | None,
+        elapsed: float = 0.0,
+        steps: int = 0,
+        rule_stack: tuple[str, ...] = ()
+    ):
+        super().__init__(message, error_loc)
+        self.elapsed = elapsed
+        self.steps = steps
+        # outermost rule first
+        self.rule_stack = rule_stack
+
+    def __reduce__(self):
+        # survives the trip back from a parallel parse worker
+        return self.__class__, (self.message, self.error_loc, self.elapsed, self.steps, self.rule_stack)
+
+
+class ParseCancelledError(ParseTimeoutError):
+    ...
+
+
+class BudgetedParserATNSimulator(ParserATNSimulator):
+
+    def __init__(
+        self,
+        parser: Parser,
+        max_seconds: float | None = None,
+        max_steps: int | None = None,
+        cancel_event: threading.Event | None = None
+    ):
+        super().__init__(parser, parser.atn, parser.decisionsToDFA, parser.sharedContextCache)
+        self.max_seconds = max_seconds
+        self.max_steps = max_steps
+        self.cancel_event = cancel_event
+
+        self.steps = 0
+        self.started = time.perf_counter()
+        self._next_clock_check = CLOCK_CHECK_INTERVAL
+        # the prediction in progress
+        self._decision = -1
+        self._start_index = -1
+
+    def adaptivePredict(self, input, decision: int, outerContext):
+        self._decision = decision
+        self._start_index = input.index
+        self._step()
+        return super().adaptivePredict(input, decision, outerContext)
+
+    def computeReachSet(self, closure: ATNConfigSet, t: int, fullCtx: bool):
+        self._step()
+        return super().computeReachSet(closure, t, fullCtx)
+
+    def _step(self):
+        self.steps += 1
+        if self.max_steps is not None and self.steps > self.max_steps:
+            self._stop(ParseTimeoutError, f'Parsing took longer than {self.max_steps} prediction steps')
+        if self.steps >= self._next_clock_check:
+            self._next_clock_check += CLOCK_CHECK_INTERVAL
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self._stop(ParseCancelledError, 'Parsing was cancelled')
+            if self.max_seconds is not None and time.perf_counter() - self.started > self.max_seconds:
+                self._stop(ParseTimeoutError, f'Parsing took longer than {self.max_seconds:g} seconds')
+
+    def _stop(self, error_class: type[ParseTimeoutError], reason: str):
+        parser = self.parser
+        token_stream = parser.getTokenStream()
+        rule_name = parser.ruleNames[self.atn.decisionToState[self._decision].ruleIndex]
+        raise error_class(
+            f'{reason}, stopped predicting an alternative of {rule_name}',
+            CodeLocation.from_token(token_stream.get(self._start_index), token_stream),
+            time.perf_counter() - self.started,
+            self.steps,
+            tuple(reversed(parser.getRuleInvocationStack()))
+        )
+
+
+@dataclass
+class ParseBudgetReport:
+    """The files whose parse went over budget, and the rules it was stuck in, the latest ``max_entries`` of them"""
+
+    @dataclass
+    class Entry:
+        file_path: str
+        message: str
+        location: CodeLocation | None
+        elapsed: float
+        steps: int
+        rule_stack: tuple[str, ...]
+
+    entries: list[Entry] = field(default_factory=list)
+    max_entries: int = 1000
+    # older entries dropped to stay within max_entries
+    dropped: int = 0
+
+    def record(self, file_path: str | PathLike[str], error: ParseTimeoutError):
+        self.entries.append(
+            ParseBudgetReport.Entry(
+                str(file_path), error.message, error.error_loc, error.elapsed, error.steps, error.rule_stack
+            )
+        )
+        if len(self.entries) > self.max_entries:
+            overflow = len(self.entries) - self.max_entries
+            del self.entries[:overflow]
+            self.dropped += overflow
+
+    def rule_counts(self) -> Counter[str]:
+        """How often each rule was the innermost one when a parse was stopped"""
+        return Counter(entry.rule_stack[-1] for entry in self.entries if entry.rule_stack)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        lines = [f'{len(self.entries) + self.dropped} files over the parse budget']
+        if self.dropped:
+            lines.append(f'  ({self.dropped} oldest not kept)')
+        for entry in self.entries:
+            lines.append(f'  {entry.file_path}: {entry.message} ({entry.elapsed:.2f}s, {entry.steps} steps)')
+            lines.append(f'    at {entry.location}, in {" > ".join(entry.rule_stack)}')
+        for rule_name, count in self.rule_counts().most_common():
+            lines.append(f'  {rule_name}: {count}')
+        return '\n'.join(lines)
+
+
+# shared by every BosLoader in the process unless told otherwise
+shared_parse_budget_report = ParseBudgetReport()
@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import pickle
+import zlib
+from functools import cache
+from os import PathLike
+from pathlib import Path
+
+from bos import ast_nodes
+from bos.gen import BosLexer as bos_lexer_module
+from bos.gen import BosParser as bos_parser_module
+
+log = logging.getLogger(__name__)
+
+# bump whenever the pickled layout of ast_nodes changes in a way old cache entries can't be loaded as
+CACHE_FORMAT_VERSION = 2
+
+
+@cache
+def grammar_version() -> str:
+    """Hash of the serialized lexer and parser ATNs, changes whenever the .g4 grammars are regenerated"""
+    digest = hashlib.sha256()
+    for atn in (bos_lexer_module.serializedATN(), bos_parser_module.serializedATN()):
+        digest.update(','.join(map(str, atn)).encode('ascii'))
+        digest.update(b';')
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk cache of converted ``ast_nodes.File`` trees, keyed by the preprocessed file text
+
+    Entries are zlib compressed pickles. Nodes loaded from the cache have no parser node,
+    but keep the ``code_location`` resolved when the entry was stored.
+    Least recently used entries are evicted once the directory grows past ``max_size_bytes``.
+    """
+
+    FILE_SUFFIX = '.ast'
+
+    def __init__(self, cache_dir: str | PathLike[str], max_size_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._total_size: int | None = None
+
+    def key_for(self, preprocessed_file_contents: str, *, enable_constant_folding: bool) -> str:
+        digest = hashlib.sha256()
+        digest.update(f'{CACHE_FORMAT_VERSION}:{grammar_version()}:{int(enable_constant_folding)}:'.encode('ascii'))
+        digest.update(preprocessed_file_contents.encode('utf8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(key + self.FILE_SUFFIX)
+
+    def load(self, key: str) -> ast_nodes.File | None:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                file_node = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as err:
+            log.warning('Discarding unreadable parse cache entry %s: %s', entry_path.name, err)
+            entry_path.unlink(missing_ok=True)
+            self._total_size = None
+            self.misses += 1
+            return None
+
+        # mtime doubles as the last-used time for LRU eviction
+        os.utime(entry_path)
+        self.hits += 1
+        return file_node
+
+    def store(self, key: str, file_node: ast_nodes.File):
+        try:
+            data = zlib.compress(pickle.dumps(file_node, protocol=pickle.HIGHEST_PROTOCOL))
+        except (RecursionError, pickle.PicklingError) as err:
+            log.warning('Unable to add AST to the parse cache: %s', err)
+            return
+
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, entry_path)
+
+        if self._total_size is not None:
+            self._total_size += len(data)
+        self._evict_if_needed()
+
+    def _list_entries(self) -> list[os.DirEntry]:
+        with os.scandir(self.cache_dir) as it:
+            return [e for e in it if e.is_file() and e.name.endswith(self.FILE_SUFFIX)]
+
+    def _evict_if_needed(self):
+        if self._total_size is not None and self._total_size <= self.max_size_bytes:
+            return
+
+        # running total is missing or over budget, recount from disk (other processes may share the directory)
+        entries = [(e, e.stat()) for e in self._list_entries()]
+        self._total_size = sum(st.st_size for _, st in entries)
+
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        for entry, st in entries:
+            if self._total_size <= self.max_size_bytes:
+                break
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+            self._total_size -= st.st_size
+            self.evictions += 1
+
+    def clear(self):
+        for entry in self._list_entries():
+            os.unlink(entry.path)
+        self._total_size = 0
+
+    def __repr__(self):
+        return (
+            f'ParseCache({str(self.cache_dir)!r}, hits={self.hits}, misses={self.misses}, evictions={self.evictions})'
+        )
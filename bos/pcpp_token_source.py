@@ -0,0 +1,301 @@
+"""
+``TokenSource`` that hands pcpp's output tokens to the parser as BosLexer tokens
+
+``BosPreprocessor.process_file`` joins pcpp's tokens into one string, with a ``#line`` directive wherever the
+source file changes, which BosLexer then tokenizes all over again, and ``CodeLocation.from_token`` looks for the
+directive in front of every token it locates. ``PcppTokenSource`` converts the tokens as pcpp produces them
+instead, each ``SourceToken`` knows its line in, and the name of, the file it came from.
+
+Most pcpp tokens are exactly one BosLexer token. The two split differently around hyphenated keywords,
+angle and bracket constants, floats and some operators (``static-var`` is three pcpp tokens, ``<<`` one),
+a stretch of tokens without whitespace between them that has one of those in it goes through the fast lexer's
+rules instead, as does a line with a directive pcpp passed through. Past anything BosLexer could read on across
+whitespace (a lone quote, a backslash, a character literal), the rest of the output is tokenized as text.
+Tokens end up on the same lines and columns of the same files as BosLexer's tokens of process_file's output.
+"""
+import logging
+import re
+import string
+from collections.abc import Callable, Iterable, Iterator
+from itertools import chain
+from os import PathLike
+from pathlib import PurePosixPath
+
+from antlr4 import Token
+from antlr4.CommonTokenFactory import CommonTokenFactory
+
+from bos.fast_lexer import FastBosLexer, _KEYWORD_TYPES, _OPERATOR_TYPES
+from bos.gen.BosLexer import BosLexer
+from bos.token_buffer import SourceToken
+
+log = logging.getLogger(__name__)
+
+_new_token = SourceToken.__new__
+
+_COMMENT_TYPES = {
+    'CPP_COMMENT1': BosLexer.BLOCK_COMMENT,
+    'CPP_COMMENT2': BosLexer.LINE_COMMENT,
+}
+
+# BosLexer may join these with the tokens next to them ('static' '-' 'var', '<' '45' '>', '^' '^')
+_JOINING_VALUES = frozenset(('-', '--', '<', '>', '[', ']', '^'))
+
+# BosLexer may read on past the end of the line or the next whitespace from these
+_OPEN_ENDED_TYPES = frozenset(('CPP_DQUOTE', 'CPP_CHAR', 'CPP_LINECONT', 'CPP_BSLASH'))
+
+_DIRECTIVE_TYPES = frozenset(('CPP_POUND', 'CPP_DPOUND'))
+
+_WORD_CHARS = frozenset(string.ascii_letters + string.digits + '_')
+_OPERATOR_CHARS = frozenset('=+-*/%&|^<>!')
+
+_INT_PATTERN = re.compile(r'[0-9]+|0x[0-9a-f]+', re.ASCII | re.IGNORECASE)
+
+
+def _can_join(token, next_token) -> bool:
+    """Whether BosLexer might read two adjacent pcpp tokens as one, macro expansions can put any two side by side"""
+    last, first = token.value[-1], next_token.value[0]
+    return (
+        (last in _WORD_CHARS and first in _WORD_CHARS)
+        or (last in _OPERATOR_CHARS and first in _OPERATOR_CHARS)
+        or token.value in _JOINING_VALUES
+        or next_token.value in _JOINING_VALUES
+    )
+
+
+def _direct_type(token) -> int | None:
+    """The BosLexer token type of a pcpp token that is one BosLexer token on its own"""
+    value = token.value
+    token_type = token.type
+    if token_type == 'CPP_ID':
+        return _KEYWORD_TYPES.get(value.lower(), BosLexer.ID) if value.isascii() else None
+    if token_type == 'CPP_INTEGER':
+        # pcpp also takes integer suffixes, BosLexer doesn't
+        return BosLexer.INT if _INT_PATTERN.fullmatch(value) else None
+    if token_type == 'CPP_STRING':
+        return BosLexer.STRING
+    return _OPERATOR_TYPES.get(value)
+
+
+class PcppTokenSource:
+    """
+    ``TokenSource`` over the tokens of ``BosPreprocessor.process_file_tokens``
+
+    ``on_error(text, line, column)`` is called for every stretch of output BosLexer would report
+    as a token recognition error.
+    """
+
+    def __init__(
+        self,
+        pcpp_tokens: Iterable,
+        source_path: str | PathLike[str],
+        on_error: Callable[[str, int, int], None] = None
+    ):
+        self.source_path = PurePosixPath(source_path)
+        self.on_error = on_error
+        # the parser borrows it to make up missing tokens during error recovery
+        self._factory = CommonTokenFactory.DEFAULT
+        self._source = (self, None)
+
+        # where the next token starts, its line is the line in source_file
+        self.line = 1
+        self.column = 0
+        self.source_file = f'"{self.source_path}"'
+        self._offset = 0
+
+        self._tokens = self._convert(iter(pcpp_tokens))
+
+    def nextToken(self) -> SourceToken:
+        return next(self._tokens)
+
+    def getSourceName(self):
+        return str(self.source_path)
+
+    def getInputStream(self):
+        return None
+
+    def _make_token(self, token_type: int, channel: int, text: str) -> SourceToken:
+        # skips CommonToken.__init__, every slot is filled in here
+        token = _new_token(SourceToken)
+        token.source = self._source
+        token.type = token_type
+        token.channel = channel
+        token.start = self._offset
+        token.stop = self._offset + len(text) - 1
+        token.tokenIndex = -1
+        token.line = self.line
+        token.column = self.column
+        token._text = text
+        token.source_file = self.source_file
+
+        self._advance(text)
+        if token_type == BosLexer.LINE_DIRECTIVE:
+            # the same as CodeLocation.from_token makes of a directive: the line after it is line N of that file
+            try:
+                line_str, source_file = text.split()[1:3]
+                self.line = int(line_str) - 1
+                self.source_file = source_file
+            except ValueError:
+                pass
+        return token
+
+    def _advance(self, text: str):
+        self._offset += len(text)
+        newlines = text.count('\n')
+        if newlines:
+            self.line += newlines
+            self.column = len(text) - text.rindex('\n') - 1
+        else:
+            self.column += len(text)
+
+    def _enter_source(self, source: PurePosixPath, line: int):
+        # where process_file puts a #line directive
+        self.line = line
+        self.column = 0
+        self.source_file = f'"{source}"'
+
+    def _lex(self, text: str) -> Iterator[SourceToken]:
+        """Tokenizes ``text`` with the fast lexer's rules, starting at the current position"""
+        position = 0
+        lexer = FastBosLexer(text, self._report_error)
+        while (token := lexer.nextToken()).type != Token.EOF:
+            if token.start > position:
+                # skipped by error recovery
+                self._advance(text[position:token.start])
+            yield self._make_token(token.type, token.channel, token.text)
+            position = token.stop + 1
+        if position < len(text):
+            self._advance(text[position:])
+
+    def _report_error(self, text: str, line: int, column: int):
+        if self.on_error is not None:
+            self.on_error(text, self.line, self.column)
+        else:
+            log.debug('%s line %d:%d token recognition error at: %r', self.source_file, self.line, self.column, text)
+
+    def _run_tokens(self, run: list, directive_line: bool) -> list[SourceToken] | None:
+        """
+        BosLexer tokens of pcpp tokens that had no whitespace or comment between them, or of a directive's line,
+        None if BosLexer might read on past their end
+        """
+        text = ''.join(token.value for token in run)
+        if directive_line:
+            # up to the '#', BosLexer reads the whole rest of the line into one token from there
+            prefix = text[:text.index('#')]
+        else:
+            token_types = [_direct_type(token) for token in run]
+            if None not in token_types and not any(map(_can_join, run, run[1:])):
+                return [
+                    self._make_token(token_type, Token.DEFAULT_CHANNEL, token.value)
+                    for token, token_type in zip(run, token_types)
+                ]
+            prefix = text
+
+        # an unterminated string or comment, or a lone '.', which BosLexer only gives up on a character later
+        if '"' in prefix or '/*' in prefix or '//' in prefix or prefix.endswith('.'):
+            return None
+        return list(self._lex(text))
+
+    def _convert(self, pcpp_tokens: Iterator) -> Iterator[SourceToken]:
+        current_source = self.source_path
+        last_token_source = None
+        # pcpp tokens since the last whitespace or comment, or since the '#' of a passed through directive
+        run = []
+        directive_line = False
+        whitespace = []
+
+        def flush_whitespace():
+            return self._make_token(BosLexer.WHITESPACE, Token.HIDDEN_CHANNEL, ''.join(whitespace))
+
+        for token in pcpp_tokens:
+            if token.source != last_token_source:
+                last_token_source = token.source
+                if PurePosixPath(token.source) != current_source:
+                    if run:
+                        run_tokens = self._run_tokens(run, directive_line)
+                        if run_tokens is None:
+                            yield from self._lex_remaining(run, chain((token,), pcpp_tokens), current_source)
+                            return
+                        yield from run_tokens
+                        run = []
+                        directive_line = False
+                    if whitespace:
+                        yield flush_whitespace()
+                        whitespace = []
+                    current_source = PurePosixPath(token.source)
+                    self._enter_source(current_source, token.lineno)
+
+            token_type = token.type
+            value = token.value
+
+            if directive_line:
+                # BosLexer reads the whole line into one token, up to the first line break
+                if token_type == 'CPP_WS' and value == '\n':
+                    run_tokens = self._run_tokens(run, directive_line)
+                    if run_tokens is None:
+                        yield from self._lex_remaining(run, chain((token,), pcpp_tokens), current_source)
+                        return
+                    yield from run_tokens
+                    run = []
+                    directive_line = False
+                    whitespace.append(value)
+                elif '\n' in value or '\\' in value:
+                    yield from self._lex_remaining(run, chain((token,), pcpp_tokens), current_source)
+                    return
+                else:
+                    run.append(token)
+                continue
+
+            comment_type = _COMMENT_TYPES.get(token_type)
+            if run and (token_type == 'CPP_WS' or comment_type is not None):
+                run_tokens = self._run_tokens(run, directive_line)
+                if run_tokens is None:
+                    yield from self._lex_remaining(run, chain((token,), pcpp_tokens), current_source)
+                    return
+                yield from run_tokens
+                run = []
+
+            if token_type == 'CPP_WS':
+                whitespace.append(value)
+                continue
+
+            if whitespace:
+                yield flush_whitespace()
+                whitespace = []
+
+            if comment_type is not None:
+                yield self._make_token(comment_type, BosLexer.COMMENTS, value)
+                continue
+
+            if token_type in _OPEN_ENDED_TYPES or '\\' in value:
+                yield from self._lex_remaining(run, chain((token,), pcpp_tokens), current_source)
+                return
+
+            run.append(token)
+            if token_type in _DIRECTIVE_TYPES:
+                directive_line = True
+
+        if run:
+            yield from self._lex_remaining(run, iter(()), current_source)
+            return
+        if whitespace:
+            yield flush_whitespace()
+        yield from self._eof()
+
+    def _lex_remaining(self, run: list, pcpp_tokens: Iterator, current_source: PurePosixPath) -> Iterator[SourceToken]:
+        """Tokenizes the run and the rest of the output as text, the way process_file would have joined it"""
+        parts = [token.value for token in run]
+        for token in pcpp_tokens:
+            token_path = PurePosixPath(token.source)
+            if token_path != current_source:
+                current_source = token_path
+                parts.append(f'#line {token.lineno} "{current_source}"\n')
+            parts.append(token.value)
+
+        yield from self._lex(''.join(parts))
+        yield from self._eof()
+
+    def _eof(self) -> Iterator[SourceToken]:
+        eof = self._make_token(Token.EOF, Token.DEFAULT_CHANNEL, '')
+        eof._text = '<EOF>'
+        while True:
+            yield eof
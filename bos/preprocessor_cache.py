@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from os import PathLike
+from pathlib import PurePosixPath
+
+log = logging.getLogger(__name__)
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# path -> (modification time, size, digest) when it was last hashed, only for files that were already
+# older than _RACY_WINDOW_NS then
+_file_digests: dict[str, tuple[int, int, str]] = {}
+# coarser than the modification time resolution of common file systems (FAT has 2 seconds)
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def file_digest(path: str | PathLike[str]) -> str | None:
+    """
+    Digest of a file's contents, only read and hashed again once its modification time or size changes
+
+    A file modified shortly before it was hashed could be written again within the same timestamp tick
+    and keep its size, so its digest isn't remembered and it is hashed on every call until it is older.
+    """
+    path = os.fspath(path)
+    try:
+        stat = os.stat(path)
+        known = _file_digests.get(path)
+        if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+        with open(path, 'rb') as f:
+            digest = content_digest(f.read())
+    except OSError:
+        _file_digests.pop(path, None)
+        return None
+    if stat.st_mtime_ns < time.time_ns() - _RACY_WINDOW_NS:
+        _file_digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    else:
+        _file_digests.pop(path, None)
+    return digest
+
+
+def _result_size(result: tuple[str, str | None, list | None]) -> int:
+    """Rough size of a ``process_file`` result, in characters, the chunks hold both texts over again"""
+    preprocessed, reconstructed, chunks = result
+    size = len(preprocessed) + len(reconstructed or '')
+    if chunks is not None:
+        size *= 2
+    return size
+
+
+class PreprocessorCache:
+    """
+    In-memory cache of ``BosPreprocessor.process_file`` results
+
+    Entries are keyed by the unit's path and content hash, the include paths and the working directory
+    (pcpp bakes paths relative to it into the #line directives), and whether the output is lean.
+    Each entry records the content hash of every file pcpp opened and every include candidate it probed
+    and did not find, a hit is only returned when all of them are still the same. Headers are only hashed
+    again after their modification time or size changed (see ``file_digest``). The least recently used entries
+    are dropped once the entries hold more than about ``max_bytes`` of text.
+
+    Entries are shared by every loader using the cache, each hit gets a list of chunks of its own.
+    """
+
+    @dataclass
+    class Entry:
+        result: tuple[str, str | None, tuple | None]
+        opened_includes: dict[str, str]
+        missing_includes: frozenset[str]
+        size: int
+
+        def is_valid(self) -> bool:
+            return (
+                all(file_digest(path) == digest for path, digest in self.opened_includes.items())
+                and not any(os.path.isfile(path) for path in self.missing_includes)
+            )
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, PreprocessorCache.Entry] = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(
+        file_text: str,
+        file_path: str | PathLike[str],
+        include_paths: list[str | PathLike[str]] | None,
+        lean: bool
+    ):
+        return (
+            str(PurePosixPath(file_path)),
+            content_digest(file_text.encode('utf8')),
+            tuple(str(p) for p in include_paths or ()),
+            os.getcwd(),
+            lean,
+        )
+
+    def lookup(
+        self,
+        file_text: str,
+        file_path: str | PathLike[str],
+        include_paths: list[str | PathLike[str]] = None,
+        *,
+        lean=False
+    ) -> tuple[str, str | None, list | None] | None:
+        key = self._key(file_text, file_path, include_paths, lean)
+        entry = self._entries.get(key)
+
+        if entry is not None and not entry.is_valid():
+            log.debug('Dependencies of %s changed, dropping preprocessor cache entry', file_path)
+            self._drop(key)
+            self.invalidations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        preprocessed, reconstructed, chunks = entry.result
+        return preprocessed, reconstructed, list(chunks) if chunks is not None else None
+
+    def store(
+        self,
+        file_text: str,
+        file_path: str | PathLike[str],
+        include_paths: list[str | PathLike[str]] | None,
+        result: tuple[str, str | None, list | None],
+        opened_includes: dict[str, str],
+        missing_includes: set[str],
+        *,
+        lean=False
+    ):
+        key = self._key(file_text, file_path, include_paths, lean)
+        if key in self._entries:
+            self._drop(key)
+        preprocessed, reconstructed, chunks = result
+        entry = PreprocessorCache.Entry(
+            (preprocessed, reconstructed, tuple(chunks) if chunks is not None else None),
+            dict(opened_includes), frozenset(missing_includes), _result_size(result)
+        )
+        self._entries[key] = entry
+        self._size += entry.size
+
+        while self._size > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: tuple):
+        self._size -= self._entries.pop(key).size
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (
+            f'PreprocessorCache(entries={len(self)}, size={self._size}, hits={self.hits}, misses={self.misses}, '
+            f'invalidations={self.invalidations})'
+        )
+
+
+# shared by every BosLoader in the process unless told otherwise
+shared_preprocessor_cache = PreprocessorCache()
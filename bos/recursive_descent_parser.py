@@ -0,0 +1,444 @@
+"""
+Hand written parser for the BosParser.g4 grammar that builds bos.ast_nodes straight from the tokens
+
+Declarations and statements only need one token of lookahead, expressions are parsed by precedence climbing
+with the precedence levels of the ``expression`` rule. The nodes come out the same as from BosParser followed by
+ASTVisitor, including their code locations; bos/test/test_recursive_descent_parser.py holds it to that.
+"""
+from typing import TypeVar
+
+from antlr4 import Token
+from antlr4.BufferedTokenStream import BufferedTokenStream
+from antlr4.Token import CommonToken
+
+import bos.ast_nodes as nodes
+from bos.ast_visitor import ASTVisitor
+from bos.gen.BosLexer import BosLexer
+from bos.gen.BosParser import BosParser
+from bos.token_buffer import tokens_on_channel
+from code_error import CodeError
+from code_location import CodeLocation
+
+_NodeT = TypeVar('_NodeT', bound=nodes.ASTNode)
+
+# precedence level of each binaryExpr operator, the higher the level the tighter it binds
+_BINARY_PRECEDENCE = {
+    BosLexer.OP_MULT: 10,
+    BosLexer.OP_DIV: 10,
+    BosLexer.OP_MOD: 10,
+    BosLexer.OP_ADD: 9,
+    BosLexer.OP_MINUS: 9,
+    BosLexer.COMP_LESS: 8,
+    BosLexer.COMP_GREATER: 8,
+    BosLexer.COMP_LESS_EQUAL: 8,
+    BosLexer.COMP_GREATER_EQUAL: 8,
+    BosLexer.COMP_EQUAL: 7,
+    BosLexer.COMP_NOT_EQUAL: 7,
+    BosLexer.BITWISE_AND: 6,
+    BosLexer.BITWISE_OR: 5,
+    BosLexer.BITWISE_XOR: 4,
+    BosLexer.LOGICAL_AND: 3,
+    BosLexer.LOGICAL_OR: 2,
+    BosLexer.LOGICAL_XOR: 1,
+}
+
+_CONSTANT_TOKENS = frozenset((BosLexer.LINEAR_CONSTANT, BosLexer.DEGREES_CONSTANT, BosLexer.INT, BosLexer.FLOAT))
+_NUMBER_TOKENS = frozenset((BosLexer.INT, BosLexer.FLOAT))
+_AXIS_TOKENS = frozenset((BosLexer.X_AXIS, BosLexer.Y_AXIS, BosLexer.Z_AXIS))
+_DECLARATION_TOKENS = frozenset((BosLexer.PIECE, BosLexer.STATIC_VAR, BosLexer.ID))
+
+
+class SyntaxSpan:
+    """First and last token of a node, takes the place of the ANTLR rule context for CodeLocation.from_parser_node"""
+    __slots__ = ('start', 'stop', 'parser')
+
+    def __init__(self, start: CommonToken, stop: CommonToken | None, parser: 'RecursiveDescentParser'):
+        self.start = start
+        self.stop = stop
+        self.parser = parser
+
+
+def _token_type_name(token_type: int) -> str:
+    if token_type == Token.EOF:
+        return '<EOF>'
+    literal_name = BosParser.literalNames[token_type] if token_type < len(BosParser.literalNames) else '<INVALID>'
+    return literal_name if literal_name != '<INVALID>' else BosParser.symbolicNames[token_type]
+
+
+def _token_display(token: CommonToken) -> str:
+    if token.type == Token.EOF:
+        return '<EOF>'
+    return "'" + token.text.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t') + "'"
+
+
+class RecursiveDescentParser:
+
+    def __init__(
+        self,
+        token_stream: BufferedTokenStream,
+        *,
+        enable_constant_folding=False,
+        validate_nodes=True
+    ):
+        token_stream.fill()
+        self.token_stream = token_stream
+        self.tokens: list[CommonToken] = tokens_on_channel(token_stream, Token.DEFAULT_CHANNEL)
+        self.types: list[int] = [t.type for t in self.tokens]
+        self.pos = 0
+        self.enable_constant_folding = enable_constant_folding
+        self.validate_nodes = validate_nodes
+
+    def getTokenStream(self) -> BufferedTokenStream:
+        # same as an ANTLR Parser, CodeLocation gets the #line directives through it
+        return self.token_stream
+
+    def parse_file(self) -> nodes.File:
+        """
+        Parse ``declaration*``; like ``BosParser.file_()`` this stops at the first token that can't start a declaration
+        """
+        start = self.pos
+        declarations = []
+        while self.types[self.pos] in _DECLARATION_TOKENS:
+            declarations.append(self._declaration())
+        return self._node(nodes.File, start, declarations=declarations)
+
+    # -- helpers
+
+    def _span(self, start: int) -> SyntaxSpan:
+        return SyntaxSpan(self.tokens[start], self.tokens[self.pos - 1] if self.pos > 0 else None, self)
+
+    def _node(self, node_class: type[_NodeT], start: int | None, /, **fields) -> _NodeT:
+        span = self._span(start) if start is not None else None
+        if self.validate_nodes:
+            return node_class(parser_node=span, **fields)
+        return node_class.construct_unvalidated(span, **fields)
+
+    def _error(self, message: str) -> CodeError:
+        token = self.tokens[self.pos]
+        return CodeError(message, CodeLocation.from_token(token, self.token_stream))
+
+    def _no_viable_alternative(self) -> CodeError:
+        return self._error(f'no viable alternative at input {_token_display(self.tokens[self.pos])}')
+
+    def _expect(self, token_type: int) -> CommonToken:
+        if self.types[self.pos] != token_type:
+            raise self._error(
+                f'mismatched input {_token_display(self.tokens[self.pos])} expecting {_token_type_name(token_type)}'
+            )
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def _accept(self, token_type: int) -> bool:
+        if self.types[self.pos] == token_type:
+            self.pos += 1
+            return True
+        return False
+
+    def _name(self, node_class: type[_NodeT]) -> _NodeT:
+        start = self.pos
+        token = self._expect(BosLexer.ID)
+        return self._node(node_class, start, name=token.text)
+
+    def _names(self, node_class: type[_NodeT]) -> list[_NodeT]:
+        names = [self._name(node_class)]
+        while self._accept(BosLexer.COMMA):
+            names.append(self._name(node_class))
+        return names
+
+    # -- declarations
+
+    def _declaration(self) -> nodes.Declaration:
+        start = self.pos
+        match self.types[start]:
+            case BosLexer.PIECE:
+                self.pos += 1
+                names = self._names(nodes.PieceName)
+                self._expect(BosLexer.SEMICOLON)
+                return self._node(nodes.PieceDeclaration, start, names=names)
+
+            case BosLexer.STATIC_VAR:
+                self.pos += 1
+                names = self._names(nodes.VarName)
+                self._expect(BosLexer.SEMICOLON)
+                return self._node(nodes.StaticVarDeclaration, start, names=names)
+
+        name = self._name(nodes.FuncName)
+        self._expect(BosLexer.L_PAREN)
+        args = []
+        if self.types[self.pos] != BosLexer.R_PAREN:
+            args = self._names(nodes.ArgName)
+        self._expect(BosLexer.R_PAREN)
+        block = self._statement_block()
+        return self._node(nodes.FuncDeclaration, start, name=name, args=args, block=block)
+
+    # -- statements
+
+    def _statement_block(self) -> nodes.StatementBlock:
+        start = self.pos
+        if self._accept(BosLexer.L_BRACE):
+            statements = []
+            while self.types[self.pos] != BosLexer.R_BRACE:
+                statements.append(self._statement())
+            self.pos += 1
+        else:
+            statements = [self._statement()]
+        return self._node(nodes.StatementBlock, start, statements=statements)
+
+    def _statement(self) -> nodes.Statement:
+        start = self.pos
+        token_type = self.types[start]
+
+        if (keyword_args := self._KEYWORD_STATEMENT_ARGS.get(token_type)) is not None:
+            statement = self._keyword_statement(keyword_args)
+            self._expect(BosLexer.SEMICOLON)
+            return statement
+
+        match token_type:
+            case BosLexer.IF:
+                self.pos += 1
+                self._expect(BosLexer.L_PAREN)
+                condition = self._expression()
+                self._expect(BosLexer.R_PAREN)
+                then_block = self._statement_block()
+                else_block = self._statement_block() if self._accept(BosLexer.ELSE) else None
+                return self._node(
+                    nodes.IfStatement, start, condition=condition, then_block=then_block, else_block=else_block
+                )
+
+            case BosLexer.WHILE:
+                self.pos += 1
+                self._expect(BosLexer.L_PAREN)
+                condition = self._expression()
+                self._expect(BosLexer.R_PAREN)
+                block = self._statement_block()
+                return self._node(nodes.WhileStatement, start, condition=condition, block=block)
+
+            case BosLexer.VAR:
+                self.pos += 1
+                statement = self._node(nodes.VarStatement, start, vars=self._names(nodes.VarName))
+
+            case BosLexer.ID:
+                variable = self._name(nodes.VarName)
+                self._expect(BosLexer.EQUAL_ASSIGN)
+                expression = self._expression()
+                statement = self._node(nodes.AssignStatement, start, variable=variable, expression=expression)
+
+            case BosLexer.OP_INCREMENT | BosLexer.OP_DECREMENT:
+                self.pos += 1
+                variable = self._name(nodes.VarName)
+                statement = self._node(
+                    nodes.AssignStatement, start,
+                    variable=variable,
+                    expression=self._node(
+                        nodes.BinaryExpression, None,
+                        operand1=self._node(nodes.VarNameTerm, None, var_name=variable),
+                        op=nodes.ExpressionOp.ADD if token_type == BosLexer.OP_INCREMENT else nodes.ExpressionOp.MINUS,
+                        operand2=self._node(nodes.Constant, None, value=1)
+                    )
+                )
+
+            case BosLexer.RETURN:
+                self.pos += 1
+                expression = self._expression() if self.types[self.pos] != BosLexer.SEMICOLON else None
+                statement = self._node(nodes.ReturnStatement, start, expression=expression)
+
+            case BosLexer.SEMICOLON:
+                self.pos += 1
+                return self._node(nodes.EmptyStatement, start)
+
+            case _:
+                raise self._no_viable_alternative()
+
+        self._expect(BosLexer.SEMICOLON)
+        return statement
+
+    def _keyword_statement(self, keyword_args) -> nodes.KeywordStatement:
+        start = self.pos
+        keyword = nodes.Keyword(self.types[start])
+        self.pos += 1
+
+        args = []
+        for item in keyword_args:
+            if isinstance(item, int):
+                self._expect(item)
+            else:
+                item(self, args)
+
+        statement_class = nodes.KeywordStatement
+        if keyword == nodes.Keyword.CALL_SCRIPT:
+            statement_class = nodes.CallStatement
+        elif keyword == nodes.Keyword.START_SCRIPT:
+            statement_class = nodes.StartStatement
+
+        return self._node(statement_class, start, keyword=keyword, args=args)
+
+    # keyword statement arguments, each adds to the statement's args the same way ASTVisitor does
+
+    def _arg_expression(self, args: list):
+        args.append(self._expression())
+
+    def _arg_piece_name(self, args: list):
+        args.append(self._name(nodes.PieceName))
+
+    def _arg_axis(self, args: list):
+        start = self.pos
+        if self.types[start] not in _AXIS_TOKENS:
+            raise self._error(
+                f'mismatched input {_token_display(self.tokens[start])} expecting {{'
+                + ', '.join(_token_type_name(t) for t in sorted(_AXIS_TOKENS)) + '}'
+            )
+        self.pos += 1
+        args.append(self._node(nodes.Axis, start, axis=nodes.AxisEnum.from_str(self.tokens[start].text)))
+
+    def _arg_speed_or_now(self, args: list):
+        if self._accept(BosLexer.NOW):
+            args.append(None)
+            return
+        self._expect(BosLexer.SPEED)
+        args.append(self._expression())
+
+    def _arg_acceleration(self, args: list):
+        args.append(self._expression() if self._accept(BosLexer.ACCELERATE) else None)
+
+    def _arg_deceleration(self, args: list):
+        args.append(self._expression() if self._accept(BosLexer.DECELERATE) else None)
+
+    def _arg_get_call(self, args: list):
+        args.append(self._get_call())
+
+    def _arg_string_constant(self, args: list):
+        # ASTVisitor has no conversion for strings and leaves an UndefNode named after the rule context
+        token = self._expect(BosLexer.STRING)
+        ctx = BosParser.StringConstantContext(self)
+        ctx.start = ctx.stop = token
+        if self.validate_nodes:
+            args.append(nodes.UndefNode(parser_node=ctx, contents=None))
+        else:
+            args.append(nodes.UndefNode.construct_unvalidated(ctx, contents=None))
+
+    def _arg_script_call(self, args: list):
+        args.append(self._name(nodes.FuncName))
+        self._expect(BosLexer.L_PAREN)
+        if self.types[self.pos] != BosLexer.R_PAREN:
+            args.append(self._expression())
+            while self._accept(BosLexer.COMMA):
+                args.append(self._expression())
+        self._expect(BosLexer.R_PAREN)
+
+    _KEYWORD_STATEMENT_ARGS = {
+        BosLexer.CALL_SCRIPT: (_arg_script_call,),
+        BosLexer.START_SCRIPT: (_arg_script_call,),
+        BosLexer.SPIN: (_arg_piece_name, BosLexer.AROUND, _arg_axis, BosLexer.SPEED, _arg_expression, _arg_acceleration),
+        BosLexer.STOP_SPIN: (_arg_piece_name, BosLexer.AROUND, _arg_axis, _arg_deceleration),
+        BosLexer.TURN: (_arg_piece_name, BosLexer.TO, _arg_axis, _arg_expression, _arg_speed_or_now),
+        BosLexer.MOVE: (_arg_piece_name, BosLexer.TO, _arg_axis, _arg_expression, _arg_speed_or_now),
+        BosLexer.WAIT_FOR_TURN: (_arg_piece_name, BosLexer.AROUND, _arg_axis),
+        BosLexer.WAIT_FOR_MOVE: (_arg_piece_name, BosLexer.ALONG, _arg_axis),
+        BosLexer.EMIT_SFX: (_arg_expression, BosLexer.FROM, _arg_piece_name),
+        BosLexer.SLEEP: (_arg_expression,),
+        BosLexer.HIDE: (_arg_piece_name,),
+        BosLexer.SHOW: (_arg_piece_name,),
+        BosLexer.EXPLODE: (_arg_piece_name, BosLexer.TYPE, _arg_expression),
+        BosLexer.SIGNAL: (_arg_expression,),
+        BosLexer.SET_SIGNAL_MASK: (_arg_expression,),
+        BosLexer.SET: (_arg_expression, BosLexer.TO, _arg_expression),
+        BosLexer.GET: (_arg_get_call,),
+        BosLexer.ATTACH_UNIT: (_arg_expression, BosLexer.TO, _arg_expression),
+        BosLexer.DROP_UNIT: (_arg_expression,),
+        BosLexer.PLAY_SOUND: (
+            BosLexer.L_PAREN, _arg_string_constant, BosLexer.COMMA, _arg_expression, BosLexer.R_PAREN
+        ),
+        BosLexer.CACHE: (_arg_piece_name,),
+        BosLexer.DONT_CACHE: (_arg_piece_name,),
+        BosLexer.DONT_SHADOW: (_arg_piece_name,),
+        BosLexer.DONT_SHADE: (_arg_piece_name,),
+    }
+
+    # -- expressions
+
+    def _expression(self, min_level: int = 1) -> nodes.Expression | nodes.ValueNode:
+        # left associative: the right hand side of a level n operator only takes operators of level n + 1 and up
+        start = self.pos
+        result = self._primary()
+        while (level := _BINARY_PRECEDENCE.get(self.types[self.pos], 0)) >= min_level:
+            op = nodes.ExpressionOp(self.types[self.pos])
+            self.pos += 1
+            operand2 = self._expression(level + 1)
+
+            if (
+                self.enable_constant_folding
+                and isinstance(result, nodes.Constant)
+                and isinstance(operand2, nodes.Constant)
+            ):
+                result = self._node(
+                    nodes.Constant, start,
+                    value=ASTVisitor.BINARY_OP_FUNC_MAPPING[op](result.number_value(), operand2.number_value())
+                )
+            else:
+                result = self._node(nodes.BinaryExpression, start, operand1=result, op=op, operand2=operand2)
+        return result
+
+    def _primary(self) -> nodes.Expression | nodes.ValueNode:
+        start = self.pos
+        token_type = self.types[start]
+
+        if token_type == BosLexer.L_PAREN:
+            self.pos += 1
+            expression = self._expression()
+            self._expect(BosLexer.R_PAREN)
+            return expression
+
+        if token_type in _CONSTANT_TOKENS:
+            self.pos += 1
+            return self._node(nodes.Constant, start, value=self.tokens[start].text)
+
+        if token_type == BosLexer.OP_MINUS and self.types[start + 1] in _NUMBER_TOKENS:
+            self.pos += 2
+            return self._node(nodes.Constant, start, value='-' + self.tokens[start + 1].text)
+
+        if token_type == BosLexer.ID:
+            self.pos += 1
+            return self._node(
+                nodes.VarNameTerm, start,
+                var_name=self._node(nodes.VarName, start, name=self.tokens[start].text)
+            )
+
+        if token_type == BosLexer.LOGICAL_NOT:
+            op = nodes.ExpressionOp(token_type)
+            self.pos += 1
+            operand = self._primary()
+            if self.enable_constant_folding and isinstance(operand, nodes.Constant):
+                return self._node(
+                    nodes.Constant, start,
+                    value=ASTVisitor.UNARY_OP_FUNC_MAPPING[op](operand.number_value())
+                )
+            return self._node(nodes.UnaryExpression, start, op=op, operand=operand)
+
+        if token_type == BosLexer.GET:
+            self.pos += 1
+            get_call = self._get_call()
+            return self._node(nodes.GetTerm, start, get_call=get_call)
+
+        if token_type == BosLexer.RAND:
+            self.pos += 1
+            self._expect(BosLexer.L_PAREN)
+            min_value = self._expression()
+            self._expect(BosLexer.COMMA)
+            max_value = self._expression()
+            self._expect(BosLexer.R_PAREN)
+            return self._node(nodes.RandTerm, start, min=min_value, max=max_value)
+
+        raise self._no_viable_alternative()
+
+    def _get_call(self) -> nodes.GetCall:
+        start = self.pos
+        value_idx = self._expression()
+        args = [None, None, None, None]
+        if self._accept(BosLexer.L_PAREN):
+            args[0] = self._expression()
+            for i in range(1, len(args)):
+                if not self._accept(BosLexer.COMMA):
+                    break
+                args[i] = self._expression()
+            self._expect(BosLexer.R_PAREN)
+        return self._node(nodes.GetCall, start, value_idx=value_idx, args=args)
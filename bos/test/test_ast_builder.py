@@ -0,0 +1,59 @@
+import random
+import unittest
+
+from bos import generate_ast_builder
+from bos.ast_visitor import ASTVisitor
+from bos.bos_loader import BosLoader
+from bos.gen.BosAstBuilder import BosAstBuilder
+from bos.test.test_recursive_descent_parser import SAMPLES, all_nodes, random_expression
+
+
+def parse_tree(text: str):
+    loader = BosLoader('test.bos', preprocessor_cache=None)
+    loader.preprocessed_file_contents = text
+    loader._run_parser()
+    return loader.parser_node_tree
+
+
+class TestAstBuilder(unittest.TestCase):
+
+    def test_generated_file_is_current(self):
+        self.assertEqual(
+            generate_ast_builder.generate_ast_builder(generate_ast_builder.GRAMMAR_PATH.read_text()),
+            generate_ast_builder.OUTPUT_PATH.read_text(),
+            'bos/gen/BosAstBuilder.py is stale, run python -m bos.generate_ast_builder'
+        )
+
+    def assertSameAst(self, text: str, **visitor_options):
+        tree = parse_tree(text)
+        try:
+            expected = ASTVisitor(**visitor_options).visitFile(tree)
+        except ZeroDivisionError:
+            with self.assertRaises(ZeroDivisionError):
+                BosAstBuilder(**visitor_options).visitFile(tree)
+            return
+
+        actual = BosAstBuilder(**visitor_options).visitFile(tree)
+        self.assertEqual(expected.model_dump(), actual.model_dump())
+        self.assertEqual(
+            [(type(n), n.parser_node) for n in all_nodes(expected)],
+            [(type(n), n.parser_node) for n in all_nodes(actual)]
+        )
+
+    def test_samples(self):
+        for i, text in enumerate(SAMPLES):
+            for enable_constant_folding in (False, True):
+                with self.subTest(i, enable_constant_folding=enable_constant_folding):
+                    self.assertSameAst(text, enable_constant_folding=enable_constant_folding)
+                    self.assertSameAst(text, enable_constant_folding=enable_constant_folding, validate_nodes=False)
+
+    def test_random_expressions(self):
+        rng = random.Random(1234)
+        for i in range(200):
+            text = f'static-var x;\nF(a, b)\n{{\n\tx = {random_expression(rng, 4)};\n}}\n'
+            with self.subTest(i, text=text):
+                self.assertSameAst(text, enable_constant_folding=i % 2 == 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
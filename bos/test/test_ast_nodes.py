@@ -0,0 +1,220 @@
+import gc
+import itertools
+import pickle
+import random
+import unittest
+
+from bos import ast_nodes as nodes
+from antlr4 import ParserRuleContext
+from pydantic import ValidationError
+
+from bos.bos_loader import BosLoader
+from bos.gen.BosParser import BosParser
+from bos.token_buffer import CompactTokenStream
+from bos.test.test_recursive_descent_parser import SAMPLES, all_nodes, random_expression
+
+
+def load(text: str, **options) -> BosLoader:
+    loader = BosLoader('unit.bos', file_contents=text, preprocessor_cache=None, **options)
+    loader.load_file()
+    return loader
+
+
+class TestUnvalidatedNodes(unittest.TestCase):
+
+    def test_same_as_validated(self):
+        for i, text in enumerate(SAMPLES):
+            for enable_constant_folding in (False, True):
+                with self.subTest(i, enable_constant_folding=enable_constant_folding):
+                    validated = load(text, enable_constant_folding=enable_constant_folding).ast_node_tree
+                    unvalidated = load(
+                        text, enable_constant_folding=enable_constant_folding, validate_ast_nodes=False
+                    ).ast_node_tree
+                    self.assertEqual(unvalidated, validated)
+                    self.assertEqual(unvalidated.model_dump(), validated.model_dump())
+                    self.assertEqual(
+                        [(type(node), node.model_fields_set, node.code_location) for node in all_nodes(unvalidated)],
+                        [(type(node), node.model_fields_set, node.code_location) for node in all_nodes(validated)]
+                    )
+
+    def test_fields_set_is_not_shared(self):
+        a = nodes.VarName.construct_unvalidated(name='a')
+        b = nodes.VarName.construct_unvalidated(name='b')
+        self.assertIsNot(a.model_fields_set, b.model_fields_set)
+        a.model_fields_set.discard('name')
+        self.assertEqual(b.model_fields_set, {'name'})
+        self.assertEqual(nodes.VarName.construct_unvalidated(name='c').model_fields_set, {'name'})
+
+
+class TestStructuralEquality(unittest.TestCase):
+
+    def test_hash_consistent_with_equality(self):
+        rng = random.Random(4321)
+        texts = [*SAMPLES, *(f'F(a, b)\n{{\n    x = {random_expression(rng, 3)};\n}}\n' for _ in range(30))]
+        for text in texts:
+            with self.subTest(text=text):
+                # two separate parses, nothing shared between them
+                first, second = all_nodes(load(text).ast_node_tree), all_nodes(load(text).ast_node_tree)
+                for a, b in zip(first, second):
+                    self.assertEqual(a, b)
+                    self.assertEqual(hash(a), hash(b))
+
+        expressions = [node for text in texts for node in all_nodes(load(text).ast_node_tree)][:400]
+        for a, b in itertools.combinations(expressions, 2):
+            if a == b:
+                self.assertEqual(hash(a), hash(b), (a, b))
+                self.assertEqual(b, a)
+
+    def test_constants(self):
+        self.assertEqual(nodes.Constant(1), nodes.Constant(1))
+        self.assertEqual(hash(nodes.Constant('<5>')), hash(nodes.Constant('<5>')))
+        for a, b in ((nodes.Constant(1), nodes.Constant(1.0)), (nodes.Constant('<1>'), nodes.Constant('[1]'))):
+            with self.subTest(a=a, b=b):
+                self.assertNotEqual(a, b)
+                # the same as comparing model_dump, as nodes were compared before
+                self.assertNotEqual(a.model_dump(), b.model_dump())
+
+    def test_names_are_case_insensitive(self):
+        self.assertEqual(nodes.VarName(name='Is_Aiming'), nodes.VarName(name='is_aiming'))
+        self.assertEqual(hash(nodes.VarName(name='Is_Aiming')), hash(nodes.VarName(name='is_aiming')))
+        self.assertNotEqual(nodes.VarName(name='is_aiming'), nodes.VarName(name='is_moving'))
+
+    def test_names_inside_nodes_are_case_sensitive(self):
+        # as when nodes were compared by model_dump
+        self.assertNotEqual(
+            nodes.PieceDeclaration(names=[nodes.PieceName(name='Base')]),
+            nodes.PieceDeclaration(names=[nodes.PieceName(name='base')])
+        )
+
+        upper, lower = (
+            load(f'static-var {name};\nF()\n{{\n    {name} = 1;\n}}\n').ast_node_tree for name in ('X', 'x')
+        )
+        self.assertNotEqual(upper, lower)
+        self.assertNotEqual(upper.model_dump(), lower.model_dump())
+        self.assertEqual(upper, load('static-var X;\nF()\n{\n    X = 1;\n}\n').ast_node_tree)
+
+    def test_pickle_drops_structural_hash(self):
+        file = load(SAMPLES[-1]).ast_node_tree
+        file_hash = hash(file)
+        self.assertEqual(file.__pydantic_private__['_structural_hash'], file_hash)
+        self.assertIsNone(file.__getstate__()['__pydantic_private__']['_structural_hash'])
+
+        unpickled = pickle.loads(pickle.dumps(file))
+        self.assertIsNone(unpickled.__pydantic_private__['_structural_hash'])
+        self.assertEqual(unpickled, file)
+        self.assertEqual(hash(unpickled), file_hash)
+
+
+class TestLazyFunctionBodies(unittest.TestCase):
+
+    def lazy_and_eager(self) -> tuple[nodes.File, nodes.File]:
+        return load(SAMPLES[2], lazy_function_bodies=True).ast_node_tree, load(SAMPLES[2]).ast_node_tree
+
+    def assertNotConverted(self, function: nodes.FuncDeclaration):
+        self.assertNotIn('block', function.__dict__)
+        self.assertIsNotNone(function.__pydantic_private__['_block_builder'])
+
+    def test_converts_on_first_access(self):
+        lazy, eager = self.lazy_and_eager()
+        function = lazy.function_declarations[0]
+        self.assertNotConverted(function)
+
+        block = function.block
+        self.assertIs(function.__dict__['block'], block)
+        self.assertIsNone(function.__pydantic_private__['_block_builder'])
+        self.assertIs(function.block, block)
+        self.assertEqual(block, eager.function_declarations[0].block)
+        self.assertEqual(
+            [node.code_location for node in all_nodes(block)],
+            [node.code_location for node in all_nodes(eager.function_declarations[0].block)]
+        )
+
+    def test_model_dump(self):
+        lazy, eager = self.lazy_and_eager()
+        self.assertNotConverted(lazy.function_declarations[0])
+        self.assertEqual(lazy.model_dump(), eager.model_dump())
+
+    def test_hash_and_equality(self):
+        lazy, eager = self.lazy_and_eager()
+        self.assertNotConverted(lazy.function_declarations[0])
+        self.assertEqual(hash(lazy), hash(eager))
+
+        lazy, eager = self.lazy_and_eager()
+        self.assertNotConverted(lazy.function_declarations[0])
+        self.assertEqual(lazy, eager)
+
+    def test_pickle(self):
+        lazy, eager = self.lazy_and_eager()
+        function = lazy.function_declarations[0]
+        self.assertNotConverted(function)
+
+        unpickled = pickle.loads(pickle.dumps(lazy))
+        self.assertEqual(unpickled, eager)
+        self.assertIsNone(unpickled.function_declarations[0].__pydantic_private__['_block_builder'])
+        self.assertEqual(
+            unpickled.function_declarations[0].block.code_location, eager.function_declarations[0].block.code_location
+        )
+
+    def test_validated_when_converted(self):
+        def lazy_function(validate: bool) -> nodes.FuncDeclaration:
+            # not a StatementBlock
+            return nodes.FuncDeclaration.construct_lazy(
+                block_builder=lambda: nodes.EmptyStatement(), validate=validate,
+                name=nodes.FuncName(name='F'), args=[]
+            )
+
+        self.assertIsInstance(lazy_function(validate=False).block, nodes.EmptyStatement)
+        function = lazy_function(validate=True)
+        with self.assertRaises(ValidationError):
+            _ = function.block
+
+        lazy = load(SAMPLES[2], lazy_function_bodies=True).ast_node_tree.function_declarations[0]
+        self.assertTrue(lazy.__pydantic_private__['_validate_lazy_fields'])
+        unvalidated = load(SAMPLES[2], lazy_function_bodies=True, validate_ast_nodes=False).ast_node_tree
+        self.assertFalse(unvalidated.function_declarations[0].__pydantic_private__['_validate_lazy_fields'])
+        self.assertEqual(lazy.block, unvalidated.function_declarations[0].block)
+
+
+
+class TestDetach(unittest.TestCase):
+
+    def test_same_code_locations(self):
+        for i, text in enumerate(SAMPLES):
+            for lazy_function_bodies in (False, True):
+                with self.subTest(i, lazy_function_bodies=lazy_function_bodies):
+                    attached = load(text)
+                    detached = load(text, detach_parse_tree=True, lazy_function_bodies=lazy_function_bodies)
+                    self.assertEqual(detached.ast_node_tree, attached.ast_node_tree)
+                    self.assertEqual(
+                        [node.code_location for node in all_nodes(detached.ast_node_tree)],
+                        [node.code_location for node in all_nodes(attached.ast_node_tree)]
+                    )
+
+    def test_no_parse_tree_references(self):
+        def parse_objects() -> int:
+            return sum(
+                isinstance(obj, (ParserRuleContext, BosParser, CompactTokenStream)) for obj in gc.get_objects()
+            )
+
+        gc.collect()
+        before = parse_objects()
+        loader = load(SAMPLES[2], detach_parse_tree=True, lazy_function_bodies=True)
+        self.assertIsNone(loader.parser_node_tree)
+        self.assertIsNone(loader.token_stream)
+        self.assertIsNone(loader.bos_parser)
+        file = loader.ast_node_tree
+        for node in all_nodes(file):
+            self.assertIsNone(node.parser_node)
+        self.assertTrue(all(
+            function.__pydantic_private__['_block_builder'] is None for function in file.function_declarations
+        ))
+
+        del loader
+        gc.collect()
+        # the AST alone is left
+        self.assertEqual(parse_objects(), before)
+        self.assertEqual(file.code_location.source_file, '"unit.bos"')
+
+
+if __name__ == '__main__':
+    unittest.main()
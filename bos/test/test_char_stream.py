@@ -0,0 +1,45 @@
+import random
+import unittest
+
+import antlr4
+
+from bos.char_stream import StrInputStream
+from bos.gen.BosLexer import BosLexer
+from bos.test.test_fast_lexer import FUZZ_ALPHABET, SAMPLES, antlr_tokens, token_tuples
+
+
+def str_stream_tokens(text: str):
+    lexer = BosLexer(StrInputStream(text))
+    lexer.removeErrorListeners()
+    token_stream = antlr4.CommonTokenStream(lexer)
+    token_stream.fill()
+    return token_stream.tokens
+
+
+class TestStrInputStream(unittest.TestCase):
+
+    def test_same_tokens_as_input_stream(self):
+        rng = random.Random(4321)
+        fuzz = [''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(1, 25))) for _ in range(500)]
+        for i, text in enumerate([*SAMPLES, *fuzz]):
+            with self.subTest(i, text=text):
+                self.assertEqual(token_tuples(antlr_tokens(text)), token_tuples(str_stream_tokens(text)))
+
+    def test_lookahead(self):
+        text = 'aé\n'
+        expected, actual = antlr4.InputStream(text), StrInputStream(text)
+        for _ in range(len(text) + 1):
+            for offset in (-2, -1, 0, 1, 2, 3, 4):
+                self.assertEqual(expected.LA(offset), actual.LA(offset), offset)
+            if actual.index < actual.size:
+                expected.consume()
+                actual.consume()
+        self.assertEqual(expected.getText(1, 5), actual.getText(1, 5))
+
+    def test_no_instance_dict(self):
+        # antlr4's InputStream declares __slots__, StrInputStream mustn't bring a __dict__ back
+        self.assertFalse(hasattr(StrInputStream('piece a;'), '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import tempfile
+import unittest
+
+from bos.bos_loader import BosLoader
+from bos.decision_profile import DecisionProfile
+from bos.parse_budget import ParseTimeoutError
+from bos.parse_cache import ParseCache
+from bos.test.test_recursive_descent_parser import SAMPLES
+
+
+class TestDecisionProfile(unittest.TestCase):
+
+    def load(self, text: str, **options) -> BosLoader:
+        loader = BosLoader('unit.bos', file_contents=text, preprocessor_cache=None, **options)
+        loader.load_file()
+        return loader
+
+    def test_profile(self):
+        profile = DecisionProfile()
+        for text in SAMPLES:
+            with self.subTest(text=text):
+                profiled = self.load(text, decision_profile=profile)
+                self.assertEqual(profiled.ast_node_tree, self.load(text).ast_node_tree)
+                profile.files += 1
+                profile.ll_fallback_declarations += profiled.ll_fallback_count
+
+        rules = profile.by_rule()
+        self.assertEqual(
+            sum(stats.invocations for _, stats in rules.values()),
+            sum(stats.invocations for stats in profile.decisions)
+        )
+        self.assertGreater(rules['expression'][1].invocations, 0)
+        self.assertGreaterEqual(rules['expression'][1].sll_max_look, 1)
+        self.assertIn('expression', profile.report())
+
+        profile_json = json.loads(json.dumps(profile.to_json()))
+        self.assertEqual(profile_json['files'], len(SAMPLES))
+        self.assertEqual(len(profile_json['decisions']), len(profile.decisions))
+        self.assertEqual(profile_json['rules']['expression']['decisions'], rules['expression'][0])
+
+    def test_report_sorting(self):
+        profile = DecisionProfile()
+        self.load(SAMPLES[2], decision_profile=profile)
+        report_rules = [line.split()[0] for line in profile.report('invocations').splitlines()[2:]]
+        invocations = {rule_name: stats.invocations for rule_name, (_, stats) in profile.by_rule().items()}
+        self.assertEqual(report_rules, sorted(report_rules, key=invocations.get, reverse=True))
+
+    def test_every_parse_path_is_profiled(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parse_cache = ParseCache(cache_dir)
+            self.load(SAMPLES[2], parse_cache=parse_cache)
+            for options in ({'parse_cache': parse_cache}, {'parallel_parse_workers': 2}):
+                with self.subTest(options=options):
+                    profile = DecisionProfile()
+                    loader = self.load(SAMPLES[2], decision_profile=profile, **options)
+                    self.assertIsNotNone(loader.parser_node_tree)
+                    self.assertGreater(sum(stats.invocations for stats in profile.decisions), 0)
+            self.assertEqual(parse_cache.hits, 0)
+
+    def test_prediction_stopped_before_any_lookahead(self):
+        profile = DecisionProfile()
+        # stops at the start of a prediction well into the file
+        with self.assertRaises(ParseTimeoutError):
+            self.load(SAMPLES[2], decision_profile=profile, parse_step_budget=40, parse_budget_report=None)
+        self.assertGreater(sum(stats.invocations for stats in profile.decisions), 0)
+        for stats in profile.decisions:
+            self.assertGreaterEqual(stats.sll_total_look, 0)
+            self.assertGreaterEqual(stats.sll_max_look, 0)
+
+    def test_rejects_recursive_descent_parser(self):
+        with self.assertRaises(ValueError):
+            BosLoader(
+                'unit.bos', file_contents=SAMPLES[0], decision_profile=DecisionProfile(),
+                use_recursive_descent_parser=True
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
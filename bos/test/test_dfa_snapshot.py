@@ -0,0 +1,80 @@
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from bos.test.test_recursive_descent_parser import SAMPLES
+
+PACKAGE_ROOT = Path(__file__).parent.parent.parent
+
+# loads every unit of a directory in a fresh process, after loading the snapshot if one is given, and prints
+# whether it was loaded, the number of parser DFA states before and after loading the units, and the ASTs
+LOAD_UNITS = """
+import json, sys
+from pathlib import Path
+from bos import dfa_snapshot
+from bos.bos_loader import BosLoader
+from bos.gen.BosParser import BosParser
+
+loaded = dfa_snapshot.load_snapshot(sys.argv[2]) if len(sys.argv) > 2 else None
+states_before = sum(len(dfa.states) for dfa in BosParser.decisionsToDFA)
+asts = [
+    str(BosLoader(bos_file, preprocessor_cache=None).load_file().model_dump())
+    for bos_file in sorted(Path(sys.argv[1]).glob('*.bos'))
+]
+states_after = sum(len(dfa.states) for dfa in BosParser.decisionsToDFA)
+print(json.dumps([loaded, states_before, states_after, asts]))
+"""
+
+
+def run_module(*args: str) -> str:
+    return subprocess.run(
+        [sys.executable, *args], cwd=PACKAGE_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+
+
+class TestDfaSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.units_dir = self.dir.joinpath('units')
+        self.units_dir.mkdir()
+        for i, text in enumerate(SAMPLES):
+            self.units_dir.joinpath(f'unit{i}.bos').write_text(text)
+        self.snapshot = self.dir.joinpath('dfa_snapshot.bin')
+        run_module('-m', 'bos.dfa_snapshot', 'build', str(self.units_dir), '-o', str(self.snapshot))
+
+    def test_loading_leaves_asts_unchanged(self):
+        cold_loaded, cold_before, cold_after, cold_asts = json.loads(run_module('-c', LOAD_UNITS, str(self.units_dir)))
+        loaded, before, after, asts = json.loads(
+            run_module('-c', LOAD_UNITS, str(self.units_dir), str(self.snapshot))
+        )
+        self.assertIsNone(cold_loaded)
+        self.assertEqual(cold_before, 0)
+        self.assertTrue(loaded)
+        self.assertEqual(asts, cold_asts)
+        # everything was learned from the same corpus already
+        self.assertEqual(before, cold_after)
+        self.assertEqual(after, cold_after)
+
+    def test_unreadable_or_missing_snapshot(self):
+        self.snapshot.write_bytes(b'not a snapshot')
+        for snapshot in (self.snapshot, self.dir.joinpath('missing')):
+            with self.subTest(snapshot=snapshot.name):
+                loaded, before, _, _ = json.loads(run_module('-c', LOAD_UNITS, str(self.units_dir), str(snapshot)))
+                self.assertFalse(loaded)
+                self.assertEqual(before, 0)
+
+    def test_measure(self):
+        output = run_module(
+            '-m', 'bos.dfa_snapshot', 'measure', str(self.units_dir.joinpath('unit2.bos')), '-s', str(self.snapshot)
+        )
+        self.assertEqual([line.split()[0] for line in output.splitlines()], ['cold', 'snapshot'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import random
+import re
+import unittest
+from pathlib import Path
+
+from bos.bos_loader import BosLoader
+from bos.bos_preprocessor import BosPreprocessor
+from bos.test.test_recursive_descent_parser import all_nodes
+from unit_value_nums import UnitValue
+
+EXAMPLE_FILES_DIR = Path(__file__).parent.parent.parent.joinpath('example_files')
+
+SAMPLES = [
+    '',
+    '\n',
+    '\n\n\n',
+    'piece base, turret;',
+    'static-var x;\nF()\n{\n\tx = TRUE;\n\tif (x == FALSE) return true;\n}\n',
+    'F()\n{\n\tset ACTIVATION to false;\n\tx = get HEALTH + get MAX_ID;\n}\n',
+    'x = TRUE;TRUE TRUE\nFALSE/*TRUE*/false // TRUE\n',
+    'F()\r\n{\r\n\tsleep 1;   \r\n}\r\n',
+    'trailing   \n\t\n  \n\n',
+    '  leading\n\tTRUE',
+    'form\x0cfeed\x0bvertical\x1cseparator\x85next',
+    '/* block\n   comment   \n   over lines */ x = TRUE;\n',
+    '/* # and \' in a comment */ x;\n// #define TRUE 0\n',
+    'call-script "TRUE"(TRUE); "FALSE TRUE" TRUE\n',
+    'xTRUE TRUE_ _TRUE TRUE1 é TRUE é\xa0TRUE\n',
+    'x = 0x1F + 1.5 + 100 + TRUE;\n',
+    # everything below needs pcpp
+    '#define X 1\nX',
+    'x = \'c\';',
+    'x = 1TRUE;',
+    'x = 2 ACTIVATION;x = 0xFALSE;',
+    'x = UNKNOWN_UNIT_VALUE(5);',
+    'x = __LINE__;',
+    'x = __FILE__;',
+    'x = 1 + \\\n2;',
+    'x = "\\"TRUE";',
+    'x = "TRUE',
+    '/* TRUE',
+    'x = ??= y;',
+    '/* ??= */',
+]
+
+FUZZ_ALPHABET = [
+    *'abxyz_0123456789 \t\n\n\n;.+-*/()"é\xa0\r\x0c',
+    'TRUE', 'true', 'FALSE', 'false', *[value.name.upper() for value in UnitValue][:5],
+    '/*', '*/', '//', '"TRUE"', '#', "'", '\\', '??', '__LINE__', 'UNKNOWN_UNIT_VALUE',
+]
+
+
+def paths_and_includes():
+    return [
+        ('unit.bos', None),
+        (os.path.abspath('unit.bos'), None),
+        ('/elsewhere/units/unit.bos', None),
+        ('/elsewhere/units/unit.bos', ['/elsewhere']),
+        ('../unit.bos', ['..']),
+    ]
+
+
+class TestDirectiveFree(unittest.TestCase):
+
+    def assertMatchesPcpp(self, text: str) -> bool:
+        """Compares the fast path with pcpp, returns whether the fast path handled the text"""
+        handled = False
+        for file_path, include_paths in paths_and_includes():
+            for lean in (False, True):
+                result = BosPreprocessor.process_directive_free(text, file_path, include_paths, lean=lean)
+                if result is None:
+                    continue
+                handled = True
+                self.assertEqual(
+                    BosPreprocessor(lean=lean).process_file(text, file_path, include_paths),
+                    result,
+                    f'{file_path=} {include_paths=} {lean=}'
+                )
+        return handled
+
+    def test_samples(self):
+        needs_pcpp = SAMPLES.index('#define X 1\nX')
+        for i, text in enumerate(SAMPLES):
+            with self.subTest(i, text=text):
+                self.assertEqual(self.assertMatchesPcpp(text), i < needs_pcpp)
+
+    def test_fuzz(self):
+        rng = random.Random(4321)
+        for i in range(500):
+            text = ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40)))
+            with self.subTest(i, text=text):
+                self.assertMatchesPcpp(text)
+
+    @unittest.skipUnless(EXAMPLE_FILES_DIR.is_dir(), 'example_files not present')
+    def test_example_files(self):
+        for path in sorted(EXAMPLE_FILES_DIR.rglob('*')):
+            if path.suffix.lower() not in ('.bos', '.h') or 'preprocessed' in path.name:
+                continue
+            with self.subTest(path=str(path)):
+                # with its directives taken out, most of the corpus is directive-free
+                text = re.sub(r'^[ \t]*#.*$', '', path.read_text(encoding='utf8', errors='replace'), flags=re.M)
+                self.assertMatchesPcpp(text)
+
+    def test_loader(self):
+        text = SAMPLES[4]
+        for options in ({}, {'lean': True}):
+            with self.subTest(**options):
+                fast = BosLoader('unit.bos', file_contents=text, preprocessor_cache=None, **options)
+                fast.load_file()
+                self.assertIsNone(fast.preprocessor)
+                with_pcpp = BosLoader(
+                    'unit.bos', file_contents=text, preprocessor_cache=None, directive_free_fast_path=False, **options
+                )
+                with_pcpp.load_file()
+                self.assertIsNotNone(with_pcpp.preprocessor)
+
+                self.assertEqual(with_pcpp.preprocessed_file_contents, fast.preprocessed_file_contents)
+                self.assertEqual(with_pcpp.ast_node_tree, fast.ast_node_tree)
+                self.assertEqual(
+                    [n.code_location for n in all_nodes(with_pcpp.ast_node_tree)],
+                    [n.code_location for n in all_nodes(fast.ast_node_tree)]
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
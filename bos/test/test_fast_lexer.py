@@ -0,0 +1,75 @@
+import random
+import unittest
+from pathlib import Path
+
+import antlr4
+
+from bos.fast_lexer import tokenize
+from bos.gen.BosLexer import BosLexer
+
+EXAMPLE_FILES_DIR = Path(__file__).parent.parent.parent.joinpath('example_files')
+
+SAMPLES = [
+    'piece base, turret;\nstatic-var is_aiming, restore_delay;\n',
+    'Create()\n{\n\thide flare;\n\tturn turret to y-axis <45.5> speed <90>;\n\tmove barrel to z-axis [-2.5] now;\n}\n',
+    'stop-spin stopspin stop-spinner stopspinner stop- x-axis xaxisfoo X-AXIS wait-forturn waitfor-turn',
+    'static-var staticvar static- set-signal-mask setsignal-mask set- DONT-CACHE Play-Sound',
+    'a.b .5 1. 1.5.3 0x1F 0xg 0X 12abc',
+    '[1] [ 1 ] [-0x10] [1.] <5> <= < -5> <-5>',
+    'a++b--c==d!=e&&f||g^^h!i and or not xor',
+    '// comment\n#line 5 "units/armcom.bos"\n#include "x.h"\n#line 0x10 y\n#liney\n#define A 1',
+    '#define A \\\n B \\\n C\nx #define B \\\r\n C\n #c \\\n\nx',
+    '/* block\n comment */ /* unterminated',
+    '"abc" "a\nb" @ $ ~ x. . ',
+    '"unterminated\nstring',
+    '\t\r\n \f x ſ K é',
+]
+
+# fragments that exercise ties and overlaps between lexer rules
+FUZZ_ALPHABET = [
+    *'abxz-_09.#"/*\\\n\r \t[]<>=+!&|^;(){}@',
+    'stop', 'spin', 'wait', 'for', 'turn', 'axis', 'line ', 'include', '0x', 'set', 'signal', 'mask',
+    'static', 'var', '/*', '*/', '//', '\\\n',
+]
+
+
+def token_tuples(tokens):
+    return [(t.type, t.channel, t.start, t.stop, t.line, t.column, t.text) for t in tokens]
+
+
+def antlr_tokens(text: str):
+    lexer = BosLexer(antlr4.InputStream(text))
+    lexer.removeErrorListeners()
+    token_stream = antlr4.CommonTokenStream(lexer)
+    token_stream.fill()
+    return token_stream.tokens
+
+
+class TestFastLexer(unittest.TestCase):
+
+    def assertSameTokens(self, text: str):
+        self.assertEqual(token_tuples(antlr_tokens(text)), token_tuples(tokenize(text)))
+
+    def test_samples(self):
+        for i, text in enumerate(SAMPLES):
+            with self.subTest(i, text=text):
+                self.assertSameTokens(text)
+
+    def test_fuzz(self):
+        rng = random.Random(1234)
+        for i in range(2000):
+            text = ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(1, 25)))
+            with self.subTest(i, text=text):
+                self.assertSameTokens(text)
+
+    @unittest.skipUnless(EXAMPLE_FILES_DIR.is_dir(), 'example_files not present')
+    def test_example_files(self):
+        for path in sorted(EXAMPLE_FILES_DIR.rglob('*')):
+            if path.suffix.lower() not in ('.bos', '.h'):
+                continue
+            with self.subTest(path=str(path)):
+                self.assertSameTokens(path.read_text(encoding='utf8', errors='replace'))
+
+
+if __name__ == '__main__':
+    unittest.main()
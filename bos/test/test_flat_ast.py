@@ -0,0 +1,110 @@
+import pickle
+import sys
+import unittest
+
+from bos import ast_nodes as nodes
+from bos.bos_loader import BosLoader
+from bos.flat_ast import FlatAST
+from bos.test.test_recursive_descent_parser import SAMPLES
+
+
+def load(text: str) -> nodes.File:
+    return BosLoader('unit.bos', file_contents=text, preprocessor_cache=None).load_file()
+
+
+def deep_expression(depth: int) -> nodes.Expression:
+    expression = nodes.Constant.construct_unvalidated(value=1)
+    for i in range(depth):
+        expression = nodes.BinaryExpression.construct_unvalidated(
+            operand1=expression, op=nodes.ExpressionOp.ADD, operand2=nodes.Constant.construct_unvalidated(value=i)
+        )
+    return expression
+
+
+def file_returning(expressions: list[nodes.Expression]) -> nodes.File:
+    """A File of one function returning each of the expressions in turn"""
+    statements = [nodes.ReturnStatement.construct_unvalidated(expression=expression) for expression in expressions]
+    return nodes.File.construct_unvalidated(declarations=[
+        nodes.FuncDeclaration.construct_unvalidated(
+            name=nodes.FuncName.construct_unvalidated(name='F'),
+            args=[],
+            block=nodes.StatementBlock.construct_unvalidated(statements=statements)
+        )
+    ])
+
+
+class TestFlatAST(unittest.TestCase):
+
+    def test_round_trip(self):
+        for text in SAMPLES:
+            with self.subTest(text=text):
+                file = load(text)
+                flat = FlatAST.from_file(file)
+                self.assertEqual(flat.to_file(), file)
+                data = flat.to_bytes()
+                for buffer in (data, bytearray(data), memoryview(data)):
+                    from_buffer = FlatAST.from_buffer(buffer)
+                    self.assertIsInstance(from_buffer.kinds, memoryview)
+                    self.assertEqual(from_buffer.to_file(), file)
+                    self.assertEqual(from_buffer.to_bytes(), data)
+
+    def test_pickle(self):
+        file = load(SAMPLES[-1])
+        flat = FlatAST.from_file(file)
+        unpickled = pickle.loads(pickle.dumps(flat))
+        self.assertEqual(unpickled.to_bytes(), flat.to_bytes())
+        self.assertEqual(unpickled.to_file(), file)
+        self.assertEqual(pickle.loads(pickle.dumps(unpickled)).to_file(), file)
+
+    def test_rejects_other_buffers(self):
+        data = bytearray(FlatAST.from_file(load(SAMPLES[0])).to_bytes())
+        data[4] += 1
+        with self.assertRaises(ValueError):
+            FlatAST.from_buffer(data)
+
+    def test_large_int_constants(self):
+        values = [2 ** 53 + 1, -(2 ** 63), 2 ** 63 - 1, 0.1, 3]
+        file = file_returning([nodes.Constant.construct_unvalidated(value=value) for value in values])
+        flat = FlatAST.from_buffer(FlatAST.from_file(file).to_bytes())
+        self.assertEqual([cursor.constant[0] for cursor in flat.find(nodes.Constant)], values)
+        self.assertEqual(
+            [type(cursor.constant[0]) for cursor in flat.find(nodes.Constant)], [type(value) for value in values]
+        )
+        self.assertEqual(flat.to_file(), file)
+
+    def test_ints_beyond_64_bits(self):
+        values = [99999999999999999999, 99999999999 * 99999999999, -(2 ** 63) - 1, 2 ** 63, 2 ** 63 - 1, 7]
+        file = file_returning([nodes.Constant.construct_unvalidated(value=value) for value in values])
+        flat = FlatAST.from_file(file)
+        self.assertEqual(flat.big_ints, values[:4])
+        for from_buffer in (FlatAST.from_buffer(flat.to_bytes()), pickle.loads(pickle.dumps(flat))):
+            self.assertEqual([cursor.constant for cursor in from_buffer.find(nodes.Constant)], [
+                (value, 'normal') for value in values
+            ])
+            self.assertEqual(from_buffer.to_file(), file)
+
+        text = 'F()\n{\n    return 99999999999999999999 + 99999999999 * 99999999999;\n}\n'
+        for enable_constant_folding in (False, True):
+            loaded = BosLoader(
+                'unit.bos', file_contents=text, preprocessor_cache=None, enable_constant_folding=enable_constant_folding
+            ).load_file()
+            self.assertEqual(FlatAST.from_buffer(FlatAST.from_file(loaded).to_bytes()).to_file(), loaded)
+
+    def test_deep_expression(self):
+        depth = sys.getrecursionlimit() * 2
+        file = file_returning([deep_expression(depth)])
+        flat = FlatAST.from_file(file)
+        rebuilt = flat.to_file()
+
+        expression = rebuilt.declarations[0].block.statements[0].expression
+        operands = []
+        while isinstance(expression, nodes.BinaryExpression):
+            operands.append(expression.operand2.base_value)
+            expression = expression.operand1
+        self.assertEqual(operands, list(reversed(range(depth))))
+        # comparing the trees themselves would recurse
+        self.assertEqual(FlatAST.from_file(rebuilt).to_bytes(), flat.to_bytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from bos.bos_loader import BosLoader
+from bos.bos_preprocessor import BosPreprocessor
+
+HEADERS = {
+    'guarded.h': '// leading comment\n#ifndef GUARDED_H\n#define GUARDED_H\nstatic-var guarded;\n#endif // GUARDED_H\n',
+    'defined_guard.h': '#if !defined(DEFINED_GUARD_H)\n#define DEFINED_GUARD_H\nstatic-var defined_guard;\n#endif\n',
+    'once.h': '#pragma once\nstatic-var once;\n',
+    'nested.h': '#ifndef NESTED_H\n#define NESTED_H\n#include "guarded.h"\n#include "once.h"\n#endif\n',
+    'unguarded.h': 'static-var unguarded;\n',
+    'partly_guarded.h': '#ifndef PARTLY_H\n#define PARTLY_H\n#endif\nstatic-var partly;\n',
+}
+
+
+class TestIncludeGuards(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        for name, text in HEADERS.items():
+            self.dir.joinpath(name).write_text(text)
+
+    def preprocess(self, text: str) -> tuple[str, BosPreprocessor]:
+        preprocessor = BosPreprocessor()
+        return preprocessor.process_file(text, self.dir.joinpath('unit.bos'), [self.dir])[0], preprocessor
+
+    def test_skip_counts(self):
+        text, preprocessor = self.preprocess(
+            ''.join(f'#include "{name}"\n' for name in [*HEADERS, *HEADERS, 'nested.h'])
+        )
+        self.assertEqual(
+            {Path(path).name: count for path, count in preprocessor.include_skips.items()},
+            {'guarded.h': 2, 'defined_guard.h': 1, 'once.h': 2, 'nested.h': 2}
+        )
+        for name in ('guarded', 'defined_guard', 'once', 'nested'):
+            self.assertLessEqual(text.count(f'static-var {name};'), 1)
+        self.assertEqual(text.count('static-var unguarded;'), 2)
+        self.assertEqual(text.count('static-var partly;'), 2)
+
+    def test_undefined_guard_is_included_again(self):
+        text, preprocessor = self.preprocess(
+            '#include "guarded.h"\n#undef GUARDED_H\n#include "guarded.h"\n#include "guarded.h"\n'
+            '#include "once.h"\n#include "once.h"\n'
+        )
+        self.assertEqual(text.count('static-var guarded;'), 2)
+        self.assertEqual(text.count('static-var once;'), 1)
+        self.assertEqual(
+            {Path(path).name: count for path, count in preprocessor.include_skips.items()},
+            {'guarded.h': 1, 'once.h': 1}
+        )
+
+    def test_loader(self):
+        unit_path = self.dir.joinpath('unit.bos')
+        unit_path.write_text('#include "nested.h"\n#include "guarded.h"\npiece base;\n')
+        loader = BosLoader(unit_path, [self.dir], preprocessor_cache=None)
+        loader.load_file()
+        self.assertEqual({Path(path).name: count for path, count in loader.include_skips.items()}, {'guarded.h': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
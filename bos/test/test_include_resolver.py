@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from bos.bos_preprocessor import BosPreprocessor
+from bos.include_resolver import IncludeResolver
+
+UNIT = '#include "header.h"\n#include "other.h"\npiece base;\nx = SIG_AIM + OTHER;\n'
+
+
+class TestIncludeResolver(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        # searched first, never has the headers
+        self.empty_dir = self.dir.joinpath('empty')
+        self.empty_dir.mkdir()
+        self.headers_dir = self.dir.joinpath('headers')
+        self.headers_dir.mkdir()
+        self.header = self.headers_dir.joinpath('header.h')
+        self.header.write_text('#define SIG_AIM 2\n')
+        self.headers_dir.joinpath('other.h').write_text('#define OTHER 3\n')
+        self.unit_path = self.dir.joinpath('unit.bos')
+
+    def preprocess(self, resolver: IncludeResolver):
+        preprocessor = BosPreprocessor(include_resolver=resolver)
+        result = preprocessor.process_file(UNIT, self.unit_path, [self.empty_dir, self.headers_dir])
+        return result, preprocessor
+
+    def test_same_output(self):
+        resolver = IncludeResolver()
+        for _ in range(2):
+            self.assertEqual(self.preprocess(IncludeResolver())[0][0], self.preprocess(resolver)[0][0])
+
+    def test_reuses_lookups_and_contents(self):
+        resolver = IncludeResolver()
+        _, first = self.preprocess(resolver)
+        lookups, lookup_hits, bytes_read = resolver.lookups, resolver.lookup_hits, resolver.bytes_read
+        self.assertEqual(bytes_read, sum(f.stat().st_size for f in self.headers_dir.iterdir()))
+
+        _, second = self.preprocess(resolver)
+        self.assertEqual(resolver.lookups, 2 * lookups)
+        self.assertEqual(resolver.lookup_hits, lookup_hits + lookups)
+        self.assertEqual(resolver.content_hits, 2)
+        self.assertEqual(resolver.bytes_read, bytes_read)
+        self.assertEqual(first.opened_includes, second.opened_includes)
+        self.assertEqual(first.missing_includes, second.missing_includes)
+        self.assertTrue(any(path.startswith(str(self.empty_dir)) for path in second.missing_includes))
+
+    def test_changed_header_is_read_again(self):
+        resolver = IncludeResolver()
+        self.preprocess(resolver)
+        self.header.write_text('#define SIG_AIM 4 // changed\n')
+        stat = self.header.stat()
+        os.utime(self.header, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        (text, *_), _ = self.preprocess(resolver)
+        self.assertIn('x = 4 + 3;', text)
+
+    def test_misses_expire(self):
+        resolver = IncludeResolver(max_lookup_age=0)
+        self.preprocess(resolver)
+        self.empty_dir.joinpath('header.h').write_text('#define SIG_AIM 5\n')
+        (text, *_), _ = self.preprocess(resolver)
+        self.assertIn('x = 5 + 3;', text)
+
+    def test_bounded_contents(self):
+        resolver = IncludeResolver(max_bytes=self.header.stat().st_size)
+        self.preprocess(resolver)
+        self.preprocess(resolver)
+        self.assertEqual(len(resolver._contents), 1)
+        self.assertEqual(resolver.content_hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from bos.bos_loader import BosLoader
+from bos.preprocessor_cache import PreprocessorCache
+from bos.test.test_recursive_descent_parser import all_nodes
+
+HEADER = """
+/* shared
+   header */
+#define SIG_AIM 2 // the aim signal
+// a line comment
+static-var in_header;
+"""
+
+UNIT = """
+#include "header.h"
+piece base, /* inline */ turret;
+/*
+ * a block comment
+ * over several lines
+ */
+Create()
+{
+    // comment
+    turn turret to y-axis <45> speed <90>; /* trailing */
+    signal/**/SIG_AIM;
+    /* one */ /* two
+    */ sleep 100;
+}
+"""
+
+
+class TestLeanMode(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.dir.joinpath('header.h').write_text(HEADER)
+        self.unit_path = self.dir.joinpath('unit.bos')
+        self.unit_path.write_text(UNIT)
+
+    def load(self, **options) -> BosLoader:
+        loader = BosLoader(self.unit_path, [self.dir], preprocessor_cache=None, **options)
+        loader.load_file()
+        return loader
+
+    def test_same_ast_and_locations(self):
+        for options in ({}, {'parallel_parse_workers': 2}, {'use_recursive_descent_parser': True}):
+            with self.subTest(**options):
+                full = self.load(**options)
+                lean = self.load(lean=True, **options)
+                self.assertEqual(full.ast_node_tree, lean.ast_node_tree)
+                self.assertEqual(
+                    [(type(n), n.code_location) for n in all_nodes(full.ast_node_tree)],
+                    [(type(n), n.code_location) for n in all_nodes(lean.ast_node_tree)]
+                )
+
+    def test_skips_bookkeeping(self):
+        lean = self.load(lean=True)
+        self.assertIsNone(lean.reconstructed_file_contents)
+        self.assertIsNone(lean.preproc_chunks)
+        self.assertNotIn('/*', lean.preprocessed_file_contents)
+        self.assertNotIn('//', lean.preprocessed_file_contents)
+        self.assertEqual(
+            lean.preprocessed_file_contents.count('\n'), self.load().preprocessed_file_contents.count('\n')
+        )
+        self.assertFalse(any(channel in lean.skipped_token_channels for channel in lean.token_stream.channels))
+
+    def test_preprocessor_cache_keeps_modes_apart(self):
+        cache = PreprocessorCache()
+        full = BosLoader(self.unit_path, [self.dir], preprocessor_cache=cache)
+        full.load_file()
+        lean = BosLoader(self.unit_path, [self.dir], preprocessor_cache=cache, lean=True)
+        lean.load_file()
+        self.assertEqual(cache.misses, 2)
+        self.assertIsNotNone(full.preproc_chunks)
+        self.assertIsNone(lean.preproc_chunks)
+
+
+if __name__ == '__main__':
+    unittest.main()
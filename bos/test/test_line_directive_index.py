@@ -0,0 +1,101 @@
+import gc
+import random
+import tempfile
+import unittest
+import weakref
+from pathlib import Path
+
+import antlr4
+
+from bos.bos_loader import BosLoader
+from bos.char_stream import StrInputStream
+from bos.gen.BosLexer import BosLexer
+from bos.token_buffer import CompactTokenStream
+from code_location import CodeLocation, LineDirectiveIndex
+
+FUZZ_ALPHABET = [
+    'piece a;', 'x = 1;', '\n', '\n', '  ', '/* c\n */', '// c\n',
+    '\n#line 10 "units/a.bos"\n', '\n#line 3 "headers/b.h"\n', '\n#line 7\n', '\n#line x "c.h"\n', '\n#define A 1\n',
+]
+
+
+def lexer(text: str):
+    bos_lexer = BosLexer(StrInputStream(text))
+    bos_lexer.removeErrorListeners()
+    return bos_lexer
+
+
+def scanned_location(token, token_stream) -> CodeLocation | None:
+    """What locating a token by scanning back for the previous #line directive gives"""
+    line_offset = 0
+    source_file = 'source file unspecified'
+    directive_index = token_stream.previousTokenOnChannel(token.tokenIndex, BosLexer.LINE_MACRO)
+    if directive_index != -1:
+        try:
+            line_str, source_file = token_stream.tokens[directive_index].text.split()[1:3]
+            line_offset = int(line_str) - token_stream.tokens[directive_index].line - 1
+        except ValueError:
+            return None
+    line = token.line + line_offset
+    return CodeLocation(line, token.column + 1, line, token.column + 1 + len(token.text), source_file)
+
+
+class TestLineDirectiveIndex(unittest.TestCase):
+
+    def test_matches_scanning(self):
+        rng = random.Random(97531)
+        for i in range(200):
+            text = ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(1, 20)))
+            for stream_class in (antlr4.CommonTokenStream, CompactTokenStream):
+                with self.subTest(i, text=text, stream=stream_class.__name__):
+                    token_stream = stream_class(lexer(text))
+                    token_stream.fill()
+                    for token in token_stream.tokens:
+                        self.assertEqual(
+                            scanned_location(token, token_stream), CodeLocation.from_token(token, token_stream)
+                        )
+
+    def test_extends_as_the_stream_grows(self):
+        text = 'piece a;\n#line 10 "a.bos"\npiece b;\n#line 20 "b.bos"\npiece c;\n'
+        token_stream = CompactTokenStream(lexer(text))
+        locations = []
+        while token_stream.LA(1) != antlr4.Token.EOF:
+            token = token_stream.LT(1)
+            if token.type == BosLexer.ID:
+                locations.append(CodeLocation.from_token(token, token_stream))
+            token_stream.consume()
+        self.assertEqual(
+            [(location.source_file, location.start_line) for location in locations],
+            [('source file unspecified', 1), ('"a.bos"', 10), ('"b.bos"', 20)]
+        )
+        self.assertIs(LineDirectiveIndex.for_stream(token_stream), LineDirectiveIndex.for_stream(token_stream))
+        self.assertEqual(len(LineDirectiveIndex.for_stream(token_stream).token_indexes), 2)
+
+    def test_does_not_keep_the_stream_alive(self):
+        token_stream = CompactTokenStream(lexer('piece a;\n#line 10 "a.bos"\npiece b;\n'))
+        token_stream.fill()
+        index = weakref.ref(LineDirectiveIndex.for_stream(token_stream))
+        CodeLocation.from_token(token_stream.tokens[-1], token_stream)
+        stream = weakref.ref(token_stream)
+        del token_stream
+        gc.collect()
+        self.assertIsNone(stream())
+        self.assertIsNone(index())
+
+    def test_detached_loads_free_their_streams(self):
+        def alive():
+            return sum(isinstance(obj, (CompactTokenStream, LineDirectiveIndex)) for obj in gc.get_objects())
+
+        gc.collect()
+        before = alive()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            bos_file = Path(temp_dir, 'unit.bos')
+            bos_file.write_text('piece base;\nCreate()\n{\n    sleep 100;\n}\n')
+            for _ in range(3):
+                BosLoader(bos_file, [temp_dir], detach_parse_tree=True, preprocessor_cache=None).load_file()
+        gc.collect()
+        self.assertEqual(alive(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import antlr4
+
+from bos.bos_loader import BosLoader
+from bos.char_stream import StrInputStream
+from bos.gen.BosLexer import BosLexer
+from bos.gen.BosParser import BosParser
+
+# SLL can't tell the two alternatives of getCall apart in Aim, only that declaration is parsed again with LL
+UNIT = """
+piece base, turret;
+static-var is_aiming;
+Create()
+{
+    is_aiming = 0;
+}
+Aim(heading)
+{
+    is_aiming = get 7(heading, 2);
+    turn turret to y-axis heading speed <90>;
+}
+Killed(severity)
+{
+    return 1;
+}
+"""
+
+BROKEN_UNIT = UNIT.replace('return 1;', 'return 1 +;')
+
+
+def ll_parse(text: str) -> tuple[BosParser, BosParser.FileContext]:
+    """A plain ``BosParser.file_()`` parse with the default LL strategy"""
+    bos_parser = BosParser(antlr4.CommonTokenStream(BosLexer(StrInputStream(text))))
+    bos_parser.removeErrorListeners()
+    return bos_parser, bos_parser.file_()
+
+
+class TestLLFallback(unittest.TestCase):
+
+    def load(self, text: str) -> BosLoader:
+        loader = BosLoader('unit.bos', file_contents=text, preprocessor_cache=None)
+        loader.load_file()
+        return loader
+
+    def test_only_the_failing_declaration_is_parsed_again(self):
+        loader = self.load(UNIT)
+        self.assertEqual(loader.ll_fallback_count, 1)
+
+        tree = loader.parser_node_tree
+        self.assertEqual(len(tree.declaration()), 5)
+        ll_parser, ll_tree = ll_parse(loader.preprocessed_file_contents)
+        self.assertEqual(tree.toStringTree(recog=loader.bos_parser), ll_tree.toStringTree(recog=ll_parser))
+        self.assertEqual(
+            [declaration.getText() for declaration in tree.declaration()],
+            [declaration.getText() for declaration in ll_tree.declaration()]
+        )
+
+    def test_syntax_errors_reported_once(self):
+        loader = BosLoader('unit.bos', file_contents=BROKEN_UNIT, preprocessor_cache=None)
+        with self.assertRaises(ValueError):
+            loader.load_file()
+        self.assertEqual(len(loader.parse_errors), 1)
+        self.assertEqual(loader.bos_parser.getNumberOfSyntaxErrors(), 1)
+
+        ll_parser, _ = ll_parse(loader.preprocessed_file_contents)
+        self.assertEqual(ll_parser.getNumberOfSyntaxErrors(), 1)
+        self.assertEqual(loader.parse_errors[0].error_loc.start_line, BROKEN_UNIT.splitlines().index('    return 1 +;') + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from antlr4 import Token
+
+from bos.bos_loader import BosLoader
+from bos.bos_preprocessor import BosPreprocessor
+from bos.test.test_directive_free import SAMPLES as DIRECTIVE_FREE_SAMPLES
+from bos.token_buffer import tokens_on_channel
+
+UNIT = """#include "header.h"
+#define SPEED 100
+#define TWICE(x) ((x) * 2)
+piece base;
+Create()
+{
+\tturn base to y-axis <SPEED> speed TWICE(SPEED);
+\tsleep TRUE;
+}
+"""
+
+HEADER = '#define SIG_AIM 2\nstatic-var in_header;\n'
+
+
+class TestOffsetIndex(unittest.TestCase):
+
+    def assertConsistent(self, chunks: list[BosPreprocessor.Chunk]):
+        index = BosPreprocessor.OffsetIndex.from_chunks(chunks)
+        preprocessed = ''.join(chunk.text for chunk in chunks)
+        original = ''.join(chunk.original_text for chunk in chunks)
+        preprocessed_start = original_start = 0
+        for chunk in chunks:
+            preprocessed_end = preprocessed_start + len(chunk.text)
+            original_end = original_start + len(chunk.original_text)
+            if chunk.text:
+                self.assertEqual(index.to_original(preprocessed_start, preprocessed_end), (original_start, original_end))
+            if chunk.original_text:
+                self.assertEqual(
+                    index.to_preprocessed(original_start, original_end), (preprocessed_start, preprocessed_end)
+                )
+            if chunk.text == chunk.original_text:
+                for offset in range(preprocessed_start, preprocessed_end):
+                    mapped_start, mapped_end = index.to_original(offset, offset + 1)
+                    self.assertEqual(original[mapped_start:mapped_end], preprocessed[offset])
+            preprocessed_start, original_start = preprocessed_end, original_end
+
+        rng = random.Random(len(preprocessed))
+        for _ in range(50):
+            start = rng.randint(0, len(preprocessed))
+            end = rng.randint(start, len(preprocessed))
+            mapped_start, mapped_end = index.to_original(start, end)
+            self.assertLessEqual(0, mapped_start)
+            self.assertLessEqual(mapped_start, mapped_end)
+            self.assertLessEqual(mapped_end, len(original))
+
+    def test_samples(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            Path(temp_dir).joinpath('header.h').write_text(HEADER)
+            for i, text in enumerate([UNIT, *DIRECTIVE_FREE_SAMPLES]):
+                with self.subTest(i, text=text):
+                    self.assertConsistent(BosPreprocessor().process_file(text, Path(temp_dir, 'unit.bos'))[2])
+
+    def test_loader(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            Path(temp_dir).joinpath('header.h').write_text(HEADER)
+            unit_path = Path(temp_dir, 'unit.bos')
+            unit_path.write_text(UNIT)
+            loader = BosLoader(unit_path, preprocessor_cache=None, detach_parse_tree=False)
+            loader.load_file()
+
+            tokens = tokens_on_channel(loader.token_stream, Token.DEFAULT_CHANNEL)[:-1]
+            locations = {}
+            for token in tokens:
+                location = loader.pre_expansion_location(token)
+                original_text = loader.reconstructed_file_contents.splitlines()[location.start_line - 1][
+                    location.start_column - 1:location.end_column - 1
+                ]
+                locations.setdefault(token.text, []).append((location.start_line, original_text))
+
+            self.assertEqual(locations['piece'], [(4, 'piece')])
+            self.assertEqual(locations['static-var'], [(1, '#include "header.h"')])
+            self.assertEqual(locations['<100>'], [(7, '<SPEED>')])
+            # the reconstructed text only has the name of a function-like macro
+            self.assertEqual(locations['100'], [(7, 'TWICE')])
+            self.assertEqual(locations['sleep'], [(8, 'sleep')])
+            self.assertEqual(locations['1'], [(8, 'TRUE')])
+
+            lean = BosLoader(unit_path, preprocessor_cache=None, lean=True)
+            lean.load_file()
+            self.assertIsNone(lean.pre_expansion_location(tokens[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from antlr4 import Token
+
+from bos.bos_loader import BosLoader
+from bos.char_stream import StrInputStream
+from bos.gen.BosLexer import BosLexer
+from bos.parallel_parse import _make_chunk, group_declarations, split_declarations
+from bos.test.test_recursive_descent_parser import all_nodes
+from bos.token_buffer import CompactTokenStream, tokens_on_channel
+
+DECLARATIONS = [
+    'piece base, turret;',
+    'static-var x, y;',
+    'Create()\n{\n    if (x) { if (y) { x = 1; } }\n    while (x) { }\n}',
+    'Empty() return;',
+    'Single(a) x = a;',
+    'Aim(heading)\n{\n    call-script Create(); start-script Empty();\n    turn turret to y-axis heading now;\n}',
+    'static-var z;',
+]
+
+HEADER = '#define SIG_AIM 2\npiece flare;\nHeaderFunc()\n{\n    signal SIG_AIM;\n}\n'
+
+UNIT = """#include "header.h"
+piece base, turret;
+static-var x;
+
+Create()
+{
+    if (x) { x = SIG_AIM; }
+}
+
+Aim(heading)
+{
+    signal SIG_AIM;
+    turn turret to y-axis heading speed <90>;
+}
+
+   Killed(severity) return 1;
+static-var y;
+"""
+
+
+def token_stream_of(text: str) -> CompactTokenStream:
+    token_stream = CompactTokenStream(BosLexer(StrInputStream(text)))
+    token_stream.fill()
+    return token_stream
+
+
+def default_tokens(token_stream: CompactTokenStream) -> list[Token]:
+    return [t for t in tokens_on_channel(token_stream, Token.DEFAULT_CHANNEL) if t.type != Token.EOF]
+
+
+class TestParallelParse(unittest.TestCase):
+
+    def test_split_declarations(self):
+        text = '\n'.join(DECLARATIONS)
+        token_stream = token_stream_of(text)
+        ranges = split_declarations(token_stream)
+        tokens = token_stream.tokens
+        self.assertEqual(
+            [text[tokens[first].start:tokens[last].stop + 1] for first, last in ranges],
+            DECLARATIONS
+        )
+
+    def test_unbalanced_braces_stay_in_the_last_range(self):
+        text = 'piece a;\nF()\n{\n    x = 1;\npiece b;\nG() { }'
+        token_stream = token_stream_of(text)
+        tokens = token_stream.tokens
+        self.assertEqual(
+            [text[tokens[first].start:tokens[last].stop + 1] for first, last in split_declarations(token_stream)],
+            ['piece a;', text[len('piece a;\n'):]]
+        )
+
+    def test_chunk_carries_line_directive(self):
+        text = 'piece a;\n#line 40 "headers/header.h"\n\n  static-var x;\n    F()\n{\n}\n'
+        token_stream = token_stream_of(text)
+        first, last = split_declarations(token_stream)[1]
+        chunk = _make_chunk(token_stream, first, last)
+
+        self.assertEqual(chunk.text.splitlines()[1], '#line 40 "headers/header.h"')
+        self.assertTrue(chunk.text.endswith('static-var x;'))
+        chunk_tokens = default_tokens(token_stream_of(chunk.text))
+        original_tokens = default_tokens(token_stream)[3:]
+        self.assertEqual(
+            [(t.line, t.column, t.text) for t in chunk_tokens],
+            [(t.line, t.column, t.text) for t in original_tokens[:len(chunk_tokens)]]
+        )
+
+    def test_group_declarations(self):
+        token_stream = token_stream_of('\n'.join(DECLARATIONS))
+        ranges = split_declarations(token_stream)
+        chunks = group_declarations(token_stream, ranges, 3)
+        self.assertLessEqual(len(chunks), 3)
+        self.assertEqual(chunks[0].first_token_index, ranges[0][0])
+        self.assertEqual(chunks[-1].last_token_index, ranges[-1][1])
+        # split between whole declarations
+        declaration_starts = [first for first, _ in ranges]
+        declaration_ends = [last for _, last in ranges]
+        for chunk, next_chunk in zip(chunks, chunks[1:]):
+            self.assertIn(chunk.last_token_index, declaration_ends)
+            self.assertIn(next_chunk.first_token_index, declaration_starts)
+
+    def test_same_code_locations_as_serial_parse(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            Path(temp_dir, 'header.h').write_text(HEADER)
+            unit_path = Path(temp_dir, 'unit.bos')
+            unit_path.write_text(UNIT)
+
+            serial = BosLoader(unit_path, [temp_dir], preprocessor_cache=None)
+            serial.load_file()
+            parallel = BosLoader(unit_path, [temp_dir], preprocessor_cache=None, parallel_parse_workers=2)
+            parallel.load_file()
+
+        self.assertIsNone(parallel.parser_node_tree)
+        self.assertEqual(parallel.ast_node_tree, serial.ast_node_tree)
+        self.assertEqual(
+            [node.code_location for node in all_nodes(parallel.ast_node_tree)],
+            [node.code_location for node in all_nodes(serial.ast_node_tree)]
+        )
+        self.assertIn('header.h', str(parallel.ast_node_tree.declarations[1].code_location.source_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
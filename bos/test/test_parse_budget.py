@@ -0,0 +1,106 @@
+import pickle
+import threading
+import unittest
+
+from bos.bos_loader import BosLoader
+from bos.parse_budget import ParseBudgetReport, ParseCancelledError, ParseTimeoutError
+from bos.test.test_recursive_descent_parser import SAMPLES
+
+TEXT = '\n'.join(SAMPLES[:3]) + '\n' + '\n'.join(f'F{i}() {{ x = (1 + 2) * get 3(4, 5); }}' for i in range(50))
+
+
+class TestParseBudget(unittest.TestCase):
+
+    def load(self, **options) -> BosLoader:
+        loader = BosLoader('unit.bos', file_contents=TEXT, preprocessor_cache=None, **options)
+        loader.load_file()
+        return loader
+
+    def test_within_budget(self):
+        report = ParseBudgetReport()
+        loader = self.load(parse_time_budget=600, parse_step_budget=10 ** 9, parse_budget_report=report)
+        self.assertEqual(loader.ast_node_tree, self.load().ast_node_tree)
+        self.assertEqual(len(report), 0)
+
+    def test_step_budget(self):
+        report = ParseBudgetReport()
+        with self.assertRaises(ParseTimeoutError) as caught:
+            self.load(parse_step_budget=100, parse_budget_report=report)
+        error = caught.exception
+        self.assertEqual(error.steps, 101)
+        self.assertEqual(error.error_loc.source_file, '"unit.bos"')
+        self.assertEqual(error.rule_stack[0], 'file')
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report.entries[0].file_path, 'unit.bos')
+        self.assertEqual(sum(report.rule_counts().values()), 1)
+        self.assertIn('unit.bos', str(report))
+
+        unpickled = pickle.loads(pickle.dumps(error))
+        self.assertEqual(
+            (unpickled.message, unpickled.error_loc, unpickled.steps, unpickled.rule_stack),
+            (error.message, error.error_loc, error.steps, error.rule_stack)
+        )
+
+    def test_report_keeps_the_latest_entries(self):
+        report = ParseBudgetReport(max_entries=3)
+        for i in range(5):
+            report.record(f'unit{i}.bos', ParseTimeoutError('Parsing took too long', None, rule_stack=('file',)))
+        self.assertEqual([entry.file_path for entry in report.entries], ['unit2.bos', 'unit3.bos', 'unit4.bos'])
+        self.assertEqual(report.dropped, 2)
+        self.assertTrue(str(report).startswith('5 files over the parse budget'))
+        self.assertEqual(report.rule_counts()['file'], 3)
+
+    def test_time_budget(self):
+        with self.assertRaises(ParseTimeoutError) as caught:
+            self.load(parse_time_budget=0, parse_budget_report=None)
+        self.assertIn('0 seconds', caught.exception.message)
+
+    def test_parallel_parse(self):
+        report = ParseBudgetReport()
+        with self.assertRaises(ParseTimeoutError):
+            self.load(parallel_parse_workers=2, parse_step_budget=10, parse_budget_report=report)
+        self.assertEqual(len(report), 1)
+
+    def test_cancel(self):
+        report = ParseBudgetReport()
+        cancel_event = threading.Event()
+        loader = self.load(parse_cancel_event=cancel_event, parse_budget_report=report)
+        self.assertEqual(loader.ast_node_tree, self.load().ast_node_tree)
+
+        cancel_event.set()
+        loader = BosLoader(
+            'unit.bos', file_contents=TEXT, preprocessor_cache=None, parse_budget_report=report,
+            parse_cancel_event=cancel_event
+        )
+        with self.assertRaises(ParseCancelledError) as caught:
+            loader.load_file()
+        self.assertIn('cancelled', caught.exception.message)
+        self.assertEqual(loader.parse_errors, [caught.exception])
+        # not over budget, nothing to report
+        self.assertEqual(len(report), 0)
+
+    def test_cancel_from_another_thread(self):
+        cancel_event = threading.Event()
+        # parsed serially in this process even with workers, they couldn't see the event
+        loader = BosLoader(
+            'unit.bos', file_contents=TEXT * 20, preprocessor_cache=None, parse_cancel_event=cancel_event,
+            parallel_parse_workers=2
+        )
+        errors = []
+
+        def load_file():
+            try:
+                loader.load_file()
+            except ParseCancelledError as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=load_file)
+        thread.start()
+        cancel_event.set()
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(loader.ast_node_tree)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from bos import parse_cache
+from bos.bos_loader import BosLoader
+from bos.parse_cache import ParseCache
+
+UNIT = """
+piece base, turret;
+static-var count;
+Create()
+{
+    count = 2 + 3;
+    turn turret to y-axis <45> speed <90>;
+}
+"""
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        self.unit_path = self.dir.joinpath('unit.bos')
+        self.unit_path.write_text(UNIT)
+        self.cache = ParseCache(self.dir.joinpath('cache'))
+
+    def load(self, file_contents=UNIT, **kwargs) -> BosLoader:
+        loader = BosLoader(
+            self.unit_path, [self.dir], file_contents=file_contents, preprocessor_cache=None,
+            parse_cache=self.cache, **kwargs
+        )
+        loader.load_file()
+        return loader
+
+    def entries(self) -> list[Path]:
+        return sorted(self.cache.cache_dir.glob('*' + ParseCache.FILE_SUFFIX))
+
+    def test_hit_and_miss(self):
+        parsed = self.load()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        self.assertIsNotNone(parsed.parser_node_tree)
+
+        cached = self.load()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertIsNone(cached.parser_node_tree)
+        self.assertEqual(cached.ast_node_tree, parsed.ast_node_tree)
+        self.assertEqual(cached.ast_node_tree.code_location, parsed.ast_node_tree.code_location)
+
+        self.load(UNIT.replace('<45>', '<46>'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_evicts_least_recently_used(self):
+        units = [UNIT.replace('<45>', f'<{angle}>') for angle in range(3)]
+        entries = []
+        for age, unit in enumerate(units):
+            self.load(unit)
+            entry, = set(self.entries()) - set(entries)
+            # stored a while ago, in order
+            os.utime(entry, (1_000_000 + age, 1_000_000 + age))
+            entries.append(entry)
+
+        # using the oldest entry makes the second one the least recently used
+        self.load(units[0])
+        self.assertEqual(self.cache.hits, 1)
+
+        self.load(UNIT)
+        self.assertEqual(self.cache.evictions, 0)
+        new_entry, = set(self.entries()) - set(entries)
+        # compressed sizes vary from run to run, leave room for exactly the two most recently used entries
+        self.cache.max_size_bytes = entries[0].stat().st_size + new_entry.stat().st_size
+        self.cache._evict_if_needed()
+        self.assertEqual(self.cache.evictions, 2)
+        self.assertTrue(new_entry.exists())
+        self.assertFalse(entries[1].exists())
+        self.assertFalse(entries[2].exists())
+        self.assertTrue(entries[0].exists())
+
+    def test_discards_corrupt_entry(self):
+        self.load()
+        entry, = self.entries()
+        entry.write_bytes(b'not a zlib stream')
+        with self.assertLogs(parse_cache.log, 'WARNING'):
+            loader = self.load()
+        self.assertIsNotNone(loader.parser_node_tree)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        # stored again after parsing
+        self.assertNotEqual(self.entries()[0].read_bytes(), b'not a zlib stream')
+
+    def test_key_covers_grammar_and_constant_folding(self):
+        text = self.load().preprocessed_file_contents
+        key = self.cache.key_for(text, enable_constant_folding=False)
+        self.assertNotEqual(key, self.cache.key_for(text, enable_constant_folding=True))
+        with mock.patch.object(parse_cache, 'grammar_version', return_value='regenerated'):
+            self.assertNotEqual(key, self.cache.key_for(text, enable_constant_folding=False))
+
+        folded = self.load(enable_constant_folding=True)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertNotEqual(folded.ast_node_tree, self.load().ast_node_tree)
+
+
+if __name__ == '__main__':
+    unittest.main()
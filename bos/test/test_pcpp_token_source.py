@@ -0,0 +1,111 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from antlr4 import Token
+
+from bos.bos_loader import BosLoader
+from bos.bos_preprocessor import BosPreprocessor
+from bos.char_stream import StrInputStream
+from bos.gen.BosLexer import BosLexer
+from bos.pcpp_token_source import PcppTokenSource
+from bos.test.test_fast_lexer import FUZZ_ALPHABET, SAMPLES as LEXER_SAMPLES
+from bos.test.test_recursive_descent_parser import ERROR_SAMPLES, SAMPLES as PARSER_SAMPLES, all_nodes
+from bos.token_buffer import CompactTokenStream
+from code_location import CodeLocation
+
+SAMPLES = [
+    '#define A static-var\nA x, y;\n#define B(x) <x>\nF() { turn a to y-axis B(-5) now; }',
+    '#define ONE 1\nx = 0ONE; x = ONE.5; x = [ONE.];',
+    'F()\n{\n#line 20 "other.bos"\n\tsleep 1;\n}\n',
+    '#pragma once\n#foo /* a\nb */ x\n#ifdef A\nq\n#endif\n',
+    "x = 'c'; y = 1;",
+    'x = 1 + \\\n2;\ny = 10u;',
+    'a ^^ b << c += d $ é',
+    'x = "a\\"b" "s";',
+    'x = __LINE__ + __COUNTER__; y = __FILE__;',
+]
+
+FUZZ_ALPHABET = [
+    *FUZZ_ALPHABET,
+    '#define A static-var\n', '#define B(x) <x>\n', 'A', 'B(-5)', 'TRUE', '\n#line 7 "o.bos"\n', '#pragma once\n',
+    '#foo /* a\nb */ x\n', "'c'", '"s"', '"a\\"b"', '\\\n', 'x-axis', '[1.5]', '^^', '<<', '+=', '10u', '1.', '.5',
+    '$', 'é', '/* c */', '// c\n', '#ifdef A\nq\n#endif\n',
+]
+
+HEADER = '#define SIG_AIM 2\nstatic-var in_header;\n'
+
+UNIT = '#include "header.h"\npiece base;\n// comment\nCreate()\n{\n\tsignal SIG_AIM;\n\tsleep 1;\n}\n'
+
+
+def default_channel_tokens(token_stream: CompactTokenStream):
+    token_stream.fill()
+    return [
+        (token.type, token.text, CodeLocation.from_token(token, token_stream))
+        for token in map(token_stream.token_at, token_stream.indexes_on_channel(Token.DEFAULT_CHANNEL))
+    ]
+
+
+class TestPcppTokenSource(unittest.TestCase):
+
+    def assertSameTokens(self, text: str, file_path='units/unit.bos', include_paths=None):
+        preprocessed = BosPreprocessor().process_file(text, file_path, include_paths)[0]
+        lexer = BosLexer(StrInputStream(preprocessed))
+        lexer.removeErrorListeners()
+        token_source = PcppTokenSource(
+            BosPreprocessor().process_file_tokens(text, file_path, include_paths), file_path, lambda *args: None
+        )
+        expected = default_channel_tokens(CompactTokenStream(lexer))
+        actual = default_channel_tokens(CompactTokenStream(token_source))
+        # past a malformed #line, CodeLocation.from_token gives up while the token source keeps the last file it knew
+        self.assertEqual(
+            expected,
+            [
+                (token_type, text, location if expected_token[2] is not None else None)
+                for expected_token, (token_type, text, location) in zip(expected, actual)
+            ] + actual[len(expected):]
+        )
+
+    def test_samples(self):
+        for i, text in enumerate([*SAMPLES, *LEXER_SAMPLES, *PARSER_SAMPLES, *ERROR_SAMPLES]):
+            with self.subTest(i, text=text):
+                self.assertSameTokens(text)
+
+    def test_fuzz(self):
+        rng = random.Random(1357)
+        for i in range(500):
+            text = ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(1, 30)))
+            with self.subTest(i, text=text):
+                self.assertSameTokens(text)
+
+    def test_loader(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            temp_dir.joinpath('header.h').write_text(HEADER)
+            unit_path = temp_dir.joinpath('unit.bos')
+            unit_path.write_text(UNIT)
+            self.assertSameTokens(UNIT, unit_path, [temp_dir])
+
+            for options in ({}, {'lean': True}, {'use_recursive_descent_parser': True}):
+                with self.subTest(**options):
+                    loaders = [
+                        BosLoader(unit_path, [temp_dir], preprocessor_cache=None, **options),
+                        BosLoader(
+                            unit_path, [temp_dir], preprocessor_cache=None, stream_preprocessor_tokens=True, **options
+                        ),
+                    ]
+                    for loader in loaders:
+                        loader.load_file()
+                    text_loader, stream_loader = loaders
+                    self.assertIsNone(stream_loader.preprocessed_file_contents)
+                    self.assertEqual(text_loader.ast_node_tree, stream_loader.ast_node_tree)
+                    # past the root, which ends in a different file than it starts in
+                    self.assertEqual(
+                        [n.code_location for n in all_nodes(text_loader.ast_node_tree)[1:]],
+                        [n.code_location for n in all_nodes(stream_loader.ast_node_tree)[1:]]
+                    )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from bos import preprocessor_cache
+from bos.bos_loader import BosLoader
+from bos.bos_preprocessor import BosPreprocessor
+from bos.include_resolver import IncludeResolver
+
+HEADERS = {
+    'a.h': '#ifndef A_H\n#define A_H\n#define SIG_AIM 2\n#define TWICE(x) ((x) * 2)\nstatic-var in_a;\n#endif\n',
+    'b.h': '#pragma once\n#ifdef SIG_AIM\n#define AIM_MASK TWICE(SIG_AIM)\n#else\n#define AIM_MASK 0\n#endif\n',
+}
+
+UNIT = '#include "a.h"\n#include "b.h"\npiece base;\nCreate()\n{\n    x = AIM_MASK + SIG_AIM;\n}\n'
+
+
+class TestPrecompiledHeader(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        for name, text in HEADERS.items():
+            self.dir.joinpath(name).write_text(text)
+        self.unit_path = self.dir.joinpath('unit.bos')
+        self.precompiled_header = BosPreprocessor.precompile_headers(
+            [self.dir.joinpath(name) for name in HEADERS], [self.dir]
+        )
+
+    def preprocess(self, unit: str, precompiled_header=None):
+        """The process_file result, and how many bytes of headers were read for it"""
+        resolver = IncludeResolver()
+        preprocessor = BosPreprocessor(precompiled_header=precompiled_header, include_resolver=resolver)
+        return preprocessor.process_file(unit, self.unit_path, [self.dir]), resolver.bytes_read
+
+    def test_same_output(self):
+        with_pch, bytes_read = self.preprocess(UNIT, self.precompiled_header)
+        self.assertEqual(bytes_read, 0)
+        self.assertEqual(with_pch[:2], self.preprocess(UNIT)[0][:2])
+        self.assertIn('x = ((2) * 2) + 2;', with_pch[0])
+
+    def test_define_or_undef_before_the_headers(self):
+        for unit in (
+            '#define SIG_AIM 7\n' + UNIT,
+            UNIT.replace('#include "b.h"', '#undef SIG_AIM\n#include "b.h"'),
+        ):
+            with self.subTest(unit=unit):
+                with_pch, bytes_read = self.preprocess(unit, self.precompiled_header)
+                self.assertGreater(bytes_read, 0)
+                self.assertEqual(with_pch[:2], self.preprocess(unit)[0][:2])
+
+    def test_changed_header(self):
+        self.assertTrue(self.precompiled_header.is_valid())
+        header = self.dir.joinpath('a.h')
+        header.write_text(HEADERS['a.h'].replace('SIG_AIM 2', 'SIG_AIM 3'))
+        stat = header.stat()
+        os.utime(header, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertFalse(self.precompiled_header.is_valid())
+
+        loader = BosLoader(
+            self.unit_path, [self.dir], file_contents=UNIT, preprocessor_cache=None,
+            precompiled_header=self.precompiled_header
+        )
+        with self.assertLogs(loader.log, 'WARNING'):
+            loader.load_file()
+        self.assertIn('x = ((3) * 2) + 3;', loader.preprocessed_file_contents)
+
+    def test_validating_does_not_hash_unchanged_headers(self):
+        # only headers modified a while ago are trusted by their stat alone
+        for name in HEADERS:
+            os.utime(self.dir.joinpath(name), (1_000_000, 1_000_000))
+        self.assertTrue(self.precompiled_header.is_valid())
+        with mock.patch.object(preprocessor_cache, 'content_digest') as digest:
+            for _ in range(3):
+                self.assertTrue(self.precompiled_header.is_valid())
+        digest.assert_not_called()
+
+    def test_save_and_load(self):
+        pch_path = self.dir.joinpath('headers.pch')
+        self.precompiled_header.save(pch_path)
+        loaded = BosPreprocessor.PrecompiledHeader.load(pch_path)
+        self.assertTrue(loaded.is_valid())
+        self.assertTrue(loaded.matches([self.dir]))
+        self.assertEqual(
+            [step.header_path for step in loaded.steps], [step.header_path for step in self.precompiled_header.steps]
+        )
+
+        with_loaded, bytes_read = self.preprocess(UNIT, loaded)
+        self.assertEqual(bytes_read, 0)
+        self.assertEqual(with_loaded[:2], self.preprocess(UNIT, self.precompiled_header)[0][:2])
+
+
+if __name__ == '__main__':
+    unittest.main()
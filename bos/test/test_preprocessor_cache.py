@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from bos import preprocessor_cache
+from bos.bos_preprocessor import BosPreprocessor
+from bos.include_resolver import IncludeResolver
+from bos.preprocessor_cache import PreprocessorCache
+
+UNIT = '#include "header.h"\npiece base;\nx = SIG_AIM;\n'
+
+
+class TestPreprocessorCache(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        # searched first, doesn't have the header to begin with
+        self.first_dir = self.dir.joinpath('first')
+        self.first_dir.mkdir()
+        self.headers_dir = self.dir.joinpath('headers')
+        self.headers_dir.mkdir()
+        self.header = self.headers_dir.joinpath('header.h')
+        self.header.write_text('#define SIG_AIM 2\n')
+        self.unit_path = self.dir.joinpath('unit.bos')
+        self.include_paths = [self.first_dir, self.headers_dir]
+
+    def load(self, cache: PreprocessorCache, include_paths=None):
+        """The cached result, or the preprocessed one after storing it"""
+        include_paths = self.include_paths if include_paths is None else include_paths
+        result = cache.lookup(UNIT, self.unit_path, include_paths)
+        if result is None:
+            # a resolver of its own, the shared one remembers lookups for a few seconds
+            preprocessor = BosPreprocessor(include_resolver=IncludeResolver())
+            result = preprocessor.process_file(UNIT, self.unit_path, include_paths)
+            cache.store(
+                UNIT, self.unit_path, include_paths, result,
+                preprocessor.opened_includes, preprocessor.missing_includes
+            )
+        return result
+
+    def change(self, path: Path, text: str):
+        path.write_text(text)
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def backdate(self, path: Path, seconds=60):
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1_000_000_000))
+
+    def test_hit(self):
+        cache = PreprocessorCache()
+        first = self.load(cache)
+        self.assertEqual(self.load(cache), first)
+        self.assertEqual((cache.hits, cache.misses, cache.invalidations), (1, 1, 0))
+
+    def test_hits_get_chunk_lists_of_their_own(self):
+        cache = PreprocessorCache()
+        stored = self.load(cache)
+        chunk_count = len(stored[2])
+        stored[2].clear()
+        first = self.load(cache)
+        self.assertEqual(len(first[2]), chunk_count)
+        first[2].pop()
+        self.assertEqual(len(self.load(cache)[2]), chunk_count)
+
+    def test_changed_header(self):
+        cache = PreprocessorCache()
+        self.load(cache)
+        self.change(self.header, '#define SIG_AIM 4\n')
+        self.assertIn('x = 4;', self.load(cache)[0])
+        self.assertEqual(cache.invalidations, 1)
+
+    def test_touched_header_still_hits(self):
+        cache = PreprocessorCache()
+        self.load(cache)
+        self.change(self.header, self.header.read_text())
+        self.load(cache)
+        self.assertEqual((cache.hits, cache.invalidations), (1, 0))
+
+    def test_new_header_shadowing_the_included_one(self):
+        cache = PreprocessorCache()
+        self.assertIn('x = 2;', self.load(cache)[0])
+        self.first_dir.joinpath('header.h').write_text('#define SIG_AIM 5\n')
+        self.assertIn('x = 5;', self.load(cache)[0])
+        self.assertEqual(cache.invalidations, 1)
+
+    def test_changed_include_paths(self):
+        cache = PreprocessorCache()
+        self.load(cache)
+        self.load(cache, [self.headers_dir])
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(len(cache), 2)
+
+    def test_header_rewritten_without_changing_its_stat(self):
+        cache = PreprocessorCache()
+        stat = self.header.stat()
+        self.assertIn('x = 2;', self.load(cache)[0])
+        # the hit checks, and hashes, the header
+        self.load(cache)
+        # same size and modification time, as a rewrite within one timestamp tick leaves it
+        self.header.write_text('#define SIG_AIM 4\n')
+        os.utime(self.header, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertIn('x = 4;', self.load(cache)[0])
+        self.assertEqual((cache.hits, cache.invalidations), (1, 1))
+
+    def test_headers_are_not_hashed_again_while_unchanged(self):
+        # only files modified a while ago are trusted by their stat alone
+        self.backdate(self.header)
+        cache = PreprocessorCache()
+        self.load(cache)
+        # the first lookup hashes the headers
+        self.load(cache)
+        digest_function = preprocessor_cache.content_digest
+        with mock.patch.object(preprocessor_cache, 'content_digest', wraps=digest_function) as digest:
+            self.load(cache)
+            self.load(cache)
+        # only the unit's own text for its key
+        self.assertEqual(digest.call_count, 2)
+        self.assertEqual(cache.hits, 3)
+
+    def test_bounded_by_size(self):
+        result = self.load(PreprocessorCache())
+        cache = PreprocessorCache(max_bytes=preprocessor_cache._result_size(result) * 2)
+        for include_paths in ([self.headers_dir], [self.first_dir, self.headers_dir], [self.dir, self.headers_dir]):
+            self.load(cache, include_paths)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup(UNIT, self.unit_path, [self.headers_dir]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import random
+import unittest
+from pathlib import Path
+
+from bos.ast_nodes import ASTNode
+from bos.bos_loader import BosLoader
+from code_error import CodeError
+
+EXAMPLE_FILES_DIR = Path(__file__).parent.parent.parent.joinpath('example_files')
+
+SAMPLES = [
+    'piece base, turret;\nstatic-var is_aiming, restore_delay;\n',
+    'Create() { }\nKilled(severity, corpsetype) { return 0; }\nEmpty() return;\n',
+    """
+    piece base, turret, barrel, flare;
+    static-var x, y;
+    Statements(a, b)
+    {
+        var i, j;
+        turn turret to y-axis <45.5> speed <90>;
+        turn turret to x-axis a now;
+        move barrel to z-axis [-2.5] now;
+        move barrel to z-axis [2] speed [1] * a;
+        spin base around y-axis speed <100> accelerate <5>;
+        spin base around y-axis speed <100>;
+        stop-spin base around y-axis decelerate <10>;
+        stop-spin base around y-axis;
+        wait-for-turn turret around y-axis;
+        wait-for-move barrel along z-axis;
+        emit-sfx 1024 + 1 from flare;
+        sleep 100;
+        hide flare; show flare; explode base type 1 | 2;
+        signal 2; set-signal-mask 2;
+        set 5 to get 6;
+        get 7(1, 2, 3, 4);
+        get 8;
+        attach-unit a to b; drop-unit a;
+        cache base; dont-cache base; dont-shadow base; dont-shade base;
+        play-sound("sound", 1);
+        call-script Statements(); call-script Statements(1, get 5(x)); start-script Statements(a, b, 3);
+        x = 1; ++x; --y;
+        ;
+        if (x) y = 1;
+        if (x) { y = 1; } else if (y) { } else return;
+        if (a) if (b) x = 1; else x = 2;
+        while (x < 5) ++x;
+        while (get 1) { sleep 1; }
+        return (a);
+    }
+    """,
+    """
+    static-var x;
+    Expressions(a, b)
+    {
+        x = 1 + 2 * 3 - 4 / 5 % 6;
+        x = (1 + 2) * (3 - (4));
+        x = !a && b || !!0 ^^ a xor b or not a and b;
+        x = a < b == b >= a != (a <= b) > 1;
+        x = a & b | a ^ b & 1;
+        x = -1 - -2.5 * .5 - 3. + 0x1f;
+        x = [1] + <2> + [-3] + <-4.5>;
+        x = get 1 + 2 * get 3(a, b);
+        x = rand(1, 10) * rand(a, b + 1);
+        x = get (1)(2) + (get 2) * 3;
+        x = !(a + 1) * !5 + !(1) * 2 / 4;
+        x = ((((a))));
+    }
+    """,
+]
+
+ERROR_SAMPLES = [
+    'piece a',
+    'piece a, ;',
+    'F() { x = ; }',
+    'F() { turn a to q-axis now; }',
+    'F() { x = 1 + ; }',
+    'F() { x = -a; }',
+    'F() { get 1(1, 2, 3, 4, 5); }',
+    'F() { if x) y = 1; }',
+    'F() { sleep 1 }',
+    'F() { ',
+    'F(a, ) { }',
+]
+
+BINARY_OPERATORS = [
+    '*', '/', '%', '+', '-', '<', '<=', '>', '>=', '==', '!=', '&', '|', '^', '&&', '||', '^^', 'and', 'or', 'xor'
+]
+
+
+def random_expression(rng: random.Random, depth: int) -> str:
+    if depth <= 0 or rng.random() < 0.25:
+        return rng.choice([
+            str(rng.randint(1, 99)), f'-{rng.randint(1, 9)}', f'{rng.randint(1, 9)}.5', f'[{rng.randint(-3, 3)}]',
+            f'<{rng.randint(1, 90)}>', 'a', 'b', 'x', f'0x{rng.randint(1, 255):x}',
+        ])
+
+    match rng.randint(0, 9):
+        case 0:
+            return f'({random_expression(rng, depth - 1)})'
+        case 1:
+            return f'!{random_expression(rng, depth - 1)}'
+        case 2:
+            return f'get {random_expression(rng, depth - 1)}'
+        case 3:
+            args = ', '.join(random_expression(rng, depth - 1) for _ in range(rng.randint(1, 4)))
+            return f'get {random_expression(rng, depth - 1)}({args})'
+        case 4:
+            return f'rand({random_expression(rng, depth - 1)}, {random_expression(rng, depth - 1)})'
+        case _:
+            return (
+                f'{random_expression(rng, depth - 1)} {rng.choice(BINARY_OPERATORS)} '
+                f'{random_expression(rng, depth - 1)}'
+            )
+
+
+def all_nodes(node: ASTNode, result: list[ASTNode] = None) -> list[ASTNode]:
+    result = result if result is not None else []
+    result.append(node)
+    for value in node.__dict__.values():
+        for item in value if isinstance(value, list) else (value,):
+            if isinstance(item, ASTNode):
+                all_nodes(item, result)
+    return result
+
+
+def make_loader(text: str, *, use_recursive_descent_parser: bool, enable_constant_folding=False) -> BosLoader:
+    loader = BosLoader(
+        'test.bos',
+        enable_constant_folding=enable_constant_folding,
+        use_recursive_descent_parser=use_recursive_descent_parser,
+        preprocessor_cache=None
+    )
+    loader.preprocessed_file_contents = text
+    return loader
+
+
+def parse(text: str, *, use_recursive_descent_parser: bool, enable_constant_folding=False) -> BosLoader:
+    loader = make_loader(
+        text, use_recursive_descent_parser=use_recursive_descent_parser, enable_constant_folding=enable_constant_folding
+    )
+    if use_recursive_descent_parser:
+        loader._run_recursive_descent_parser()
+    else:
+        loader._run_parser()
+        loader._run_ast_conversion()
+    return loader
+
+
+class TestRecursiveDescentParser(unittest.TestCase):
+
+    def assertSameAst(self, text: str, enable_constant_folding=False):
+        try:
+            expected = parse(
+                text, use_recursive_descent_parser=False, enable_constant_folding=enable_constant_folding
+            ).ast_node_tree
+        except ZeroDivisionError:
+            with self.assertRaises(ZeroDivisionError):
+                parse(text, use_recursive_descent_parser=True, enable_constant_folding=enable_constant_folding)
+            return
+
+        actual = parse(
+            text, use_recursive_descent_parser=True, enable_constant_folding=enable_constant_folding
+        ).ast_node_tree
+        self.assertEqual(expected, actual)
+        self.assertEqual(expected.model_dump(), actual.model_dump())
+        self.assertEqual(
+            [(type(n), n.code_location) for n in all_nodes(expected)],
+            [(type(n), n.code_location) for n in all_nodes(actual)]
+        )
+
+    def test_samples(self):
+        for i, text in enumerate(SAMPLES):
+            for enable_constant_folding in (False, True):
+                with self.subTest(i, enable_constant_folding=enable_constant_folding):
+                    self.assertSameAst(text, enable_constant_folding)
+
+    def test_random_expressions(self):
+        rng = random.Random(4321)
+        for i in range(500):
+            text = f'static-var x;\nF(a, b)\n{{\n\tx = {random_expression(rng, 4)};\n}}\n'
+            enable_constant_folding = i % 2 == 1
+            with self.subTest(i, text=text, enable_constant_folding=enable_constant_folding):
+                self.assertSameAst(text, enable_constant_folding)
+
+    def test_syntax_errors(self):
+        for text in ERROR_SAMPLES:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse(text, use_recursive_descent_parser=False)
+                loader = make_loader(text, use_recursive_descent_parser=True)
+                with self.assertRaises(ValueError):
+                    loader._run_recursive_descent_parser()
+                self.assertIsInstance(loader.parse_errors[0], CodeError)
+
+    @unittest.skipUnless(EXAMPLE_FILES_DIR.is_dir(), 'example_files not present')
+    def test_example_files(self):
+        for path in sorted(EXAMPLE_FILES_DIR.rglob('*.bos')):
+            if 'preprocessed' in path.name:
+                continue
+            with self.subTest(path=str(path)):
+                reference = BosLoader(path, [EXAMPLE_FILES_DIR], preprocessor_cache=None)
+                try:
+                    expected = reference.load_file()
+                except Exception:
+                    continue
+                loader = BosLoader(path, [EXAMPLE_FILES_DIR], use_recursive_descent_parser=True)
+                self.assertEqual(expected, loader.load_file())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import random
+import unittest
+
+import antlr4
+from antlr4 import Token
+
+from bos.bos_loader import BosLoader
+from bos.char_stream import StrInputStream
+from bos.fast_lexer import FastBosLexer
+from bos.gen.BosLexer import BosLexer
+from bos.test.test_fast_lexer import FUZZ_ALPHABET, SAMPLES, token_tuples
+from bos.test.test_recursive_descent_parser import ERROR_SAMPLES, SAMPLES as PARSER_SAMPLES
+from bos.token_buffer import CompactTokenStream, tokens_on_channel
+from code_location import CodeLocation
+
+
+def filled(token_stream):
+    token_stream.fill()
+    return token_stream
+
+
+def lexer(text: str):
+    bos_lexer = BosLexer(StrInputStream(text))
+    bos_lexer.removeErrorListeners()
+    return bos_lexer
+
+
+class TestCompactTokenStream(unittest.TestCase):
+
+    def assertSameStream(self, expected: antlr4.CommonTokenStream, actual: CompactTokenStream):
+        self.assertEqual(token_tuples(expected.tokens), token_tuples(actual.tokens))
+        self.assertEqual(expected.getText(), actual.getText())
+        self.assertEqual(expected.getNumberOfOnChannelTokens(), actual.getNumberOfOnChannelTokens())
+        for channel in (Token.DEFAULT_CHANNEL, BosLexer.LINE_MACRO, BosLexer.COMMENTS):
+            self.assertEqual(
+                token_tuples(tokens_on_channel(expected, channel)), token_tuples(tokens_on_channel(actual, channel))
+            )
+            for i in range(len(expected.tokens)):
+                self.assertEqual(expected.previousTokenOnChannel(i, channel), actual.previousTokenOnChannel(i, channel))
+                self.assertEqual(expected.nextTokenOnChannel(i, channel), actual.nextTokenOnChannel(i, channel))
+
+        expected.seek(0)
+        actual.seek(0)
+        while True:
+            for k in (-2, -1, 1, 2, 3):
+                expected_token, actual_token = expected.LT(k), actual.LT(k)
+                self.assertEqual(
+                    expected_token and token_tuples([expected_token]), actual_token and token_tuples([actual_token])
+                )
+            if expected.LA(1) == Token.EOF:
+                break
+            self.assertEqual(expected.LA(1), actual.LA(1))
+            expected.consume()
+            actual.consume()
+        self.assertEqual(expected.index, actual.index)
+
+    def test_samples(self):
+        rng = random.Random(2468)
+        fuzz = [''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(1, 25))) for _ in range(300)]
+        for i, text in enumerate([*SAMPLES, *PARSER_SAMPLES, *fuzz]):
+            with self.subTest(i, text=text):
+                self.assertSameStream(
+                    filled(antlr4.CommonTokenStream(lexer(text))), filled(CompactTokenStream(lexer(text)))
+                )
+                self.assertSameStream(
+                    filled(antlr4.CommonTokenStream(FastBosLexer(text))), filled(CompactTokenStream(FastBosLexer(text)))
+                )
+
+    def test_tokens_are_built_once(self):
+        token_stream = filled(CompactTokenStream(lexer('piece a;\n// comment\npiece b;')))
+        self.assertIs(token_stream.tokens[0], token_stream.get(0))
+        self.assertIs(token_stream.tokens[-1], token_stream.LT(100))
+
+    def test_code_locations(self):
+        text = 'F()\n{\n#line 10 "other.bos"\n\tsleep 1;\n}\n'
+        expected = filled(antlr4.CommonTokenStream(lexer(text)))
+        actual = filled(CompactTokenStream(lexer(text)))
+        for expected_token, actual_token in zip(expected.tokens, actual.tokens):
+            self.assertEqual(
+                CodeLocation.from_token(expected_token, expected), CodeLocation.from_token(actual_token, actual)
+            )
+
+    def test_parse_errors(self):
+        for text in ERROR_SAMPLES:
+            with self.subTest(text=text):
+                loader = BosLoader('test.bos', preprocessor_cache=None)
+                loader.preprocessed_file_contents = text
+                with self.assertRaises(ValueError):
+                    loader._run_parser()
+                self.assertTrue(loader.parse_errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,288 @@
+"""
+A ``CommonTokenStream`` that keeps its tokens in parallel arrays
+
+``CommonTokenStream`` holds one ``CommonToken`` object for every token the lexer produces, and most of those are
+whitespace, newlines, comments and preprocessor lines on the hidden channels that the parser never looks at.
+``CompactTokenStream`` stores type, channel, start, stop, line and column in arrays and only builds a
+``CommonToken`` the first time one is asked for, which for a parse is the default channel tokens and the
+occasional ``#line`` directive looked up by ``CodeLocation.from_token``.
+
+When the token source is an ANTLR ``Lexer``, its token factory is swapped for one that appends to the arrays
+directly while the stream is fetching, so lexing doesn't create token objects at all. The lexer's own factory is
+put back in between, the parser borrows it to make up missing tokens during error recovery.
+
+Tokens on ``skip_channels`` aren't recorded at all, the lean loader mode drops whitespace, comments and
+preprocessor lines that way.
+
+For a token source producing ``SourceToken`` objects, the stream keeps the token index each source file
+starts at, and the tokens it builds get their file back from that.
+"""
+from array import array
+from bisect import bisect_right
+from collections.abc import Callable, Collection, Sequence
+
+from antlr4.BufferedTokenStream import TokenStream
+from antlr4.CommonTokenStream import CommonTokenStream
+from antlr4.Lexer import Lexer
+from antlr4.Token import CommonToken, Token
+
+
+class SourceToken(CommonToken):
+    """A token that knows which file its line is in, rather than leaving it to a preceding ``#line`` directive"""
+
+    __slots__ = ('source_file',)
+
+
+_new_token = CommonToken.__new__
+
+
+class _ArrayTokenFactory:
+    """Token factory for ``Lexer`` that records each token in the stream's arrays and returns its index"""
+
+    __slots__ = ('stream',)
+
+    def __init__(self, stream: 'CompactTokenStream'):
+        self.stream = stream
+
+    def create(self, source, type: int, text: str | None, channel: int, start: int, stop: int, line: int, column: int):
+        stream = self.stream
+        stream._source = source
+        return stream._append(type, channel, start, stop, line, column, text)
+
+
+class _LazyTokens(Sequence):
+    """``BufferedTokenStream.tokens`` stand-in, indexing it builds (and keeps) the token"""
+
+    __slots__ = ('stream',)
+
+    def __init__(self, stream: 'CompactTokenStream'):
+        self.stream = stream
+
+    def __len__(self):
+        return len(self.stream.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.stream.token_at(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('token index out of range')
+        return self.stream.token_at(index)
+
+
+class CompactTokenStream(CommonTokenStream):
+
+    def __init__(self, lexer: Lexer, channel: int = Token.DEFAULT_CHANNEL, skip_channels: Collection[int] = ()):
+        super().__init__(lexer, channel)
+        self.skip_channels = frozenset(skip_channels)
+        self.setTokenSource(lexer)
+
+    def setTokenSource(self, tokenSource):
+        super().setTokenSource(tokenSource)
+        self.tokens = _LazyTokens(self)
+        self.types = array('h')
+        self.channels = array('h')
+        self.starts = array('i')
+        self.stops = array('i')
+        self.lines = array('i')
+        self.columns = array('i')
+        # only the few tokens whose text isn't a slice of the input (none, for BosLexer)
+        self.texts: dict[int, str] = {}
+        self._materialized: dict[int, CommonToken] = {}
+        # first token index of each run of SourceTokens from the same file, and the file
+        self.source_file_starts = array('i')
+        self.source_file_names: list[str] = []
+        self._source = (tokenSource, getattr(tokenSource, 'inputStream', None))
+        self._array_factory = _ArrayTokenFactory(self)
+
+    def _append(
+        self, type: int, channel: int, start: int, stop: int, line: int, column: int, text: str | None
+    ) -> int | None:
+        if channel in self.skip_channels:
+            return None
+        index = len(self.types)
+        self.types.append(type)
+        self.channels.append(channel)
+        self.starts.append(start)
+        self.stops.append(stop)
+        self.lines.append(line)
+        self.columns.append(column)
+        if text is not None:
+            self.texts[index] = text
+        return index
+
+    def fetch(self, n: int):
+        if self.fetchedEOF:
+            return 0
+
+        token_source = self.tokenSource
+        if isinstance(token_source, Lexer):
+            lexer_factory = token_source._factory
+            token_source._factory = self._array_factory
+            try:
+                return self._fetch_from(token_source.nextToken, n)
+            finally:
+                token_source._factory = lexer_factory
+
+        source_file_names = self.source_file_names
+
+        def next_index():
+            token = token_source.nextToken()
+            index = self._append(
+                token.type, token.channel, token.start, token.stop, token.line, token.column,
+                token._text if token.getInputStream() is None else None
+            )
+            if index is not None and isinstance(token, SourceToken) and (
+                not source_file_names or source_file_names[-1] != token.source_file
+            ):
+                self.source_file_starts.append(index)
+                source_file_names.append(token.source_file)
+            return index
+        return self._fetch_from(next_index, n)
+
+    def _fetch_from(self, next_index: Callable[[], int | None], n: int) -> int:
+        fetched = 0
+        while fetched < n:
+            index = next_index()
+            if index is None:
+                continue
+            fetched += 1
+            if self.types[index] == Token.EOF:
+                self.fetchedEOF = True
+                break
+        return fetched
+
+    def token_at(self, index: int) -> CommonToken:
+        token = self._materialized.get(index)
+        if token is None:
+            # skips CommonToken.__init__, every slot is filled in here
+            if self.source_file_names:
+                token = _new_token(SourceToken)
+                token.source_file = self.source_file_names[bisect_right(self.source_file_starts, index) - 1]
+            else:
+                token = _new_token(CommonToken)
+            token.source = self._source
+            token.type = self.types[index]
+            token.channel = self.channels[index]
+            token.start = self.starts[index]
+            token.stop = self.stops[index]
+            token.tokenIndex = index
+            token.line = self.lines[index]
+            token.column = self.columns[index]
+            token._text = self.texts.get(index)
+            self._materialized[index] = token
+        return token
+
+    def text_at(self, index: int) -> str:
+        text = self.texts.get(index)
+        if text is not None:
+            return text
+        input_stream = self._source[1]
+        start, stop = self.starts[index], self.stops[index]
+        if input_stream is None or start >= input_stream.size or stop >= input_stream.size:
+            return self.token_at(index).text
+        return input_stream.getText(start, stop)
+
+    def indexes_on_channel(self, channel: int) -> list[int]:
+        self.fill()
+        return [i for i, token_channel in enumerate(self.channels) if token_channel == channel]
+
+    def get(self, index: int):
+        self.lazyInit()
+        return self.token_at(index)
+
+    def _lt_index(self, k: int) -> int | None:
+        # CommonTokenStream.LT/LB, on the arrays
+        if k == 1 and self.index >= 0:
+            # the stream always rests on a token of its channel
+            return self.index
+        self.lazyInit()
+        if k == 0:
+            return None
+        if k < 0:
+            if self.index + k < 0:
+                return None
+            i = self.index
+            for _ in range(-k):
+                i = self.previousTokenOnChannel(i - 1, self.channel)
+            return i if i >= 0 else None
+
+        i = self.index
+        for _ in range(k - 1):
+            if self.sync(i + 1):
+                i = self.nextTokenOnChannel(i + 1, self.channel)
+        return i
+
+    def LT(self, k: int):
+        i = self._lt_index(k)
+        return self.token_at(i) if i is not None else None
+
+    def LB(self, k: int):
+        return self.LT(-k)
+
+    def LA(self, i: int):
+        return self.types[self._lt_index(i)]
+
+    def nextTokenOnChannel(self, i: int, channel: int):
+        self.sync(i)
+        if i >= len(self.types):
+            return len(self.types) - 1
+        channels, types = self.channels, self.types
+        while channels[i] != channel:
+            if types[i] == Token.EOF:
+                return i
+            i += 1
+            self.sync(i)
+        return i
+
+    def previousTokenOnChannel(self, i: int, channel: int):
+        channels = self.channels
+        while i >= 0 and channels[i] != channel:
+            i -= 1
+        return i
+
+    def filterForChannel(self, left: int, right: int, channel: int):
+        hidden = [
+            self.token_at(i) for i in range(left, right + 1)
+            if (self.channels[i] != Token.DEFAULT_CHANNEL if channel == -1 else self.channels[i] == channel)
+        ]
+        return hidden or None
+
+    def getText(self, start: int | Token = None, stop: int | Token = None):
+        self.lazyInit()
+        self.fill()
+        if isinstance(start, Token):
+            start = start.tokenIndex
+        elif start is None:
+            start = 0
+        if isinstance(stop, Token):
+            stop = stop.tokenIndex
+        elif stop is None or stop >= len(self.types):
+            stop = len(self.types) - 1
+        if start < 0 or stop < 0 or stop < start:
+            return ''
+
+        texts = []
+        for i in range(start, stop + 1):
+            if self.types[i] == Token.EOF:
+                break
+            texts.append(self.text_at(i))
+        return ''.join(texts)
+
+    def getNumberOfOnChannelTokens(self):
+        self.fill()
+        n = 0
+        for token_type, channel in zip(self.types, self.channels):
+            if channel == self.channel:
+                n += 1
+            if token_type == Token.EOF:
+                break
+        return n
+
+
+def tokens_on_channel(token_stream: TokenStream, channel: int) -> list[CommonToken]:
+    """The tokens of a filled stream on one channel, without building the others when the stream is compact"""
+    if isinstance(token_stream, CompactTokenStream):
+        return [token_stream.token_at(i) for i in token_stream.indexes_on_channel(channel)]
+    return [token for token in token_stream.tokens if token.channel == channel]
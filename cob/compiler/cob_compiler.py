@@ -9,7 +9,6 @@ from cob.cob_file import CobFile
 from cob.compiler.name_registry import NameRegistry, NameType
 from cob.opcodes import CobOpCode
 from code_error import CodeError
-from code_location import CodeLocation
 
 log = logging.getLogger(__name__)
 
@@ -17,7 +16,7 @@ class NodeNameRegistry(NameRegistry[nodes.NameNode]):
     def on_name_missing(self, name):
         raise CodeError(
             f'name "{str(name)}" has not been defined',
-            CodeLocation.from_parser_node(name.parser_node)
+            name.code_location
         )
     
     def on_name_collision(self, name: nodes.NameNode, name_type: NameType, existing_type: NameType):
@@ -28,14 +27,14 @@ class NodeNameRegistry(NameRegistry[nodes.NameNode]):
             log.warning(
                 'Skipping duplicate declaration of global name %s "%s". Location: %s',
                 name_type.description, str(name),
-                CodeLocation.from_parser_node(name.parser_node)
+                name.code_location
             )
             return
 
         raise CodeError(
             f'invalid declaration of {name_type.description} "{str(name)}", '
             f'name is already being used by a {existing_type.description} declaration',
-            CodeLocation.from_parser_node(name.parser_node)
+            name.code_location
         )
 
 class CobCompiler:
@@ -200,7 +199,7 @@ class CobCompiler:
         if not isinstance(func_name := statement.args[0], nodes.NameNode):
             raise CodeError(
                 f'Expected a function name, got {func_name.node_name}',
-                CodeLocation.from_parser_node(statement.parser_node)
+                statement.code_location
             )
         self.code.append(self.name_registry.lookup(func_name)[0])
         self.code.append(len(statement.args) - 1)
@@ -260,7 +259,7 @@ class CobCompiler:
             case _:
                 raise CodeError(
                     f'Illegal assignment to {name_type.description} "{assign_statement.variable.name}".',
-                    CodeLocation.from_parser_node(assign_statement.parser_node)
+                    assign_statement.code_location
                 )
 
         self.code.append(idx)
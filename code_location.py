@@ -1,7 +1,10 @@
 import sys
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
 from functools import total_ordering
-from typing import Self
+from typing import ClassVar, Self
+from weakref import WeakKeyDictionary, ref
 
 from antlr4 import ParserRuleContext
 from antlr4.BufferedTokenStream import BufferedTokenStream
@@ -9,10 +12,78 @@ from antlr4.Token import CommonToken
 
 from bos.gen.BosLexer import BosLexer
 from bos.gen.BosParser import BosParser
+from bos.token_buffer import CompactTokenStream, SourceToken
+
+
+class LineDirectiveIndex:
+    """
+    The ``#line`` directives of a token stream, with the line offset and file each one sets
+
+    ``CodeLocation.from_token`` bisects the directive's token indexes for the last one before a token rather than
+    scanning back through the stream for it. There is one index per stream, see ``for_stream``, covering the
+    tokens fetched so far and extended whenever a token past them is looked up.
+    """
+
+    _by_stream: ClassVar[WeakKeyDictionary[BufferedTokenStream, 'LineDirectiveIndex']] = WeakKeyDictionary()
+
+    def __init__(self, token_stream: BufferedTokenStream):
+        # weak, a strong reference would keep the stream alive as the key of its own entry in _by_stream
+        self._token_stream = ref(token_stream)
+        self.token_indexes = array('i')
+        # None where the directive couldn't be parsed
+        self.line_offsets: list[int | None] = []
+        self.source_files: list[str | None] = []
+        self._scanned = 0
+
+    @classmethod
+    def for_stream(cls, token_stream: BufferedTokenStream) -> 'LineDirectiveIndex':
+        index = cls._by_stream.get(token_stream)
+        if index is None:
+            index = cls._by_stream[token_stream] = cls(token_stream)
+        return index
+
+    @property
+    def token_stream(self) -> BufferedTokenStream | None:
+        return self._token_stream()
+
+    def _extend(self):
+        token_stream = self.token_stream
+        if isinstance(token_stream, CompactTokenStream):
+            # without building token objects
+            channels = token_stream.channels
+            end = len(channels)
+            directives = [
+                (i, token_stream.lines[i], token_stream.text_at(i))
+                for i in range(self._scanned, end) if channels[i] == BosLexer.LINE_MACRO
+            ]
+        else:
+            tokens = token_stream.tokens
+            end = len(tokens)
+            directives = [
+                (i, tokens[i].line, tokens[i].text)
+                for i in range(self._scanned, end) if tokens[i].channel == BosLexer.LINE_MACRO
+            ]
+
+        for token_index, line, text in directives:
+            self.token_indexes.append(token_index)
+            try:
+                line_str, source_file = text.split()[1:3]
+                self.line_offsets.append(int(line_str) - line - 1)
+                self.source_files.append(source_file)
+            except (AttributeError, ValueError):
+                self.line_offsets.append(None)
+                self.source_files.append(None)
+        self._scanned = end
+
+    def directive_before(self, token_index: int) -> int:
+        """Position in the index of the last directive at or before ``token_index``, -1 if there is none"""
+        if token_index >= self._scanned:
+            self._extend()
+        return bisect_right(self.token_indexes, token_index) - 1
 
 
 @total_ordering
-@dataclass()
+@dataclass(slots=True)
 class CodeLocation:
     start_line: int
     start_column: int
@@ -21,7 +92,13 @@ class CodeLocation:
     source_file: str
 
     @classmethod
-    def from_parser_node(cls, parser_node: ParserRuleContext | None, starting_file: str = None) -> Self | None:
+    def from_parser_node(
+        cls,
+        parser_node: ParserRuleContext | None,
+        starting_file: str = None,
+        *,
+        line_directives: LineDirectiveIndex = None
+    ) -> Self | None:
         if parser_node is None:
             return None
 
@@ -30,7 +107,7 @@ class CodeLocation:
         parser: BosParser = parser_node.parser
         token_stream: BufferedTokenStream = parser.getTokenStream()
 
-        loc = cls.from_token(start, token_stream, starting_file=starting_file)
+        loc = cls.from_token(start, token_stream, starting_file=starting_file, line_directives=line_directives)
 
         if loc is None:
             return None
@@ -44,22 +121,27 @@ class CodeLocation:
         cls,
         token: CommonToken, token_stream: BufferedTokenStream, 
         *, 
-        starting_file: str = None,use_line_directives=True
+        starting_file: str = None,use_line_directives=True,
+        line_directives: LineDirectiveIndex = None
     ) -> Self | None:
+        """``line_directives`` defaults to the stream's shared ``LineDirectiveIndex``"""
         line_offset = 0
         source_file = starting_file if starting_file is not None else 'source file unspecified'
 
-        if use_line_directives:
-            try:
-                preproc_token_idx = token_stream.previousTokenOnChannel(token.tokenIndex, BosLexer.LINE_MACRO)
-                if preproc_token_idx != -1:
-                    preproc_token: CommonToken = token_stream.tokens[preproc_token_idx]
-                    if preproc_token.text is not None:
-                        line_str, source_file = preproc_token.text.split()[1:3]
-                        line_offset = int(line_str) - preproc_token.line - 1
-            except Exception as err:
-                print(f'WARN: another error occurred while trying to calculate error_loc: {str(err)}', file=sys.stderr)
-                return None
+        if use_line_directives and isinstance(token, SourceToken):
+            # already on its line in its source file
+            source_file = token.source_file
+        elif use_line_directives:
+            if line_directives is None:
+                line_directives = LineDirectiveIndex.for_stream(token_stream)
+            position = line_directives.directive_before(token.tokenIndex)
+            if position != -1:
+                line_offset = line_directives.line_offsets[position]
+                if line_offset is None:
+                    directive_index = line_directives.token_indexes[position]
+                    print(f'WARN: could not parse the #line directive at token {directive_index}', file=sys.stderr)
+                    return None
+                source_file = line_directives.source_files[position]
 
         return cls(
             token.line + line_offset,
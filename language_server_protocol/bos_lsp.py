@@ -1,4 +1,6 @@
 import logging
+import sys
+import threading
 
 import lsprotocol.types as lsp_types
 from antlr4 import CommonTokenStream, InputStream
@@ -6,14 +8,19 @@ from antlr4.Token import CommonToken
 from pygls.server import LanguageServer
 from pygls.workspace import TextDocument
 
+from bos import dfa_snapshot, fast_lexer
 from bos.bos_loader import BosLoader
 from bos.gen.BosLexer import BosLexer
+from bos.parse_budget import ParseCancelledError
 from code_location import CodeLocation
 from language_server_protocol.lsp_visitor import LspVisitor
 from language_server_protocol.models import TokenType, TokenModifier, LspToken
 
 log = logging.getLogger(__name__)
 
+# a pathological document gets its lexer tokens highlighted, but doesn't hold up the server with its parse
+PARSE_TIME_BUDGET = 10.0
+
 lexer_token_symbolic_type_defs: dict[tuple[int, ...], tuple[TokenType, TokenModifier]] = {
     (BosLexer.LINE_COMMENT, BosLexer.BLOCK_COMMENT): (TokenType.Comment, 0),
     (BosLexer.INCLUDE_DIRECTIVE,): (TokenType.Namespace, 0),
@@ -69,14 +76,26 @@ lexer_token_symbolic_type_lookup: dict[int, tuple[TokenType, TokenModifier]] = {
 
 class BosLanguageServer(LanguageServer):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, use_fast_lexer=False, **kwargs):
         super().__init__(*args, **kwargs)
         self.tokens: dict[str, list[LspToken]] = dict()
+        # the highlighting pass only needs token types, bos.fast_lexer produces the same ones much quicker
+        self.use_fast_lexer = use_fast_lexer
+        # uri -> cancel event of the parse in progress for the document
+        self.parse_cancel_events: dict[str, threading.Event] = dict()
+
+    def cancel_parse(self, uri: str):
+        """Stop the parse of a document in progress on another thread, e.g. once it changed again"""
+        cancel_event = self.parse_cancel_events.get(uri)
+        if cancel_event is not None:
+            cancel_event.set()
 
     def parse(self, doc: TextDocument):
         # quickly rip through the tokens in the file and store them
-        box_lexer = BosLexer(InputStream(doc.source))
-        token_stream = CommonTokenStream(box_lexer)
+        if self.use_fast_lexer:
+            token_stream = CommonTokenStream(fast_lexer.FastBosLexer(doc.source))
+        else:
+            token_stream = CommonTokenStream(BosLexer(InputStream(doc.source)))
         token_stream.fill()
 
         token_list: list[LspToken] = list()
@@ -96,16 +115,27 @@ class BosLanguageServer(LanguageServer):
 
         self.tokens[doc.uri] = token_list
 
+        self.cancel_parse(doc.uri)
+        cancel_event = self.parse_cancel_events[doc.uri] = threading.Event()
         try:
-            bos_loader = BosLoader(doc.path, file_contents=doc.source)
+            # only the parse tree is used here, a parse over budget is logged, there is no report to keep it in
+            bos_loader = BosLoader(
+                doc.path, file_contents=doc.source, lazy_function_bodies=True, parse_time_budget=PARSE_TIME_BUDGET,
+                parse_budget_report=None, parse_cancel_event=cancel_event
+            )
             bos_loader.load_file()
             
             lsp_visitor = LspVisitor(doc.path, bos_loader.token_stream)
             lsp_visitor.visit(bos_loader.parser_node_tree)
             
             self.tokens[doc.uri].extend(lsp_visitor.lsp_tokens)
+        except ParseCancelledError:
+            log.debug('Parse of %s cancelled', doc.uri)
         except Exception as err:
             log.exception(err)
+        finally:
+            if self.parse_cancel_events.get(doc.uri) is cancel_event:
+                del self.parse_cancel_events[doc.uri]
 
 
 server = BosLanguageServer('bos-language-server', 'alpha')
@@ -168,6 +198,8 @@ if __name__ == '__main__':
     def main():
         logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(name)s : %(message)s")
         logging.getLogger('pygls.protocol.json_rpc').setLevel(logging.ERROR)
+        dfa_snapshot.load_snapshot()
+        server.use_fast_lexer = '--fast-lexer' in sys.argv
         server.start_io()
 
 